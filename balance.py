@@ -0,0 +1,234 @@
+"""
+RoguePyxel balance harness
+Plays many seeded runs of the headless Engine across a process pool and
+aggregates the results into a report:
+  - outcome of each run (win, death or timeout) and the level it ended on,
+  - turns played, gold carried, what killed the player and items picked up.
+Every run is driven by a scripted policy (see POLICIES) and seeded with
+base_seed + run index, so a report is reproducible whatever the worker count.
+
+Usage: python balance.py --runs 20000 --policy greedy --workers 8 --out runs.jsonl
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+from engine import Engine, DIRECTIONS
+from pathfinding import DistanceField
+
+# ---------------------------
+# Scripted Policies
+# ---------------------------
+# A policy is called as policy(engine, rng) while the run is in the "game" or
+# "merchant" state. It may use the inventory/merchant actions directly and
+# returns the direction for the next turn. Runs still in the shop after the
+# policy returns are taken out of it by the harness.
+def direction_towards(x, y, target_x, target_y, rng):
+    choices = []
+    if target_x < x:
+        choices.append("LEFT")
+    elif target_x > x:
+        choices.append("RIGHT")
+    if target_y < y:
+        choices.append("UP")
+    elif target_y > y:
+        choices.append("DOWN")
+    if not choices:
+        return "NONE"
+    return rng.choice(choices)
+
+def direction_along_path(engine, target_x, target_y, rng):
+    # First step of a shortest walkable path to the target (walls make the
+    # straight line of direction_towards a dead end).
+    player = engine.player
+    if (player.x, player.y) == (target_x, target_y):
+        return "NONE"
+    paths = DistanceField()
+    paths.update(target_x, target_y, engine.grid_version, engine.grid.is_walkable)
+    choices = paths.best_steps(player.x, player.y)
+    if not choices:
+        return direction_towards(player.x, player.y, target_x, target_y, rng)
+    return rng.choice(choices)
+
+def policy_random(engine, rng):
+    return rng.choice(DIRECTIONS)
+
+def policy_greedy(engine, rng):
+    player = engine.player
+    if engine.state == "merchant":
+        while engine.merchant_items:
+            count = len(engine.merchant_items)
+            engine.buy_merchant_item()
+            if len(engine.merchant_items) == count:
+                break
+        return None
+
+    # Equip everything worth equipping and eat when getting hungry.
+    for index in range(len(player.Inventory) - 1, -1, -1):
+        item = player.Inventory[index]
+        if item.type in (")", "[", "="):
+            engine.use_item(index)
+        elif item.type == ":" and player.Satiety < 40:
+            engine.use_item(index)
+
+    # Attack an adjacent enemy, otherwise go for loot, then gold, then the gate.
+    for enemy in engine.enemies:
+        if abs(enemy.x - player.x) + abs(enemy.y - player.y) == 1:
+            return direction_towards(player.x, player.y, enemy.x, enemy.y, rng)
+    targets = [(item.x, item.y) for item in engine.items]
+    gold = engine.grid.find("G")
+    if gold:
+        targets.append(gold)
+    if not targets:
+        if engine.level >= 4 and engine.enemies:
+            targets = [(enemy.x, enemy.y) for enemy in engine.enemies]
+        else:
+            targets = [(engine.gate_x, engine.gate_y)]
+    target_x, target_y = min(targets, key=lambda t: abs(t[0] - player.x) + abs(t[1] - player.y))
+    return direction_along_path(engine, target_x, target_y, rng)
+
+POLICIES = {
+    "random": policy_random,
+    "greedy": policy_greedy,
+}
+
+# ---------------------------
+# Running
+# ---------------------------
+def play_run(task):
+    seed, policy_name, max_turns = task
+    rng = random.Random(seed + 1)
+    policy = POLICIES[policy_name]
+    engine = Engine(seed)
+    engine.start_game()
+    while engine.state in ("game", "merchant") and engine.turns < max_turns:
+        direction = policy(engine, rng)
+        if engine.state == "merchant":
+            engine.leave_merchant()
+            continue
+        engine.step(direction or "NONE")
+
+    if engine.state == "win":
+        outcome = "win"
+    elif engine.state == "gameover":
+        outcome = "death"
+    else:
+        outcome = "timeout"
+    return {
+        "seed": seed,
+        "outcome": outcome,
+        "level": engine.level,
+        "turns": engine.turns,
+        "gold": engine.player.Gold,
+        "player_level": engine.player.Level,
+        "killer": engine.last_damage_source if outcome == "death" else "",
+        "items": list(engine.picked_items),
+    }
+
+def run_batch(runs, policy_name="greedy", workers=None, base_seed=0, max_turns=5000):
+    # Yields results as soon as they come back, in completion order.
+    tasks = [(base_seed + i, policy_name, max_turns) for i in range(runs)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for task in tasks:
+            yield play_run(task)
+        return
+    chunksize = max(1, runs // (workers * 16))
+    with multiprocessing.Pool(workers) as pool:
+        for result in pool.imap_unordered(play_run, tasks, chunksize):
+            yield result
+
+# ---------------------------
+# Aggregate Report
+# ---------------------------
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+class Report:
+    def __init__(self):
+        self.runs = 0
+        self.outcomes = Counter()
+        self.death_levels = Counter()
+        self.killers = Counter()
+        self.items = Counter()
+        self.turns = []
+        self.gold = []
+
+    def add(self, result):
+        self.runs += 1
+        self.outcomes[result["outcome"]] += 1
+        if result["outcome"] == "death":
+            self.death_levels[result["level"]] += 1
+            self.killers[result["killer"] or "Unknown"] += 1
+        self.items.update(result["items"])
+        self.turns.append(result["turns"])
+        self.gold.append(result["gold"])
+
+    def format(self):
+        lines = []
+        if not self.runs:
+            return "No runs."
+        lines.append("Outcomes:")
+        for outcome in ("win", "death", "timeout"):
+            count = self.outcomes[outcome]
+            lines.append("  {:<8} {:>7} ({:.1f}%)".format(outcome, count, 100 * count / self.runs))
+        deaths = sum(self.death_levels.values())
+        if deaths:
+            lines.append("Deaths by level:")
+            for level in sorted(self.death_levels):
+                count = self.death_levels[level]
+                lines.append("  {:<8} {:>7} ({:.1f}%)".format(level, count, 100 * count / deaths))
+            lines.append("Killers:")
+            for killer, count in self.killers.most_common():
+                lines.append("  {:<12} {:>7} ({:.1f}%)".format(killer, count, 100 * count / deaths))
+        for name, values in (("Turns", self.turns), ("Gold", self.gold)):
+            values = sorted(values)
+            lines.append("{}: mean {:.1f}, p50 {}, p90 {}, max {}".format(
+                name, sum(values) / len(values), percentile(values, 0.5), percentile(values, 0.9), values[-1]))
+        if self.items:
+            lines.append("Items picked (per run):")
+            for name, count in self.items.most_common():
+                lines.append("  {:<20} {:.3f}".format(name, count / self.runs))
+        return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo balance harness for RoguePyxel.")
+    parser.add_argument("--runs", type=int, default=10000)
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--workers", type=int, default=0, help="processes to use (default: all cores)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first run")
+    parser.add_argument("--max-turns", type=int, default=5000)
+    parser.add_argument("--out", help="write every run result as a JSON line to this file")
+    args = parser.parse_args(argv)
+
+    workers = args.workers or os.cpu_count() or 1
+    report = Report()
+    out = open(args.out, "w") if args.out else None
+    start = time.perf_counter()
+    try:
+        for result in run_batch(args.runs, args.policy, workers, args.seed, args.max_turns):
+            report.add(result)
+            if out:
+                out.write(json.dumps(result) + "\n")
+    finally:
+        if out:
+            out.close()
+    elapsed = time.perf_counter() - start
+    print("{} runs, policy {}, {} workers, {:.1f}s ({:.0f} runs/s)".format(
+        report.runs, args.policy, workers, elapsed, report.runs / elapsed if elapsed > 0 else 0))
+    print(report.format())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
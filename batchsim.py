@@ -0,0 +1,515 @@
+"""
+RoguePyxel batch simulator
+Steps N independent games in lockstep with NumPy, for balance sweeps over
+many games. Game states are stored as struct-of-arrays buffers:
+  - floors: row bitboards of shape (N, MAX_SIZE + 2), see CELL_BITS, with
+    the gold and gate cells left out, plus the gold and gate coordinates,
+  - player stats: one int32 array per Stats field, shape (N,),
+  - enemies: one array per Enemy field, shape (N, MAX_ENEMIES), plus an
+    alive mask.
+Every step applies the Engine rules to all games at once: player move and
+bump attack, the damage formula of check_enemy_collision, Stats.renew_stats,
+level ups, move_enemies (shortest-path chase of a player in sight within
+the level radius, random walk otherwise), enemy attacks, gold pickup and
+the gate/stage progression.
+
+Simplifications compared to Engine: levels are open rectangles rather
+than rooms and corridors (so every cell in the field of view's radius is
+in sight), every enemy acts once per turn (no speeds or dormant enemies,
+see scheduler.py), item drops, the inventory and the merchant shop are
+not modelled (the merchant level is left straight away), and killing the
+Dragon or Necromancer counts as a win since it always drops the amulet.
+
+Run this file directly for a throughput benchmark. On one core it steps
+about 1.6 million turns/s with 65536 games under the random policy, but
+only 0.4-0.8 million with the greedy one, which keeps enemies chasing.
+Each step is a few hundred NumPy passes over the game arrays, so the cost
+per game and step stays around a microsecond however large N gets, and
+most of it is the chase BFS, one pass per ring; more would take a
+compiled kernel.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import sys
+import time
+
+import numpy as np
+
+from fov import FOV_RADIUS
+from registry import ENEMIES
+
+# Distance field value of cells the player cannot be reached from
+UNREACHED = 255
+
+# Actions (same order as engine.DIRECTIONS)
+LEFT, RIGHT, UP, DOWN, WAIT = range(5)
+DX = np.array([-1, 1, 0, 0, 0], dtype=np.int32)
+DY = np.array([0, 0, -1, 1, 0], dtype=np.int32)
+
+# Game states
+PLAYING, DEAD, WON = 0, 1, 2
+
+MAX_SIZE = 15
+MAX_ENEMIES = 4
+
+# Bit of each column in a row bitboard. Bitboards hold one uint32 per grid
+# row with an empty row and column on every side, so cell (x, y) is bit
+# x + 1 of row y + 1 and the neighbours of any cell need no bounds checks.
+CELL_BITS = (1 << np.arange(MAX_SIZE + 2)).astype(np.uint32)
+
+# Sides masks hold one bit per direction (bit 0 LEFT ... bit 3 DOWN).
+# SIDE_COUNT[mask] is the number of sides set and SIDE_CHOICE[mask, k] the
+# direction of the k-th one, -1 past the last.
+SIDE_BITS = (1 << np.arange(4)).astype(np.uint8)
+SIDE_COUNT = np.array([bin(mask).count("1") for mask in range(16)], dtype=np.int32)
+SIDE_CHOICE = np.array([[side for side in range(4) if mask >> side & 1] + [-1] * (4 - SIDE_COUNT[mask])
+                        for mask in range(16)], dtype=np.int32)
+
+# Enemy templates from the registry (registry.json):
+# symbol: (hits lo, hits hi, str lo, str hi, armor lo, armor hi, level)
+ENEMY_SYMBOLS = "SEZBICRDN"
+ENEMY_TABLE = np.array([
+    ENEMIES[symbol].bounds("Hits") + ENEMIES[symbol].bounds("Str") + ENEMIES[symbol].bounds("Armor")
+    + ENEMIES[symbol].bounds("Level")[:1]
+    for symbol in ENEMY_SYMBOLS
+], dtype=np.int32)
+KIND = {symbol: i for i, symbol in enumerate(ENEMY_SYMBOLS)}
+BOSS_KINDS = (KIND["D"], KIND["N"])
+COMMON_KINDS = np.array([KIND["S"], KIND["E"], KIND["Z"], KIND["B"]], dtype=np.int32)
+
+# Chase radius int(5/9*Level + 22/9), indexed by enemy level; no enemy
+# sees past the player's field of view.
+CHASE_RADIUS = np.array([min(int(5 / 9 * level + 22 / 9), FOV_RADIUS) for level in range(11)], dtype=np.int32)
+
+
+class BatchSim:
+    def __init__(self, n, seed=None):
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        self.rows = np.arange(n)
+
+        self.floor_bits = np.zeros((n, MAX_SIZE + 2), dtype=np.uint32)
+        self.width = np.zeros(n, dtype=np.int32)
+        self.height = np.zeros(n, dtype=np.int32)
+        self.level = np.zeros(n, dtype=np.int32)
+        self.has_gold = np.zeros(n, dtype=bool)
+        self.gold_x = np.zeros(n, dtype=np.int32)
+        self.gold_y = np.zeros(n, dtype=np.int32)
+        self.gate_x = np.zeros(n, dtype=np.int32)
+        self.gate_y = np.zeros(n, dtype=np.int32)
+        self.state = np.zeros(n, dtype=np.uint8)
+        self.turns = np.zeros(n, dtype=np.int32)
+
+        # Player Stats
+        self.px = np.zeros(n, dtype=np.int32)
+        self.py = np.zeros(n, dtype=np.int32)
+        self.hits = np.zeros(n, dtype=np.int32)
+        self.max_hits = np.zeros(n, dtype=np.int32)
+        self.str = np.zeros(n, dtype=np.int32)
+        self.max_str = np.zeros(n, dtype=np.int32)
+        self.armor = np.zeros(n, dtype=np.int32)
+        self.satiety = np.zeros(n, dtype=np.int32)
+        self.move_counter = np.zeros(n, dtype=np.int32)
+        self.gold = np.zeros(n, dtype=np.int32)
+        self.exp = np.zeros(n, dtype=np.int32)
+        self.exp_cap = np.zeros(n, dtype=np.int32)
+        self.player_level = np.zeros(n, dtype=np.int32)
+
+        # Enemies
+        shape = (n, MAX_ENEMIES)
+        self.ex = np.zeros(shape, dtype=np.int32)
+        self.ey = np.zeros(shape, dtype=np.int32)
+        self.ehits = np.zeros(shape, dtype=np.int32)
+        self.estr = np.zeros(shape, dtype=np.int32)
+        self.earmor = np.zeros(shape, dtype=np.int32)
+        self.elevel = np.zeros(shape, dtype=np.int32)
+        self.ekind = np.zeros(shape, dtype=np.int32)
+        self.ealive = np.zeros(shape, dtype=bool)
+        self.prev_x = np.zeros(shape, dtype=np.int32)
+        self.prev_y = np.zeros(shape, dtype=np.int32)
+
+        self.reset(self.rows)
+
+    # ---------------------------
+    # Level Creation
+    # ---------------------------
+    def reset(self, idx):
+        # Restart the given games from level 0 (Engine.reset_state).
+        self.level[idx] = 0
+        self.state[idx] = PLAYING
+        self.turns[idx] = 0
+        self.hits[idx] = self.max_hits[idx] = 12
+        self.str[idx] = self.max_str[idx] = 8
+        self.armor[idx] = 5
+        self.satiety[idx] = 100
+        self.move_counter[idx] = 0
+        self.gold[idx] = 0
+        self.exp[idx] = 0
+        self.exp_cap[idx] = 1
+        self.player_level[idx] = 1
+        self.ealive[idx] = False
+        self.width[idx] = 15
+        self.height[idx] = 10
+        self.make_level(idx, np.ones(len(idx), dtype=bool))
+        self.px[idx] = self.width[idx] // 2
+        self.py[idx] = self.height[idx] // 2
+
+    def make_level(self, idx, with_gate):
+        # Engine.make_grid + make_dungeon_gate_coords for the games in idx.
+        width = self.width[idx]
+        height = self.height[idx]
+        rows = np.arange(MAX_SIZE + 2)[None, :]
+        inside = (rows >= 1) & (rows <= height[:, None])
+        self.floor_bits[idx] = np.where(inside, ((CELL_BITS[width] - 1) << 1)[:, None], 0)
+
+        # Gold: anywhere but the center and (2, 0)
+        todo = np.arange(len(idx))
+        while todo.size:
+            w, h = width[todo], height[todo]
+            gx = self.rng.integers(0, w)
+            gy = self.rng.integers(0, h)
+            bad = ((gx == w // 2) & (gy == h // 2)) | ((gx == 2) & (gy == 0))
+            ok = ~bad
+            self.gold_x[idx[todo[ok]]] = gx[ok]
+            self.gold_y[idx[todo[ok]]] = gy[ok]
+            todo = todo[bad]
+        self.has_gold[idx] = True
+        self.clear_cells(idx, self.gold_x[idx], self.gold_y[idx])
+
+        # Gate: a free border cell that is not the center
+        todo = np.nonzero(with_gate)[0]
+        while todo.size:
+            w, h = width[todo], height[todo]
+            gx = self.rng.integers(0, w)
+            edge = (gx == 0) | (gx == w - 1)
+            gy = np.where(edge, self.rng.integers(0, h),
+                          np.where(self.rng.random(todo.size) < 0.5, 0, h - 1))
+            games = idx[todo]
+            bad = ((gx == self.gold_x[games]) & (gy == self.gold_y[games])) | ((gx == w // 2) & (gy == h // 2))
+            ok = ~bad
+            self.gate_x[games[ok]] = gx[ok]
+            self.gate_y[games[ok]] = gy[ok]
+            todo = todo[bad]
+        games = idx[with_gate]
+        self.clear_cells(games, self.gate_x[games], self.gate_y[games])
+        # The boss level has no gate to step on.
+        self.gate_x[idx[~with_gate]] = -1
+        self.gate_y[idx[~with_gate]] = -1
+
+    def clear_cells(self, games, x, y):
+        # Takes one cell per game out of its floor bitboard.
+        self.floor_bits[games, y + 1] &= ~CELL_BITS[x + 1]
+
+    def generate_enemies(self, idx):
+        # Engine.generate_enemies + random_place_enemies for the games in idx.
+        count = len(idx)
+        level = self.level[idx]
+        kinds = np.full((count, MAX_ENEMIES), -1, dtype=np.int32)
+        slots = np.arange(MAX_ENEMIES)[None, :]
+
+        kinds[level == 1, 0] = KIND["S"]
+
+        common = COMMON_KINDS[self.rng.integers(0, len(COMMON_KINDS), size=(count, MAX_ENEMIES))]
+        common_count = self.rng.integers(2, 4, size=count)[:, None]
+        mixed = np.where(slots < common_count, common, np.where(slots == common_count, KIND["I"], -1))
+        level_2 = level == 2
+        kinds[level_2] = np.where(slots < common_count, common, -1)[level_2]
+        level_3 = level == 3
+        twin_ice = self.rng.integers(0, 2, size=count) == 0
+        kinds[level_3 & twin_ice] = np.where(slots < 2, KIND["I"], -1)
+        kinds[level_3 & ~twin_ice] = mixed[level_3 & ~twin_ice]
+
+        kinds[level == 4, 0] = KIND["D"]
+
+        alive = kinds >= 0
+        table = ENEMY_TABLE[np.maximum(kinds, 0)]
+        self.ekind[idx] = kinds
+        self.ealive[idx] = alive
+        self.ehits[idx] = self.rng.integers(table[..., 0], table[..., 1] + 1)
+        self.estr[idx] = self.rng.integers(table[..., 2], table[..., 3] + 1)
+        self.earmor[idx] = self.rng.integers(table[..., 4], table[..., 5] + 1)
+        self.elevel[idx] = table[..., 6]
+
+        # Place on free floor away from the player's start cell, all slots
+        # of all games at once.
+        todo, slots = np.nonzero(alive)
+        while todo.size:
+            games = idx[todo]
+            x = self.rng.integers(0, self.width[games])
+            y = self.rng.integers(0, self.height[games])
+            bad = ((x == self.px[games]) & (y == self.py[games])) | ~self.is_floor(games, x, y)
+            ok = ~bad
+            self.ex[games[ok], slots[ok]] = x[ok]
+            self.ey[games[ok], slots[ok]] = y[ok]
+            todo, slots = todo[bad], slots[bad]
+
+    # ---------------------------
+    # Turn Logic
+    # ---------------------------
+    def damage(self, strength, armor):
+        # math.ceil(math.ceil(Str * rand / 100) * (100 / (100 + Armor))), rand in [50, 100]
+        roll = self.rng.integers(50, 101, size=np.shape(strength))
+        raw = (strength * roll + 99) // 100
+        return np.ceil(raw * (100 / (100 + armor))).astype(np.int32)
+
+    def is_floor(self, games, x, y):
+        # Free floor test for one cell per game.
+        return (self.floor_bits[games, y + 1] & CELL_BITS[x + 1]) != 0
+
+    def open_sides(self, x, y):
+        # Vectorized Engine.is_cell_empty on the four neighbours of
+        # (N, MAX_ENEMIES) coordinates, as sides masks.
+        flat = self.floor_bits.ravel()
+        row = self.rows[:, None] * (MAX_SIZE + 2) + y
+        above, middle, below = flat.take(row), flat.take(row + 1), flat.take(row + 2)
+        x = x.astype(np.uint32)
+        return (((middle >> x) & 1) | (((middle >> (x + 2)) & 1) << 1)
+                | (((above >> (x + 1)) & 1) << 2) | (((below >> (x + 1)) & 1) << 3)).astype(np.uint8)
+
+    def step(self, actions):
+        active = self.state == PLAYING
+        actions = np.where(active, actions, WAIT)
+        self.turns += active
+
+        # --- Player move (Engine.move_player) ---
+        nx = self.px + DX[actions]
+        ny = self.py + DY[actions]
+        inside = (nx >= 0) & (nx < self.width) & (ny >= 0) & (ny < self.height)
+        self.px = np.where(inside, nx, self.px)
+        self.py = np.where(inside, ny, self.py)
+        self.move_counter += active
+
+        # --- Player attack: only the first enemy on the cell is hit ---
+        on_player = self.ealive & (self.ex == self.px[:, None]) & (self.ey == self.py[:, None]) & active[:, None]
+        attacking = np.nonzero(on_player.any(axis=1))[0]
+        if attacking.size:
+            target = on_player[attacking].argmax(axis=1)
+            self.ehits[attacking, target] -= self.damage(self.str[attacking], self.earmor[attacking, target])
+            self.px[attacking] -= DX[actions[attacking]]
+            self.py[attacking] -= DY[actions[attacking]]
+
+        # --- Dead enemies ---
+        dead = self.ealive & (self.ehits <= 0)
+        self.exp += (self.elevel * dead).sum(axis=1)
+        boss_killed = (dead & np.isin(self.ekind, BOSS_KINDS)).any(axis=1)
+        self.ealive &= ~dead
+
+        self.renew_stats(active)
+        self.player_level_up(active)
+        self.state[boss_killed & active] = WON
+
+        self.move_enemies(active)
+
+        # --- Enemy attacks, attackers step back to their previous cell ---
+        on_player = self.ealive & (self.ex == self.px[:, None]) & (self.ey == self.py[:, None]) & active[:, None]
+        if on_player.any():
+            damage = self.damage(self.estr, self.player_armor_grid())
+            self.hits -= np.where(on_player, damage, 0).sum(axis=1)
+            self.ex = np.where(on_player, self.prev_x, self.ex)
+            self.ey = np.where(on_player, self.prev_y, self.ey)
+
+        # --- Gold ---
+        on_gold = active & self.has_gold & (self.px == self.gold_x) & (self.py == self.gold_y)
+        games = np.nonzero(on_gold)[0]
+        if games.size:
+            self.has_gold[games] = False
+            self.floor_bits[games, self.py[games] + 1] |= CELL_BITS[self.px[games] + 1]
+            self.gold[games] += self.rng.integers(10, 51, size=games.size)
+
+        # --- Gate & Stage Progression ---
+        at_gate = active & (self.px == self.gate_x) & (self.py == self.gate_y)
+        games = np.nonzero(at_gate)[0]
+        if games.size:
+            self.next_level(games)
+
+        self.state[active & (self.hits <= 0)] = DEAD
+
+    def player_armor_grid(self):
+        return np.broadcast_to(self.armor[:, None], self.ex.shape)
+
+    def renew_stats(self, active):
+        renew_point = np.where(self.hits <= self.max_hits // 2, 3, 5)
+        tick = active & (self.move_counter >= renew_point)
+        self.hits += tick & (self.hits < self.max_hits)
+        self.str += tick & (self.str < self.max_str)
+        self.satiety -= tick & (self.satiety > 0)
+        self.move_counter[tick] = 0
+        self.satiety = np.where(active & (self.satiety > 100), 100, self.satiety)
+        self.hits -= active & (self.satiety >= 5) & (self.satiety < 10)
+        self.hits -= 2 * (active & (self.satiety >= 0) & (self.satiety < 5))
+
+    def player_level_up(self, active):
+        pending = active & (self.exp >= self.exp_cap)
+        while pending.any():
+            games = np.nonzero(pending)[0]
+            self.exp[games] -= self.exp_cap[games]
+            self.player_level[games] += 1
+            self.exp_cap[games] += 1
+            max_hits = self.rng.integers(0, 2, size=games.size) == 0
+            bonus = self.rng.integers(3, 6, size=games.size)
+            self.max_hits[games] += np.where(max_hits, bonus, 0)
+            self.max_str[games] += np.where(max_hits, 0, bonus)
+            pending = active & (self.exp >= self.exp_cap)
+
+    def move_enemies(self, active):
+        # Chasing enemies step along a shortest path to the player (one shared
+        # distance field per game); the others, and chasers with no path,
+        # wander at random.
+        self.prev_x = self.ex.copy()
+        self.prev_y = self.ey.copy()
+        # An enemy that has reached the player stays there, as in Engine.
+        moving = self.ealive & active[:, None] & ((self.ex != self.px[:, None]) | (self.ey != self.py[:, None]))
+        dx = self.px[:, None] - self.ex
+        dy = self.py[:, None] - self.ey
+        radius = CHASE_RADIUS[self.elevel]
+        chasing = moving & (dx * dx + dy * dy <= radius * radius)
+
+        direction = np.full(self.ex.shape, WAIT, dtype=np.int32)
+        chase = np.full(self.ex.shape, -1, dtype=np.int32)
+        games = np.nonzero(chasing.any(axis=1))[0]
+        if games.size:
+            neighbours = self.chase_distances(games, chasing[games])
+            best = neighbours.min(axis=-1, keepdims=True)
+            shortest = (neighbours == best) & (best < UNREACHED)
+            chase[games] = self.random_choice((shortest * SIDE_BITS).sum(axis=-1, dtype=np.uint8))
+        has_path = chasing & (chase >= 0)
+        direction = np.where(has_path, chase, direction)
+
+        wander = self.random_choice(self.open_sides(self.ex, self.ey))
+        direction = np.where(moving & ~has_path & (wander >= 0), wander, direction)
+
+        self.ex = self.ex + DX[direction]
+        self.ey = self.ey + DY[direction]
+
+    def chase_distances(self, games, targets):
+        # Shortest-path distance from the player to the four neighbours of
+        # every enemy, for the given games. The BFS runs on the floor
+        # bitboards and grows one ring per iteration; a game drops out once
+        # the cells of all its target enemies are reached or its field stops
+        # growing, so later rings only cost as much as the games still
+        # searching. Returns an array of shape (games, MAX_ENEMIES, 4) in
+        # LEFT, RIGHT, UP, DOWN order; neighbours not reached hold UNREACHED.
+        stride = MAX_SIZE + 2
+        rows = np.arange(games.size)
+        px, py = self.px[games] + 1, self.py[games] + 1
+        unvisited = self.floor_bits[games]
+        ex, ey = self.ex[games] + 1, self.ey[games] + 1
+        own_bits = CELL_BITS[ex]
+        stranded = targets & ((unvisited[rows[:, None], ey] & own_bits) == 0)
+        unvisited[rows, py] &= ~CELL_BITS[px]
+        frontier = np.zeros_like(unvisited)
+        frontier[rows, py] = CELL_BITS[px]
+
+        # Rows are looked up in the flattened bitboards.
+        cells = ey[..., None] + DY[:4]
+        neighbour_bits = CELL_BITS[ex[..., None] + DX[:4]]
+        own_index = rows[:, None] * stride + ey
+        cell_index = rows[:, None, None] * stride + cells
+        result = np.where((frontier.ravel().take(cell_index) & neighbour_bits) != 0, 0, UNREACHED).astype(np.uint8)
+        neighbours, index = result, rows
+        growing = True
+        ring = 0
+        while True:
+            pending = targets & ((unvisited.ravel().take(own_index) & own_bits) != 0)
+            if stranded.any():
+                pending |= stranded & (neighbours == UNREACHED).all(axis=-1)
+            live = pending.any(axis=1) & growing
+            if not live.all():
+                result[index] = neighbours
+                keep = np.nonzero(live)[0]
+                if not keep.size:
+                    return result
+                index, rows = index[keep], np.arange(keep.size)
+                unvisited, frontier, neighbours = unvisited[keep], frontier[keep], neighbours[keep]
+                targets, stranded, ey, own_bits = targets[keep], stranded[keep], ey[keep], own_bits[keep]
+                cells, neighbour_bits = cells[keep], neighbour_bits[keep]
+                own_index = rows[:, None] * stride + ey
+                cell_index = rows[:, None, None] * stride + cells
+            ring += 1
+            reached = (frontier << 1) | (frontier >> 1)
+            reached[:, 1:] |= frontier[:, :-1]
+            reached[:, :-1] |= frontier[:, 1:]
+            reached &= unvisited
+            growing = reached.any(axis=1)
+            unvisited ^= reached
+            frontier = reached
+            neighbours[(reached.ravel().take(cell_index) & neighbour_bits) != 0] = ring
+
+    def random_choice(self, sides):
+        # Uniformly picks one direction set in each sides mask, -1 if none.
+        pick = (self.rng.random(sides.shape) * SIDE_COUNT[sides]).astype(np.int32)
+        return SIDE_CHOICE[sides, pick]
+
+    def next_level(self, games):
+        self.level[games] += 1
+        self.width[games] = self.rng.integers(8, 16, size=games.size)
+        self.height[games] = self.rng.integers(8, 16, size=games.size)
+        self.make_level(games, self.level[games] < 4)
+        self.px[games] = self.width[games] // 2
+        self.py[games] = self.height[games] // 2
+        self.ealive[games] = False
+        self.generate_enemies(games)
+
+    # ---------------------------
+    # Policies
+    # ---------------------------
+    def random_actions(self):
+        return self.rng.integers(0, 5, size=self.n).astype(np.int32)
+
+    def greedy_actions(self):
+        # Attack an adjacent enemy, else head for the gold, else the gate
+        # (or the boss once there is no gate left).
+        has_gold = self.has_gold
+        target_x = np.where(has_gold, self.gold_x, self.gate_x)
+        target_y = np.where(has_gold, self.gold_y, self.gate_y)
+
+        distance = np.abs(self.ex - self.px[:, None]) + np.abs(self.ey - self.py[:, None])
+        distance = np.where(self.ealive, distance, 1 << 20)
+        nearest = distance.argmin(axis=1)
+        nearest_distance = distance[self.rows, nearest]
+        hunt = (nearest_distance == 1) | ((self.level >= 4) & ~has_gold & (nearest_distance < (1 << 20)))
+        target_x = np.where(hunt, self.ex[self.rows, nearest], target_x)
+        target_y = np.where(hunt, self.ey[self.rows, nearest], target_y)
+
+        dx = target_x - self.px
+        dy = target_y - self.py
+        return np.select(
+            [dx < 0, dx > 0, dy < 0, dy > 0],
+            [LEFT, RIGHT, UP, DOWN],
+            default=WAIT,
+        ).astype(np.int32)
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def run(n=4096, steps=1000, policy="greedy", seed=0):
+    # Steps n games for the given number of steps, restarting finished games,
+    # and returns (turns per second, finished games by outcome and level).
+    sim = BatchSim(n, seed)
+    finished = {"won": 0, "dead": 0}
+    death_levels = np.zeros(11, dtype=np.int64)
+    turns = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        actions = sim.greedy_actions() if policy == "greedy" else sim.random_actions()
+        turns += int((sim.state == PLAYING).sum())
+        sim.step(actions)
+        done = np.nonzero(sim.state != PLAYING)[0]
+        if done.size:
+            finished["won"] += int((sim.state[done] == WON).sum())
+            dead = done[sim.state[done] == DEAD]
+            finished["dead"] += dead.size
+            death_levels += np.bincount(np.minimum(sim.level[dead], 10), minlength=11)
+            sim.reset(done)
+    elapsed = time.perf_counter() - start
+    return turns / elapsed, finished, death_levels
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+    steps = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    policy = sys.argv[3] if len(sys.argv) > 3 else "greedy"
+    rate, finished, death_levels = run(n, steps, policy)
+    print("{} games x {} steps ({}): {:.0f} turns/s".format(n, steps, policy, rate))
+    print("won {won}, dead {dead}".format(**finished))
+    print("deaths by level: {}".format({level: int(count) for level, count in enumerate(death_levels) if count}))
@@ -0,0 +1,307 @@
+"""
+RoguePyxel benchmarks
+Times the game's hot paths with a stub pyxel module that counts draw calls
+instead of rendering, so the real Game class runs without a window:
+  - update    Game.update() for one arrow key press (a full turn),
+  - enemies   Engine.move_enemies() on its own,
+  - draw      Game.draw() of the whole map screen, with its draw-call counts,
+  - idle      Game.draw() when nothing changed (the frame cache's case),
+  - gate      stepping onto the gate: the level transition,
+  - levelup   Engine.player_level_up() for one level.
+Scenarios go from the first level (15x10, one Slime) to large, dense
+synthetic dungeons (see SCENARIOS). Each benchmark reports per-call latency
+percentiles in microseconds, over --calls calls or --budget seconds,
+whichever ends first.
+
+Usage:
+  python bench.py [--scenario default] [--calls 200] [--save baseline.json]
+  python bench.py --compare baseline.json [--threshold 1.25]
+--compare exits with status 1 when a p50 got slower than threshold times
+the baseline.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import types
+from collections import Counter
+
+import pyxel as real_pyxel
+
+# ---------------------------
+# Stub Pyxel
+# ---------------------------
+class StubPyxel(types.ModuleType):
+    # Constants and the image banks and tilemaps are Pyxel's own (those work
+    # without a window, so baking the atlas and syncing the tilemap are
+    # timed too); every other attribute is a no-op function that counts
+    # its calls.
+    def __init__(self):
+        types.ModuleType.__init__(self, "pyxel")
+        self.draw_calls = Counter()
+        self.pressed = set()
+        self.images = real_pyxel.images
+        self.Image = real_pyxel.Image
+        self.Tilemap = real_pyxel.Tilemap
+
+    def __getattr__(self, name):
+        if name.isupper():
+            return getattr(real_pyxel, name)
+        def call(*args, **kwargs):
+            self.draw_calls[name] += 1
+        call.__name__ = name
+        setattr(self, name, call)
+        return call
+
+    def btnp(self, key, *args):
+        return key in self.pressed
+
+    def btn(self, key):
+        return key in self.pressed
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def run(self, update, draw):
+        pass
+
+    def quit(self):
+        pass
+
+pyxel = StubPyxel()
+sys.modules["pyxel"] = pyxel
+
+import dungeon
+import levels
+import savegame
+from main import Game
+from engine import Occupancy
+
+# ---------------------------
+# Scenarios
+# ---------------------------
+# name: (width, height, enemies, items); None is the real first level with
+# a Slime added, as on level 1.
+SCENARIOS = {
+    "default": None,
+    "medium": (50, 50, 20, 10),
+    "large": (200, 200, 200, 100),
+    "dense": (500, 500, 2000, 1000),
+}
+
+def setup(name, scratch_dir, seed=0):
+    # Autosaves made while benchmarking go to scratch_dir, not over the
+    # player's save.
+    game = Game()
+    game.autosaver.path = os.path.join(scratch_dir, "bench.sav")
+    game.restart_game(seed)
+    game.start_game()
+    rng = random.Random(seed)
+    shape = SCENARIOS[name]
+    if shape is None:
+        slime = levels.create_enemy("S", rng)
+        # The floor cell three steps from the start that is nearest to it.
+        floor = [(x, y) for y in range(game.grid_height) for x in range(game.grid_width)
+                 if game.grid.is_floor(x, y) and (x, y) not in game.occupancy.enemies]
+        slime.x, slime.y = min(floor, key=lambda cell: abs(abs(cell[0] - game.start_x) + abs(cell[1] - game.start_y) - 3))
+        slime.prev_x, slime.prev_y = slime.x, slime.y
+        game.enemies.append(slime)
+        game.occupancy.add_enemy(slime)
+    else:
+        width, height, enemy_count, item_count = shape
+        layout = dungeon.generate(width, height, rng)
+        level = levels.Level(1, width, height)
+        level.grid = layout.grid
+        level.start_x, level.start_y = layout.start_x, layout.start_y
+        level.gate_x, level.gate_y = layout.free.pick(rng)
+        level.grid.set(level.gate_x, level.gate_y, "𖡄")
+        level.has_gate = True
+        for order in range(enemy_count):
+            enemy = levels.create_enemy(rng.choice("SEZB"), rng)
+            enemy.order = order
+            enemy.x, enemy.y = layout.free.pick(rng)
+            enemy.prev_x, enemy.prev_y = enemy.x, enemy.y
+            level.enemies.append(enemy)
+        game.level = 1
+        game.enter_level(level)
+        game.enemies = level.enemies
+        game.items = []
+        game.occupancy = Occupancy()
+        for enemy in game.enemies:
+            game.occupancy.add_enemy(enemy)
+        game.scheduler.reset(game.enemies)
+        for _ in range(item_count):
+            item = game.generate_item(layout.free.pick(rng), rng.choice(")[=:"))
+            game.items.append(item)
+            game.occupancy.add_item(item)
+        game.player.x, game.player.y = level.start_x, level.start_y
+        game.look()
+    # The player must survive every timed turn.
+    game.player.MaxHits = game.player.Hits = 10 ** 9
+    game.move_camera()
+    return game
+
+def teardown(game):
+    game.pipeline.shutdown()
+    game.autosaver.close()
+    # Pyxel objects must be freed on the thread that made them, and a Game
+    # is only collected as a cycle, on whichever thread the collector runs.
+    game.renderer.tilemap = game.renderer.fog = None
+    game.frames.regions.clear()
+
+# ---------------------------
+# Benchmarks
+# ---------------------------
+MIN_CALLS = 5
+
+def timed(limit, before, run):
+    # limit is (calls, seconds); at least MIN_CALLS calls are timed.
+    calls, budget = limit
+    samples = []
+    total = 0.0
+    for index in range(calls):
+        before(index)
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+        total += samples[-1]
+        if total > budget and len(samples) >= MIN_CALLS:
+            break
+    return samples
+
+def bench_update(game, limit):
+    keys = [pyxel.KEY_LEFT, pyxel.KEY_RIGHT, pyxel.KEY_UP, pyxel.KEY_DOWN]
+    rng = random.Random(1)
+    def before(index):
+        pyxel.pressed = {rng.choice(keys)}
+        game.state = "game"
+    samples = timed(limit, before, game.update)
+    pyxel.pressed = set()
+    return samples
+
+def bench_enemies(game, limit):
+    return timed(limit, lambda index: None, game.move_enemies)
+
+def bench_draw(game, limit):
+    def before(index):
+        game.state = "game"
+        game.frames.invalidate()
+        pyxel.draw_calls.clear()
+    return timed(limit, before, game.draw)
+
+def bench_idle(game, limit):
+    game.state = "game"
+    game.draw()
+    return timed(limit, lambda index: None, game.draw)
+
+def bench_gate(game, limit):
+    # Each call starts next to the gate of a fresh copy of the level, with
+    # the next level already prefetched, as during play.
+    snapshot = savegame.snapshot(game)
+    def before(index):
+        savegame.read_engine(savegame.Reader(memoryview(snapshot)), game)
+        for future in game.pipeline.pending.values():
+            future.result()
+        game.state = "game"
+        game.player.x, game.player.y = game.gate_x - 1, game.gate_y
+    samples = timed(limit, before, lambda: game.step("RIGHT"))
+    savegame.read_engine(savegame.Reader(memoryview(snapshot)), game)
+    return samples
+
+def bench_levelup(game, limit):
+    def before(index):
+        game.player.Exp = game.player.ExpCap
+    return timed(limit, before, game.player_level_up)
+
+BENCHMARKS = [
+    ("update", bench_update),
+    ("enemies", bench_enemies),
+    ("draw", bench_draw),
+    ("idle", bench_idle),
+    ("gate", bench_gate),
+    ("levelup", bench_levelup),
+]
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+def summarize(samples):
+    values = sorted(value * 1e6 for value in samples)
+    return {
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": values[-1],
+    }
+
+def run_scenario(name, limit, scratch_dir):
+    results = {}
+    for bench_name, bench in BENCHMARKS:
+        game = setup(name, scratch_dir)
+        results[bench_name] = summarize(bench(game, limit))
+        if bench_name == "draw":
+            results[bench_name]["draw_calls"] = dict(pyxel.draw_calls)
+        teardown(game)
+    return results
+
+# ---------------------------
+# Report
+# ---------------------------
+def format_results(results, baseline=None, threshold=1.25):
+    lines = []
+    regressions = []
+    lines.append("{:<10} {:<8} {:>10} {:>10} {:>10} {:>10} {:>10}  {}".format(
+        "scenario", "bench", "mean us", "p50", "p90", "p99", "max", ""))
+    for scenario, benches in results.items():
+        for bench_name, stats in benches.items():
+            note = ""
+            old = (baseline or {}).get(scenario, {}).get(bench_name)
+            if old:
+                ratio = stats["p50"] / old["p50"] if old["p50"] else 1.0
+                note = "x{:.2f} vs baseline".format(ratio)
+                if ratio > threshold:
+                    note += " REGRESSION"
+                    regressions.append((scenario, bench_name, ratio))
+            lines.append("{:<10} {:<8} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}  {}".format(
+                scenario, bench_name, stats["mean"], stats["p50"], stats["p90"], stats["p99"], stats["max"], note))
+            if "draw_calls" in stats:
+                calls = ", ".join("{} {}".format(name, count) for name, count in sorted(stats["draw_calls"].items()))
+                lines.append("{:<19} draw calls per frame: {}".format("", calls))
+    return "\n".join(lines), regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark RoguePyxel's hot paths.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable, default: all)")
+    parser.add_argument("--calls", type=int, default=200, help="timed calls per benchmark")
+    parser.add_argument("--budget", type=float, default=2.0, help="seconds per benchmark")
+    parser.add_argument("--save", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", help="compare against a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="roguepyxel-bench-") as scratch_dir:
+        for name in args.scenario or list(SCENARIOS):
+            results[name] = run_scenario(name, (args.calls, args.budget), scratch_dir)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report, regressions = format_results(results, baseline, args.threshold)
+    print(report)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
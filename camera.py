@@ -0,0 +1,62 @@
+"""
+RoguePyxel camera
+The game area is a fixed-size viewport onto the map. The camera keeps the
+player in the middle of it, without showing past the map's edges, and
+centers maps smaller than the viewport as before. It scrolls smoothly:
+each frame covers SCROLL_SPEED of the remaining distance to its target,
+and snaps there once within half a pixel, so a still camera costs
+nothing to draw (see framecache.py).
+Positions are in map pixels: the camera's (x, y) is the map pixel drawn
+at the viewport's top-left corner, and may be negative for small maps.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+SCROLL_SPEED = 0.25
+
+class Camera:
+    def __init__(self, width, height):
+        self.width = width  # viewport size in pixels
+        self.height = height
+        self.x = self.y = 0.0
+        self.target_x = self.target_y = 0
+
+    def follow(self, x, y, map_width, map_height, snap=False):
+        # Targets the view centered on map pixel (x, y); snap jumps there
+        # (a new level) instead of scrolling.
+        self.target_x = self.clamp(x - self.width // 2, map_width, self.width)
+        self.target_y = self.clamp(y - self.height // 2, map_height, self.height)
+        if snap:
+            self.x, self.y = self.target_x, self.target_y
+
+    @staticmethod
+    def clamp(position, map_size, view_size):
+        if map_size <= view_size:
+            return -((view_size - map_size) // 2)
+        return max(0, min(position, map_size - view_size))
+
+    def update(self):
+        # One frame of scrolling; returns whether the camera moved.
+        moved = False
+        distance_x = self.target_x - self.x
+        distance_y = self.target_y - self.y
+        if distance_x:
+            self.x = self.target_x if abs(distance_x) < 0.5 else self.x + distance_x * SCROLL_SPEED
+            moved = True
+        if distance_y:
+            self.y = self.target_y if abs(distance_y) < 0.5 else self.y + distance_y * SCROLL_SPEED
+            moved = True
+        return moved
+
+    def origin(self):
+        # Whole-pixel camera position, as drawn.
+        return int(round(self.x)), int(round(self.y))
+
+    def visible_cells(self, cell_size, grid_width, grid_height):
+        # (x0, y0, x1, y1): the cells overlapping the viewport, x0 <= x < x1.
+        left, top = self.origin()
+        x0 = max(0, left // cell_size)
+        y0 = max(0, top // cell_size)
+        x1 = min(grid_width, -(-(left + self.width) // cell_size))
+        y1 = min(grid_height, -(-(top + self.height) // cell_size))
+        return x0, y0, max(x0, x1), max(y0, y1)
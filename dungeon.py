@@ -0,0 +1,233 @@
+"""
+RoguePyxel dungeon layout
+Carves rooms and corridors out of solid rock:
+  - the map is split recursively (BSP) into leaves of MIN_LEAF..MAX_LEAF
+    cells, one room is carved in each leaf, and the two halves of every
+    split are joined by an L-shaped corridor, so the whole layout is
+    connected by construction and costs O(area), without retries,
+  - a scanline flood fill from the start cell validates it: every floor
+    cell must be reachable (so the gate, gold and enemies always are),
+  - the reachable spans double as the free-cell list the placement code
+    draws from, without replacement and without rejection sampling.
+Run this file directly for a generation benchmark.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import random
+import sys
+import time
+from bisect import bisect_right, insort
+
+from grid import TileGrid, WALL
+
+MIN_LEAF = 6
+MAX_LEAF = 14
+MAX_ATTEMPTS = 4
+
+class Room:
+    def __init__(self, x, y, width, height):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    def center(self):
+        return self.x + self.width // 2, self.y + self.height // 2
+
+class Dungeon:
+    def __init__(self, grid, rooms, free):
+        self.grid = grid
+        self.rooms = rooms
+        self.free = free
+        self.start_x, self.start_y = rooms[0].center()
+
+# ---------------------------
+# Free Cells
+# ---------------------------
+class FreeCells:
+    # Floor cells as horizontal spans (y, x0, x1), x1 exclusive. Cells are
+    # numbered 0..total-1 through the spans; pick() draws one of the cells
+    # not taken yet uniformly by skipping over the taken numbers.
+    def __init__(self, spans):
+        self.spans = spans
+        self.starts = []
+        total = 0
+        for _, x0, x1 in spans:
+            self.starts.append(total)
+            total += x1 - x0
+        self.total = total
+        self.taken = []
+
+    def __len__(self):
+        return self.total - len(self.taken)
+
+    def cell(self, number):
+        index = bisect_right(self.starts, number) - 1
+        y, x0, _ = self.spans[index]
+        return x0 + number - self.starts[index], y
+
+    def number(self, x, y):
+        for index, (span_y, x0, x1) in enumerate(self.spans):
+            if span_y == y and x0 <= x < x1:
+                return self.starts[index] + x - x0
+        return None
+
+    def take(self, x, y):
+        number = self.number(x, y)
+        if number is None or number in self.taken:
+            return False
+        insort(self.taken, number)
+        return True
+
+    def pick(self, rng):
+        number = rng.randrange(len(self))
+        for taken in self.taken:
+            if taken > number:
+                break
+            number += 1
+        insort(self.taken, number)
+        return self.cell(number)
+
+    def pick_in(self, rng, room):
+        # A free cell inside the room, or anywhere when the room is full.
+        cells = [(x, y) for y in range(room.y, room.y + room.height)
+                 for x in range(room.x, room.x + room.width)]
+        rng.shuffle(cells)
+        for x, y in cells:
+            if self.take(x, y):
+                return x, y
+        return self.pick(rng)
+
+# ---------------------------
+# Generation
+# ---------------------------
+def generate(width, height, rng):
+    for _ in range(MAX_ATTEMPTS):
+        grid = TileGrid(width, height, "#")
+        rooms = carve_rooms(grid, rng)
+        start_x, start_y = rooms[0].center()
+        spans, reached = flood_fill(grid, start_x, start_y)
+        if reached == count_floor(grid):
+            free = FreeCells(spans)
+            free.take(start_x, start_y)
+            return Dungeon(grid, rooms, free)
+    raise RuntimeError("could not generate a connected {}x{} dungeon".format(width, height))
+
+def split_leaves(x, y, w, h, rng, leaves, joins):
+    # BSP over a rectangle. Leaves are appended in order; each split adds
+    # (first, second, end): the leaf index ranges of its two halves, which
+    # get joined by a corridor.
+    can_split_x = w >= 2 * MIN_LEAF
+    can_split_y = h >= 2 * MIN_LEAF
+    if (can_split_x or can_split_y) and (max(w, h) > MAX_LEAF or rng.random() < 0.5):
+        if can_split_x and (not can_split_y or w > h or (w == h and rng.random() < 0.5)):
+            cut = rng.randint(MIN_LEAF, w - MIN_LEAF)
+            halves = (x, y, cut, h), (x + cut, y, w - cut, h)
+        else:
+            cut = rng.randint(MIN_LEAF, h - MIN_LEAF)
+            halves = (x, y, w, cut), (x, y + cut, w, h - cut)
+        first = len(leaves)
+        split_leaves(*halves[0], rng, leaves, joins)
+        second = len(leaves)
+        split_leaves(*halves[1], rng, leaves, joins)
+        joins.append((first, second, len(leaves)))
+        return
+    leaves.append((x, y, w, h))
+
+def carve_rooms(grid, rng):
+    # Leaves lie inside the outer wall and are at least MIN_LEAF wide, since
+    # levels are at least 8x8.
+    leaves = []
+    joins = []
+    split_leaves(1, 1, grid.width - 2, grid.height - 2, rng, leaves, joins)
+    rooms = []
+    for x, y, w, h in leaves:
+        # Keep a wall on the far side of the leaf so neighbouring rooms never merge.
+        room_w = rng.randint(3, w - 1)
+        room_h = rng.randint(3, h - 1)
+        room = Room(x + rng.randint(0, w - 1 - room_w), y + rng.randint(0, h - 1 - room_h), room_w, room_h)
+        grid.fill_rect(room.x, room.y, room.width, room.height, ".")
+        rooms.append(room)
+    for first, second, end in joins:
+        a = rooms[rng.randrange(first, second)]
+        b = rooms[rng.randrange(second, end)]
+        carve_corridor(grid, a.center(), b.center(), rng)
+    return rooms
+
+def carve_corridor(grid, start, end, rng):
+    (x0, y0), (x1, y1) = start, end
+    if rng.random() < 0.5:
+        corner_x, corner_y = x1, y0
+    else:
+        corner_x, corner_y = x0, y1
+    for (ax, ay), (bx, by) in (((x0, y0), (corner_x, corner_y)), ((corner_x, corner_y), (x1, y1))):
+        grid.fill_rect(min(ax, bx), min(ay, by), abs(bx - ax) + 1, abs(by - ay) + 1, ".")
+
+# ---------------------------
+# Validation
+# ---------------------------
+def open_rows(grid):
+    # One bytearray per row, 1 on walkable cells and 0 on walls.
+    table = bytearray([1]) * 256
+    table[WALL] = 0
+    return [bytearray(grid.row_codes(y).translate(table)) for y in range(grid.height)]
+
+def count_floor(grid):
+    return sum(row.count(1) for row in open_rows(grid))
+
+def flood_fill(grid, start_x, start_y):
+    # Scanline fill over the walkable cells; returns the reached spans and
+    # the number of cells in them. Visited cells are cleared in `rows`.
+    rows = open_rows(grid)
+    spans = []
+    reached = 0
+    if not rows[start_y][start_x]:
+        return spans, reached
+    stack = [(start_x, start_y)]
+    while stack:
+        x, y = stack.pop()
+        row = rows[y]
+        if not row[x]:
+            continue
+        x0 = row.rfind(0, 0, x) + 1
+        x1 = row.find(0, x)
+        if x1 < 0:
+            x1 = grid.width
+        row[x0:x1] = bytes(x1 - x0)
+        spans.append((y, x0, x1))
+        reached += x1 - x0
+        for ny in (y - 1, y + 1):
+            if ny < 0 or ny >= grid.height:
+                continue
+            other = rows[ny]
+            cx = other.find(1, x0, x1)
+            while cx >= 0:
+                stack.append((cx, ny))
+                cx = other.find(0, cx, x1)
+                if cx < 0:
+                    break
+                cx = other.find(1, cx, x1)
+    spans.sort()
+    return spans, reached
+
+# ---------------------------
+# Benchmark
+# ---------------------------
+def benchmark(sizes=((15, 10), (50, 50), (100, 100), (250, 250), (500, 500)), seconds=1.0):
+    for width, height in sizes:
+        rng = random.Random(0)
+        count = 0
+        start = time.perf_counter()
+        while True:
+            generate(width, height, rng)
+            count += 1
+            elapsed = time.perf_counter() - start
+            if elapsed >= seconds:
+                break
+        print("{:>4}x{:<4} {:>9.1f} levels/s {:>9.3f} ms/level".format(
+            width, height, count / elapsed, 1000 * elapsed / count))
+
+if __name__ == "__main__":
+    benchmark()
+    sys.exit(0)
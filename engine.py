@@ -0,0 +1,854 @@
+"""
+RoguePyxel engine
+Turn logic of RoguePyxel, separated from the Pyxel window and input loop.
+The Engine owns the whole game state and is driven through an action API:
+  - start_game() leaves the title screen.
+  - step(direction) plays one turn ("LEFT", "RIGHT", "UP", "DOWN" or "NONE").
+  - move_inventory_cursor / use_item / unequip_item / discard_item act on
+    the inventory.
+  - next_merchant_item / buy_merchant_item / leave_merchant run the shop.
+  - set_screen switches between the map, inventory and help screens.
+  - ascend() climbs back to the previous floor, from the cell the player
+    arrived on.
+Every action has a code (ACTION_*), and perform(action, arg) dispatches
+on it. An attached recording sees each action before it runs.
+Levels are derived from the run seed and come from a LevelPipeline
+(see levels.py); everything else random draws from RandomStreams, one
+generator per subsystem, also derived from the seed. A seed and the list
+of actions therefore replay a run exactly (see replay.py).
+Nothing here imports pyxel, so it runs headless at full CPU speed.
+The player's field of view (fov.py) is updated after every move; the
+enemies chase only a player they can see, and the cells seen so far on
+the level are kept in the explored layer for the fog of war.
+Enemies take their turns from an energy scheduler (scheduler.py): fast
+ones act more often than the player, slow ones less, and those far from
+the player are parked until it comes near.
+clone() copies the game state cheaply for lookahead search (the grid is
+copy-on-write), and push_undo/undo keep a stack of such copies.
+Floors the player leaves go to a level store (levelstore.py) and come
+back as they were when the player returns, through the gate or back up.
+Run this file directly for a random-walk soak test.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import itertools
+import random
+import math
+import sys
+import time
+
+import eventlog
+from entities import Stats
+from fov import FieldOfView
+from grid import FLOOR
+from levels import LevelPipeline, level_seed
+from levelstore import Floor, LevelStore
+from pathfinding import DistanceField
+from registry import ENEMY_NAMES, MERCHANT_STOCK, spawn_item
+from scheduler import Scheduler, TURN_TIME
+
+DIRECTIONS = ["LEFT", "RIGHT", "UP", "DOWN", "NONE"]
+DIRECTION_CODES = {direction: code for code, direction in enumerate(DIRECTIONS)}
+SCREENS = ["game", "inventory", "help"]
+
+# Action codes, as stored in recordings (see replay.py)
+(ACTION_STEP, ACTION_START, ACTION_USE, ACTION_UNEQUIP, ACTION_DISCARD,
+ ACTION_NEXT_ITEM, ACTION_BUY, ACTION_LEAVE, ACTION_SCREEN, ACTION_RESTART,
+ ACTION_CURSOR, ACTION_ASCEND) = range(12)
+
+# Grid versions are unique across all engines, so cached data keyed by
+# version (fov.py, pathfinding.py) stays valid when clones edit their grids.
+GRID_VERSIONS = itertools.count(1)
+
+# Engine attributes a clone shares as they are (immutable values), and the
+# ones it gets its own copy of (see Engine.clone).
+SHARED_STATE = ("seed", "state", "player_name", "first_move_done", "visible", "grid_version", "level",
+                "gate_x", "gate_y", "grid_width", "grid_height", "start_x", "start_y",
+                "merchant_selection", "inventory_cursor", "turns", "last_damage_source")
+CLONED_STATE = ("rng", "player", "grid", "explored", "fov", "paths", "enemies", "items", "occupancy",
+                "scheduler", "floors", "level_sizes", "merchant_items", "picked_items")
+
+# ---------------------------
+# Random Streams
+# ---------------------------
+STREAMS = ("combat", "loot", "ai", "merchant", "growth")
+
+class RandomStreams:
+    # One generator per subsystem, each seeded from the run seed, so that
+    # e.g. an extra AI draw does not shift every later damage roll.
+    def __init__(self, seed):
+        self.shared = {}  # name -> [generator, sharers], see copy()
+        for name in STREAMS:
+            setattr(self, name, random.Random("{}:{}".format(seed, name)))
+
+    def copy(self):
+        # Copy-on-write, as copying a generator's state is slow: the copy
+        # shares the generators, and whichever side first draws from a
+        # shared one gets its own copy of it (the last sharer keeps it).
+        streams = RandomStreams.__new__(RandomStreams)
+        streams.shared = {}
+        for name in STREAMS:
+            holder = self.shared.get(name)
+            if holder is None:
+                holder = self.shared[name] = [self.__dict__.pop(name), 1]
+            holder[1] += 1
+            streams.shared[name] = holder
+        return streams
+
+    def __getattr__(self, name):
+        # Only called for streams still shared with a copy.
+        holder = self.__dict__.get("shared", {}).pop(name, None)
+        if holder is None:
+            raise AttributeError(name)
+        generator = holder[0]
+        if holder[1] > 1:
+            holder[1] -= 1
+            state = generator.getstate()
+            generator = random.Random.__new__(random.Random)
+            generator.setstate(state)
+        setattr(self, name, generator)
+        return generator
+
+# ---------------------------
+# Occupancy Index
+# ---------------------------
+class Occupancy:
+    # Per-cell buckets of the enemies and items on the level, so that cell
+    # lookups and collision checks do not scan the entity lists. The Engine
+    # keeps it in sync on every spawn, move, pickup and death. Gold and the
+    # gate live in the grid itself, which is already a per-cell map.
+    def __init__(self):
+        self.enemies = {}
+        self.items = {}
+
+    def add_enemy(self, enemy):
+        self.enemies.setdefault((enemy.x, enemy.y), []).append(enemy)
+
+    def remove_enemy(self, enemy):
+        cell = self.enemies[(enemy.x, enemy.y)]
+        cell.remove(enemy)
+        if not cell:
+            del self.enemies[(enemy.x, enemy.y)]
+
+    def move_enemy(self, enemy, x, y):
+        if enemy.x == x and enemy.y == y:
+            return
+        self.remove_enemy(enemy)
+        enemy.x, enemy.y = x, y
+        self.add_enemy(enemy)
+
+    def enemies_at(self, x, y):
+        # Enemies on the cell, in the order of the enemy list.
+        cell = self.enemies.get((x, y))
+        if not cell:
+            return []
+        if len(cell) == 1:
+            return [cell[0]]
+        return sorted(cell, key=lambda enemy: enemy.order)
+
+    def add_item(self, item):
+        self.items.setdefault((item.x, item.y), []).append(item)
+
+    def remove_item(self, item):
+        cell = self.items[(item.x, item.y)]
+        cell.remove(item)
+        if not cell:
+            del self.items[(item.x, item.y)]
+
+    def items_at(self, x, y):
+        return list(self.items.get((x, y), ()))
+
+    @staticmethod
+    def in_rect(buckets, x0, y0, x1, y1):
+        # (cell, bucket) pairs of self.enemies or self.items inside the
+        # rectangle x0 <= x < x1, y0 <= y < y1. Probes the rectangle's
+        # cells or filters the buckets, whichever is fewer, so a viewport
+        # query costs at most its area whatever the size of the level.
+        if (x1 - x0) * (y1 - y0) < len(buckets):
+            get = buckets.get
+            for y in range(y0, y1):
+                for x in range(x0, x1):
+                    bucket = get((x, y))
+                    if bucket:
+                        yield (x, y), bucket
+        else:
+            for cell, bucket in buckets.items():
+                if x0 <= cell[0] < x1 and y0 <= cell[1] < y1:
+                    yield cell, bucket
+
+# ---------------------------
+# Engine (game state + turn logic)
+# ---------------------------
+class Engine:
+    def __init__(self, seed=None, pipeline=None):
+        # Levels come from the pipeline; headless runs build them on demand.
+        self.pipeline = pipeline or LevelPipeline("sync")
+        # Floors left behind, so they can be revisited.
+        self.floors = LevelStore()
+        # Bounded; kept across runs so an attached log writer keeps streaming.
+        self.messages = eventlog.MessageLog()
+        self.reset_state(seed)
+
+    def reset_state(self, seed=None):
+        # Every level of the run is derived from this seed.
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.rng = RandomStreams(self.seed)
+        self.recording = None
+        self.undo_stack = []
+        self.pipeline.clear()
+        self.floors.clear()
+
+        # Game state: "title", "game", "inventory", "merchant", "help", "gameover", "win"
+        self.state = "title"
+        self.messages.clear()
+        self.player_name = "Hero"
+        self.player = Stats()
+
+        # Flag to clear initial instructions upon the first move.
+        self.first_move_done = False
+
+        # Lists for enemies and items, plus their per-cell index
+        self.enemies = []
+        self.items = []
+        self.occupancy = Occupancy()
+
+        # Distance field from the player, shared by all chasing enemies
+        self.paths = DistanceField()
+
+        # Enemy turn order; its clock runs for the whole game.
+        self.scheduler = Scheduler()
+
+        # Field of view: the cells the player sees now (also the enemies'
+        # line of sight) and, per level, every cell seen so far.
+        self.fov = FieldOfView()
+        self.visible = frozenset()
+        self.explored = bytearray()
+
+        # Level management: the first level is built now, the next one is
+        # prepared in the background while this one is played.
+        self.grid_version = next(GRID_VERSIONS)
+        self.level = 0
+        self.level_sizes = []
+        self.gate_x = self.gate_y = 0
+        first_level = self.pipeline.take(0, level_seed(self.seed, 0))
+        self.enter_level(first_level)
+        self.pipeline.prefetch(1, level_seed(self.seed, 1))
+
+        # Place player at the start cell (the middle of the first room).
+        self.player.x = first_level.start_x
+        self.player.y = first_level.start_y
+        self.look()
+
+        # Merchant store variables
+        self.merchant_items = []
+        self.merchant_selection = 0
+
+        # Inventory selection cursor
+        self.inventory_cursor = 0
+
+        # Run bookkeeping: turns played, what last hurt the player, items picked up
+        self.turns = 0
+        self.last_damage_source = ""
+        self.picked_items = []
+
+    def restart_game(self, seed=None):
+        # A new run; an attached recording carries on, with the new seed.
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.record(ACTION_RESTART, seed)
+        recording = self.recording
+        self.reset_state(seed)
+        self.recording = recording
+
+    # ---------------------------
+    # Cloning and Undo
+    # ---------------------------
+    def clone(self):
+        # An independent headless Engine in the same state, for lookahead
+        # search. Clones are cheap: the grid is copy-on-write, items and
+        # cached views are shared (neither is changed once made; see
+        # discard_item), and only the enemies, the player and the random
+        # streams are copied.
+        # A clone has no recording, no undo history and no log writer, and
+        # builds the levels it reaches itself.
+        engine = Engine.__new__(Engine)
+        for name in SHARED_STATE:
+            setattr(engine, name, getattr(self, name))
+        engine.pipeline = self.pipeline if self.pipeline.mode == "sync" else LevelPipeline("sync")
+        engine.messages = self.messages.copy()
+        engine.recording = None
+        engine.undo_stack = []
+        engine.rng = self.rng.copy()
+        engine.player = self.player.copy()
+        engine.grid = self.grid.copy()
+        engine.explored = bytearray(self.explored)
+        engine.fov = self.fov.copy(engine.grid)
+        engine.paths = DistanceField()
+        engine.enemies = [enemy.copy() for enemy in self.enemies]
+        engine.items = list(self.items)
+        engine.occupancy = Occupancy()
+        for enemy in engine.enemies:
+            engine.occupancy.add_enemy(enemy)
+        engine.occupancy.items = {cell: list(items) for cell, items in self.occupancy.items.items()}
+        engine.scheduler = self.scheduler.copy(engine.enemies)
+        engine.floors = self.floors.copy()
+        engine.level_sizes = list(self.level_sizes)
+        engine.merchant_items = list(self.merchant_items)
+        engine.picked_items = list(self.picked_items)
+        return engine
+
+    def push_undo(self):
+        # Saves the current state on the undo stack. Undo is for search and
+        # tools: undone actions stay in an attached recording.
+        self.undo_stack.append(self.clone())
+
+    def undo(self):
+        # Goes back to the state of the last push_undo; False if there is none.
+        if not self.undo_stack:
+            return False
+        engine = self.undo_stack.pop()
+        for name in SHARED_STATE + CLONED_STATE:
+            setattr(self, name, getattr(engine, name))
+        self.messages.restore(engine.messages)
+        return True
+
+    # ---------------------------
+    # Levels and Grid
+    # ---------------------------
+    def enter_level(self, level):
+        # Swap in a level built by the pipeline. Levels past the last gate
+        # have none, and the old gate position is kept.
+        self.grid = level.grid
+        self.grid_width = level.width
+        self.grid_height = level.height
+        self.grid_version = next(GRID_VERSIONS)
+        self.explored = bytearray(level.width * level.height)
+        self.level_sizes.append([level.width, level.height])
+        self.start_x, self.start_y = level.start_x, level.start_y
+        if level.has_gate:
+            self.gate_x, self.gate_y = level.gate_x, level.gate_y
+
+    def store_floor(self):
+        # Puts the current floor in the level store as the player leaves it.
+        self.floors.put(Floor(self.level, self.grid, self.start_x, self.start_y, self.gate_x, self.gate_y,
+                              self.scheduler.clock, self.explored, self.enemies, self.items))
+
+    def restore_floor(self, floor):
+        # Makes a stored floor current again, on copies since the stored one
+        # stays unchanged. Its enemies' schedule is moved on by the time the
+        # player was away, so they take up where they were and do not catch
+        # up on the missed turns all at once.
+        self.grid = floor.grid.copy()
+        self.grid_width = floor.grid.width
+        self.grid_height = floor.grid.height
+        self.grid_version = next(GRID_VERSIONS)
+        self.explored = bytearray(floor.explored)
+        self.start_x, self.start_y = floor.start_x, floor.start_y
+        self.gate_x, self.gate_y = floor.gate_x, floor.gate_y
+        away = self.scheduler.clock - floor.clock
+        self.enemies = [enemy.copy() for enemy in floor.enemies]
+        for enemy in self.enemies:
+            enemy.next_time += away
+        self.items = list(floor.items)
+
+    def change_floor(self, number):
+        # Leaves the current floor for another: one visited before comes back
+        # from the level store, a new one from the pipeline. Returns True
+        # for a new floor.
+        self.store_floor()
+        self.level = number
+        floor = self.floors.take(number)
+        if floor is not None:
+            self.restore_floor(floor)
+        else:
+            level = self.pipeline.take(number, level_seed(self.seed, number))
+            self.enter_level(level)
+            # Every level brings its own enemies, the merchant level included:
+            # the previous ones could stand inside the new walls.
+            self.enemies = level.enemies
+            self.items = []
+        self.occupancy = Occupancy()
+        for enemy in self.enemies:
+            self.occupancy.add_enemy(enemy)
+        for item in self.items:
+            self.occupancy.add_item(item)
+        self.scheduler.reset(self.enemies)
+        if number + 1 not in self.floors:
+            self.pipeline.prefetch(number + 1, level_seed(self.seed, number + 1))
+        return floor is None
+
+    def set_cell(self, x, y, symbol):
+        # All grid edits go through here so the grid version (used to
+        # invalidate cached path data) stays current.
+        self.grid.set(x, y, symbol)
+        self.grid_version = next(GRID_VERSIONS)
+
+    def look(self):
+        # Updates the field of view from the player's cell. A cached view was
+        # marked explored when it was computed (the cache starts empty on
+        # every level), so only new views are marked.
+        visible, computed = self.fov.lookup(self.grid, self.grid_version, self.player.x, self.player.y)
+        self.visible = visible
+        if computed:
+            width = self.grid_width
+            explored = self.explored
+            for x, y in visible:
+                explored[y * width + x] = 1
+
+    # ---------------------------
+    # Actions
+    # ---------------------------
+    def log(self, kind, text):
+        self.messages.add(self.turns, kind, text)
+
+    def record(self, action, arg=0):
+        if self.recording is not None:
+            self.recording.add(self, action, arg)
+
+    def perform(self, action, arg=0):
+        # Runs an action given by its code, as replays do.
+        if action == ACTION_STEP:
+            self.step(DIRECTIONS[arg])
+        elif action == ACTION_START:
+            self.start_game()
+        elif action == ACTION_USE:
+            self.use_item(arg)
+        elif action == ACTION_UNEQUIP:
+            self.unequip_item()
+        elif action == ACTION_DISCARD:
+            self.discard_item(arg)
+        elif action == ACTION_NEXT_ITEM:
+            self.next_merchant_item()
+        elif action == ACTION_BUY:
+            self.buy_merchant_item()
+        elif action == ACTION_LEAVE:
+            self.leave_merchant()
+        elif action == ACTION_SCREEN:
+            self.set_screen(SCREENS[arg])
+        elif action == ACTION_RESTART:
+            self.restart_game(arg)
+        elif action == ACTION_CURSOR:
+            self.move_inventory_cursor(arg)
+        elif action == ACTION_ASCEND:
+            self.ascend()
+
+    def start_game(self):
+        self.record(ACTION_START)
+        if self.state != "title":
+            return self.state
+        self.state = "game"
+        self.messages.clear()
+        self.log(eventlog.INFO, "Welcome, {}! Use arrow keys to move. (I: Inventory, H: Help)".format(self.player_name))
+        return self.state
+
+    def step(self, direction):
+        # Play one turn. Returns the state the game is in afterwards.
+        if self.recording is not None:
+            self.recording.add(self, ACTION_STEP, DIRECTION_CODES.get(direction, DIRECTION_CODES["NONE"]))
+        if self.state != "game":
+            return self.state
+
+        if not self.first_move_done:
+            self.messages.clear()
+            self.first_move_done = True
+
+        self.turns += 1
+        origin = (self.player.x, self.player.y)
+        self.move_player(direction)
+        attacked = self.check_enemy_collision(player_move=True, direction=direction)
+        dead = self.check_enemies_dead(attacked)
+        for enemy in dead:
+            self.log(eventlog.KILL, "You defeated a {}!".format(enemy.type))
+            self.player.Exp += enemy.Level
+            drop_type = self.kill_enemy_reward(enemy)
+            if drop_type:
+                item = self.generate_item([enemy.x, enemy.y], drop_type)
+                if item:
+                    self.items.append(item)
+                    self.occupancy.add_item(item)
+        self.collect_items()
+        hits_before = self.player.Hits
+        self.player.renew_stats()
+        if self.player.Hits < hits_before:
+            self.last_damage_source = "Starvation"
+        self.player_level_up()
+        if self.win_condition():
+            self.state = "win"
+        acted = self.move_enemies()
+        self.check_enemy_collision(player_move=False, direction="")
+        # Enemies that did not act keep prev == position, so a later
+        # collision never sends one back to a stale cell.
+        for enemy in acted:
+            enemy.prev_x, enemy.prev_y = enemy.x, enemy.y
+        if self.check_and_remove_object("G"):
+            gold_found = self.rng.loot.randint(10, 50)
+            self.player.Gold += gold_found
+            self.log(eventlog.GOLD, "You found {} gold!".format(gold_found))
+        # --- Gate & Stage Progression ---
+        # The gate is taken by stepping onto it, so a player who came back
+        # up and stands on it does not go down again by waiting or fighting.
+        merchant = False
+        if (self.player.x, self.player.y) == (self.gate_x, self.gate_y) != origin:
+            new_floor = self.change_floor(self.level + 1)
+            self.player.x = self.start_x
+            self.player.y = self.start_y
+            # The merchant only greets the player on the first visit.
+            merchant = new_floor and self.level == 3
+
+        self.look()
+        if merchant:
+            self.state = "merchant"
+            self.setup_merchant()
+            return self.state
+        if self.player.Hits <= 0:
+            self.state = "gameover"
+        return self.state
+
+    def ascend(self):
+        # Climbs back to the previous floor, from the cell the player arrived
+        # on, and comes out on that floor's gate. Takes no turn.
+        self.record(ACTION_ASCEND)
+        if self.state != "game" or self.level == 0:
+            return self.state
+        if (self.player.x, self.player.y) != (self.start_x, self.start_y):
+            self.log(eventlog.INFO, "The way back up is where you came in.")
+            return self.state
+        self.change_floor(self.level - 1)
+        self.player.x = self.gate_x
+        self.player.y = self.gate_y
+        self.look()
+        self.log(eventlog.INFO, "You climb back up.")
+        return self.state
+
+    def move_player(self, direction):
+        orig_x, orig_y = self.player.x, self.player.y
+        if direction == "LEFT":
+            self.player.x -= 1
+        elif direction == "RIGHT":
+            self.player.x += 1
+        elif direction == "UP":
+            self.player.y -= 1
+        elif direction == "DOWN":
+            self.player.y += 1
+
+        if not self.grid.is_walkable(self.player.x, self.player.y):
+            self.log(eventlog.WALL, "You hit a wall!")
+            self.player.x, self.player.y = orig_x, orig_y
+        else:
+            self.log(eventlog.MOVE, "Player moved to ({}, {})".format(self.player.x, self.player.y))
+        self.player.MoveCounter += 1
+
+    def check_and_remove_object(self, obj_symbol):
+        x, y = self.player.x, self.player.y
+        if self.grid.get(x, y) == obj_symbol:
+            self.set_cell(x, y, ".")
+            return True
+        return False
+
+    # ---------------------------
+    # Enemy Movement
+    # ---------------------------
+    def move_enemies(self):
+        # One turn of the enemy clock: enemies near the player wake up, and
+        # every enemy due acts (see scheduler.py). Returns those that acted.
+        self.paths.update(self.player.x, self.player.y, self.grid_version, self.grid.is_floor)
+        self.look()
+        scheduler = self.scheduler
+        scheduler.clock += TURN_TIME
+        scheduler.wake_near(self.occupancy, self.player.x, self.player.y)
+        acted = []
+        for enemy in scheduler.due(self.player.x, self.player.y):
+            # An enemy that has reached the player stays there for the
+            # collision check, instead of stepping off again when it acts
+            # twice in a turn.
+            if (enemy.x, enemy.y) != (self.player.x, self.player.y):
+                self.move_enemy(enemy)
+            acted.append(enemy)
+        return acted
+
+    def move_enemy(self, enemy):
+        # Enemies that see the player within their sight radius step along
+        # the shortest path to them; the others, and chasers with no path,
+        # wander at random. Line of sight is the player's field of view.
+        # prev_x/prev_y still hold where the enemy started the turn, which
+        # is where an attack sends it back to, however often it acts.
+        direction = ""
+        radius = int(5 / 9 * enemy.Level + 22 / 9)
+        choices = []
+        dx = enemy.x - self.player.x
+        dy = enemy.y - self.player.y
+        if dx * dx + dy * dy <= radius * radius and (enemy.x, enemy.y) in self.visible:
+            choices = self.paths.best_steps(enemy.x, enemy.y)
+        if choices:
+            direction = self.rng.ai.choice(choices)
+        else:
+            choices = []
+            if enemy.x > 0 and self.is_cell_empty(enemy.x-1, enemy.y):
+                choices.append("LEFT")
+            if enemy.x < self.grid_width - 1 and self.is_cell_empty(enemy.x+1, enemy.y):
+                choices.append("RIGHT")
+            if enemy.y > 0 and self.is_cell_empty(enemy.x, enemy.y-1):
+                choices.append("UP")
+            if enemy.y < self.grid_height - 1 and self.is_cell_empty(enemy.x, enemy.y+1):
+                choices.append("DOWN")
+            if choices:
+                direction = self.rng.ai.choice(choices)
+        if direction == "LEFT":
+            self.occupancy.move_enemy(enemy, enemy.x - 1, enemy.y)
+        elif direction == "RIGHT":
+            self.occupancy.move_enemy(enemy, enemy.x + 1, enemy.y)
+        elif direction == "UP":
+            self.occupancy.move_enemy(enemy, enemy.x, enemy.y - 1)
+        elif direction == "DOWN":
+            self.occupancy.move_enemy(enemy, enemy.x, enemy.y + 1)
+
+    def is_cell_empty(self, x, y):
+        return self.grid.is_floor(x, y)
+
+    def check_enemy_collision(self, player_move, direction):
+        # Returns the enemies the player attacked, in list order.
+        attacked = []
+        if player_move:
+            # Enemies are attacked in list order; bouncing back off one enemy
+            # can land the player on a cell shared with a later one.
+            last_order = -1
+            while True:
+                enemy = None
+                for candidate in self.occupancy.enemies_at(self.player.x, self.player.y):
+                    if candidate.order > last_order:
+                        enemy = candidate
+                        break
+                if enemy is None:
+                    break
+                last_order = enemy.order
+                attacked.append(enemy)
+                self.log(eventlog.ATTACK, "Player attacked {}!".format(enemy.type))
+                player_damage = math.ceil(self.player.Str * self.rng.combat.randint(50, 100) / 100)
+                damage_to_enemy = math.ceil(player_damage * (100 / (100 + enemy.Armor)))
+                enemy.Hits -= damage_to_enemy
+                self.log(eventlog.ATTACK, "Dealt {} damage to {}.".format(damage_to_enemy, enemy.type))
+                if direction == "LEFT":
+                    self.player.x += 1
+                elif direction == "RIGHT":
+                    self.player.x -= 1
+                elif direction == "UP":
+                    self.player.y += 1
+                elif direction == "DOWN":
+                    self.player.y -= 1
+        else:
+            for enemy in self.occupancy.enemies_at(self.player.x, self.player.y):
+                self.log(eventlog.DAMAGE, "{} attacked Player!".format(enemy.type))
+                enemy_damage = math.ceil(enemy.Str * self.rng.combat.randint(50, 100) / 100)
+                damage_to_player = math.ceil(enemy_damage * (100 / (100 + self.player.Armor)))
+                self.player.Hits -= damage_to_player
+                self.last_damage_source = enemy.type
+                self.log(eventlog.DAMAGE, "Player took {} damage.".format(damage_to_player))
+                # Revert enemy to previous position after attack.
+                self.occupancy.move_enemy(enemy, enemy.prev_x, enemy.prev_y)
+        return attacked
+
+    def check_enemies_dead(self, candidates=None):
+        # Only enemies the player hit can have died; candidates narrows the
+        # check to them (in list order) instead of the whole level.
+        dead = []
+        for enemy in list(self.enemies if candidates is None else candidates):
+            if enemy.Hits <= 0:
+                dead.append(enemy)
+                self.enemies.remove(enemy)
+                self.occupancy.remove_enemy(enemy)
+        return dead
+
+    def kill_enemy_reward(self, enemy):
+        # The symbol of the item the enemy drops, if any (see registry.json).
+        template = ENEMY_NAMES[enemy.type]
+        if template.drop:
+            return template.drop
+        drop_chance = self.rng.loot.randint(0, 40 + 3 * enemy.Level + self.level)
+        if self.rng.loot.randint(0, 100) <= drop_chance:
+            return self.rng.loot.choice(template.loot)
+        return None
+
+    def generate_item(self, coord, item_type):
+        x, y = coord
+        if x is None or y is None:
+            x, y = self.player.x, self.player.y
+            while (x == self.player.x and y == self.player.y) or (x, y) in self.occupancy.enemies or self.grid.code(x, y) != FLOOR:
+                x = self.rng.loot.randint(0, self.grid_width - 1)
+                y = self.rng.loot.randint(0, self.grid_height - 1)
+        item = spawn_item(item_type, self.rng.loot)
+        item.x, item.y = x, y
+        self.set_cell(x, y, item.type)
+        return item
+
+    def collect_items(self):
+        for item in self.occupancy.items_at(self.player.x, self.player.y):
+            self.player.Inventory.append(item)
+            self.picked_items.append(item.name)
+            self.log(eventlog.LOOT, "You picked up {}!".format(item.name))
+            self.items.remove(item)
+            self.occupancy.remove_item(item)
+            self.set_cell(item.x, item.y, ".")
+
+    def player_level_up(self):
+        while self.player.Exp >= self.player.ExpCap:
+            self.player.Exp -= self.player.ExpCap
+            self.player.Level += 1
+            self.player.ExpCap += 1
+            stat_to_increase = self.rng.growth.choice(["max hits", "max strength"])
+            bonus = self.rng.growth.randint(3, 5)
+            if stat_to_increase == "max hits":
+                self.player.MaxHits += bonus
+            else:
+                self.player.MaxStr += bonus
+            self.log(eventlog.LEVEL_UP, "Level up! {} increased by {}.".format(stat_to_increase, bonus))
+
+    def win_condition(self):
+        for item in self.player.Inventory:
+            if item.type == "?":
+                return True
+        return False
+
+    # ---------------------------
+    # Inventory Management
+    # ---------------------------
+    def set_screen(self, screen):
+        # Opens the inventory or help screen, or goes back to the map.
+        self.record(ACTION_SCREEN, SCREENS.index(screen))
+        self.state = screen
+
+    def move_inventory_cursor(self, delta):
+        self.record(ACTION_CURSOR, delta)
+        if delta < 0:
+            self.inventory_cursor = max(0, self.inventory_cursor + delta)
+        else:
+            self.inventory_cursor = min(len(self.player.Inventory) - 1, self.inventory_cursor + delta)
+
+    def use_item(self, index):
+        self.record(ACTION_USE, index)
+        if 0 <= index < len(self.player.Inventory):
+            item = self.player.Inventory[index]
+            if item.type == ":":
+                self.log(eventlog.ITEM, "You ate {}.".format(item.name))
+                self.player.Satiety += item.Satiety
+                self.player.Inventory.pop(index)
+            elif item.type == "*":
+                self.log(eventlog.ITEM, "You equipped {} but nothing happened.".format(item.name))
+            else:
+                if item not in self.player.EquippedItems:
+                    if item.type == ")":
+                        self.player.MaxStr += item.Str
+                        self.player.Str += item.Str
+                    elif item.type == "[":
+                        self.player.Armor += item.Armor
+                    else:
+                        self.player.MaxHits += item.Hits
+                        self.player.Hits += item.Hits
+                    self.player.EquippedItems.append(item)
+                    self.player.Inventory.pop(index)
+                    self.log(eventlog.ITEM, "Equipped {}.".format(item.name))
+
+    def unequip_item(self):
+        self.record(ACTION_UNEQUIP)
+        if self.player.EquippedItems:
+            item = self.player.EquippedItems.pop(0)
+            self.player.Inventory.append(item)
+            if item.type == ")":
+                self.player.MaxStr -= item.Str
+                self.player.Str -= item.Str
+            elif item.type == "[":
+                self.player.Armor -= item.Armor
+            else:
+                self.player.MaxHits -= item.Hits
+                self.player.Hits -= item.Hits
+            self.log(eventlog.ITEM, "Unequipped {}.".format(item.name))
+            # Taking off a ring of Hits can be fatal.
+            if self.player.Hits <= 0:
+                self.state = "gameover"
+
+    def discard_item(self, index):
+        self.record(ACTION_DISCARD, index)
+        if 0 <= index < len(self.player.Inventory):
+            # The player stands on the gate after climbing back up; an item
+            # there would replace the gate on the map.
+            if (self.player.x, self.player.y) == (self.gate_x, self.gate_y):
+                self.log(eventlog.INFO, "There is no room to drop anything on the gate.")
+                return
+            # A copy goes back on the map: the item itself may be shared
+            # with clones and undo snapshots, so it is never moved.
+            item = self.player.Inventory.pop(index).copy()
+            self.log(eventlog.ITEM, "Discarded {}.".format(item.name))
+            item.x, item.y = self.player.x, self.player.y
+            self.set_cell(item.x, item.y, item.type)
+            self.items.append(item)
+            self.occupancy.add_item(item)
+
+    # ---------------------------
+    # Merchant Store
+    # ---------------------------
+    def setup_merchant(self):
+        self.merchant_items = [template.spawn(self.rng.merchant) for template in MERCHANT_STOCK]
+        self.merchant_selection = 0
+
+    def next_merchant_item(self):
+        self.record(ACTION_NEXT_ITEM)
+        if self.merchant_items:
+            self.merchant_selection = (self.merchant_selection + 1) % len(self.merchant_items)
+
+    def buy_merchant_item(self):
+        self.record(ACTION_BUY)
+        if not 0 <= self.merchant_selection < len(self.merchant_items):
+            return
+        item = self.merchant_items[self.merchant_selection]
+        if self.player.Gold >= 100:
+            self.player.Gold -= 100
+            self.player.Inventory.append(item)
+            self.log(eventlog.MERCHANT, "Purchased {} with gold.".format(item.name))
+            self.merchant_items.pop(self.merchant_selection)
+        else:
+            gem_found = False
+            for inv_item in self.player.Inventory:
+                if "gem" in inv_item.name.lower():
+                    self.player.Inventory.remove(inv_item)
+                    gem_found = True
+                    break
+            if gem_found:
+                self.player.Inventory.append(item)
+                self.log(eventlog.MERCHANT, "Purchased {} with a gem.".format(item.name))
+                self.merchant_items.pop(self.merchant_selection)
+            else:
+                self.log(eventlog.MERCHANT, "Not enough gold or gem!")
+
+    def leave_merchant(self):
+        self.record(ACTION_LEAVE)
+        # Reposition the player to the level start when exiting the merchant.
+        self.player.x = self.start_x
+        self.player.y = self.start_y
+        self.look()
+        self.state = "game"
+
+# ---------------------------
+# Headless soak test
+# ---------------------------
+def soak(turns, seed=None):
+    # Plays random moves for the given number of turns, restarting whenever
+    # a run ends, and returns the number of turns played per second.
+    if seed is not None:
+        random.seed(seed)
+    engine = Engine()
+    engine.start_game()
+    start = time.perf_counter()
+    for _ in range(turns):
+        if engine.state == "merchant":
+            engine.leave_merchant()
+        elif engine.state != "game":
+            engine.restart_game()
+            engine.start_game()
+        engine.step(random.choice(DIRECTIONS))
+    elapsed = time.perf_counter() - start
+    return turns / elapsed if elapsed > 0 else float("inf")
+
+if __name__ == "__main__":
+    turns = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    rate = soak(turns)
+    print("{} turns, {:.0f} turns/s".format(turns, rate))
@@ -0,0 +1,122 @@
+"""
+RoguePyxel entities
+Plain state holders for the player, enemies, items and the level gate.
+They use __slots__: no per-instance dict, so large swarms stay small and
+quick to make, and a misspelt attribute fails instead of being added.
+What an enemy or item starts with comes from registry.py.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+# ---------------------------
+# Entity Classes
+# ---------------------------
+class Gate:
+    __slots__ = ("x", "y")
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+
+class Stats:
+    __slots__ = ("x", "y", "Level", "Hits", "MaxHits", "Str", "MaxStr", "Gold", "Armor", "Exp", "ExpCap",
+                 "Inventory", "EquippedItems", "StatusEffect", "Satiety", "MoveCounter")
+
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+        self.Level = 1
+        self.Hits = 12
+        self.MaxHits = 12
+        self.Str = 8
+        self.MaxStr = 8
+        self.Gold = 0
+        self.Armor = 5
+        self.Exp = 0
+        self.ExpCap = 1
+        self.Inventory = []
+        self.EquippedItems = []
+        self.StatusEffect = ""
+        self.Satiety = 100
+        self.MoveCounter = 0
+
+    def copy(self):
+        # Items are never changed once made (a discarded item goes back on
+        # the map as a copy), so the lists are copied but the items shared.
+        stats = Stats.__new__(Stats)
+        stats.x, stats.y = self.x, self.y
+        stats.Level, stats.Hits, stats.MaxHits = self.Level, self.Hits, self.MaxHits
+        stats.Str, stats.MaxStr, stats.Gold, stats.Armor = self.Str, self.MaxStr, self.Gold, self.Armor
+        stats.Exp, stats.ExpCap = self.Exp, self.ExpCap
+        stats.Inventory = list(self.Inventory)
+        stats.EquippedItems = list(self.EquippedItems)
+        stats.StatusEffect, stats.Satiety, stats.MoveCounter = self.StatusEffect, self.Satiety, self.MoveCounter
+        return stats
+
+    def renew_stats(self):
+        renew_point = 5
+        if self.Hits <= int(0.5 * self.MaxHits):
+            renew_point = 3
+        if self.MoveCounter >= renew_point:
+            if self.Hits < self.MaxHits:
+                self.Hits += 1
+            if self.Str < self.MaxStr:
+                self.Str += 1
+            if self.Satiety > 0:
+                self.Satiety -= 1
+            self.MoveCounter = 0
+        if self.Satiety > 100:
+            self.Satiety = 100
+        elif 5 <= self.Satiety < 10:
+            self.Hits -= 1
+        elif 0 <= self.Satiety < 5:
+            self.Hits -= 2
+
+class Enemy:
+    __slots__ = ("x", "y", "prev_x", "prev_y", "type", "MaxHits", "Hits", "Str", "Armor", "Level",
+                 "order", "Speed", "next_time", "awake")
+
+    def __init__(self, type="Slime", Hits=4, Str=1, Armor=1, Level=1, Speed=100):
+        self.x = 0
+        self.y = 0
+        self.prev_x = 0   # Store previous x before moving
+        self.prev_y = 0   # Store previous y before moving
+        self.type = type
+        self.MaxHits = Hits
+        self.Hits = Hits
+        self.Str = Str
+        self.Armor = Armor
+        self.Level = Level
+        self.order = 0    # Position in the enemy list, breaks ties on shared cells
+        self.Speed = Speed  # Actions per 100 turns (see scheduler.py)
+        self.next_time = 0
+        self.awake = False
+
+    def copy(self):
+        enemy = Enemy.__new__(Enemy)
+        enemy.x, enemy.y, enemy.prev_x, enemy.prev_y = self.x, self.y, self.prev_x, self.prev_y
+        enemy.type, enemy.MaxHits, enemy.Hits = self.type, self.MaxHits, self.Hits
+        enemy.Str, enemy.Armor, enemy.Level = self.Str, self.Armor, self.Level
+        enemy.order, enemy.Speed, enemy.next_time, enemy.awake = self.order, self.Speed, self.next_time, self.awake
+        return enemy
+
+class Item:
+    __slots__ = ("x", "y", "name", "type", "Description", "Hits", "Str", "Armor", "Satiety")
+
+    def __init__(self, name="", type="", Description="", Hits=0, Str=0, Armor=0, Satiety=30):
+        self.x = 0
+        self.y = 0
+        self.name = name
+        self.type = type   # For example: ")", "[", "=", ":", "*", "?"
+        self.Description = Description
+        self.Hits = Hits
+        self.Str = Str
+        self.Armor = Armor
+        self.Satiety = Satiety
+
+    def copy(self):
+        item = Item.__new__(Item)
+        item.x, item.y, item.name, item.type = self.x, self.y, self.name, self.type
+        item.Description, item.Hits, item.Str = self.Description, self.Hits, self.Str
+        item.Armor, item.Satiety = self.Armor, self.Satiety
+        return item
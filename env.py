@@ -0,0 +1,337 @@
+"""
+RoguePyxel environment
+A Gym-style interface to the headless Engine, for training and evaluating
+bots:
+  - RogueEnv(size, fog, max_turns): reset(seed) returns an observation,
+    step(action) returns (observation, reward, done, info). Actions are
+    indices into engine.DIRECTIONS; the merchant shop is left straight
+    away, as in balance.py.
+  - VecEnv(count, workers): steps count environments in one call, split
+    across worker processes, and restarts each one when its run ends.
+An observation is a dict of NumPy arrays over a size x size window of the
+level (the whole level when it fits, else the part around the player):
+  grid      uint8 (size, size): tile codes (grid.TILE_SYMBOLS); VOID past
+            the level's edge and, with fog, UNSEEN on unexplored cells,
+  entities  uint8 (LAYERS, size, size): the player, enemy count, enemy
+            hits, item count, visible and explored layers; with fog,
+            enemies and items are only shown where the player sees them,
+  stats     int32 (len(STATS),): the player's Hits, Str, Armor, Satiety,
+            Gold and Level.
+The reward is REWARD_LEVEL per level descended, REWARD_GOLD per gold
+coin, REWARD_WIN for the amulet and REWARD_DEATH on dying. A run is done
+when it is won or lost, or cut off after max_turns (info["truncated"]).
+VecEnv workers write observations straight into shared memory, so each
+step only sends the actions and the infos of finished runs over pipes.
+
+Run this file directly for a rollout throughput benchmark.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+
+import numpy as np
+
+from engine import Engine, DIRECTIONS
+
+OBS_SIZE = 15
+MAX_TURNS = 5000
+
+VOID = 255
+UNSEEN = 254
+
+LAYERS = ("player", "enemies", "enemy_hits", "items", "visible", "explored")
+(LAYER_PLAYER, LAYER_ENEMIES, LAYER_ENEMY_HITS, LAYER_ITEMS,
+ LAYER_VISIBLE, LAYER_EXPLORED) = range(len(LAYERS))
+STATS = ("Hits", "Str", "Armor", "Satiety", "Gold", "Level")
+
+REWARD_LEVEL = 1.0
+REWARD_GOLD = 0.01
+REWARD_WIN = 10.0
+REWARD_DEATH = -1.0
+
+def observation_shapes(size=OBS_SIZE):
+    # name -> (shape, dtype) of the observation arrays
+    return {
+        "grid": ((size, size), np.uint8),
+        "entities": ((len(LAYERS), size, size), np.uint8),
+        "stats": ((len(STATS),), np.int32),
+    }
+
+def window_origin(position, map_size, size):
+    # First row/column of the window; the window follows the player only
+    # on levels larger than it.
+    if map_size <= size:
+        return 0
+    return max(0, min(position - size // 2, map_size - size))
+
+# ---------------------------
+# Observations
+# ---------------------------
+class Observer:
+    # Writes observations (see the module docstring) into given arrays.
+    # The tile window is kept while the grid, its version and the window
+    # position stay the same, and the visible layer while the engine's
+    # visible set is the same object (fov.py hands back cached sets), so
+    # most turns only redo the entity layers.
+    def __init__(self, size=OBS_SIZE, fog=True):
+        self.size = size
+        self.fog = fog
+        self.codes_key = None
+        self.codes = None
+        self.visible_key = None
+        self.visible = np.zeros((size, size), dtype=np.uint8)
+
+    def write(self, engine, grid, entities, stats):
+        size = self.size
+        width, height = engine.grid_width, engine.grid_height
+        player = engine.player
+        x0 = window_origin(player.x, width, size)
+        y0 = window_origin(player.y, height, size)
+        w = min(size, width - x0)
+        h = min(size, height - y0)
+
+        key = (engine.grid, engine.grid_version, x0, y0)
+        if key != self.codes_key:
+            rows = b"".join(engine.grid.row_codes(y)[x0:x0 + w] for y in range(y0, y0 + h))
+            self.codes = np.frombuffer(rows, dtype=np.uint8).reshape(h, w)
+            self.codes_key = key
+        key = (engine.visible, x0, y0)
+        if key != self.visible_key:
+            visible = self.visible
+            visible.fill(0)
+            for x, y in engine.visible:
+                if 0 <= x - x0 < w and 0 <= y - y0 < h:
+                    visible[y - y0, x - x0] = 1
+            self.visible_key = key
+        visible = self.visible
+        explored = np.frombuffer(engine.explored, dtype=np.uint8).reshape(height, width)[y0:y0 + h, x0:x0 + w]
+
+        grid.fill(VOID)
+        grid[:h, :w] = np.where(explored != 0, self.codes, UNSEEN) if self.fog else self.codes
+        entities.fill(0)
+        entities[LAYER_EXPLORED, :h, :w] = explored
+        entities[LAYER_VISIBLE] = visible
+        entities[LAYER_PLAYER, player.y - y0, player.x - x0] = 1
+        fog = self.fog
+        for enemy in engine.enemies:
+            x, y = enemy.x - x0, enemy.y - y0
+            if 0 <= x < w and 0 <= y < h and (visible[y, x] or not fog):
+                entities[LAYER_ENEMIES, y, x] = min(255, entities[LAYER_ENEMIES, y, x] + 1)
+                entities[LAYER_ENEMY_HITS, y, x] = min(255, entities[LAYER_ENEMY_HITS, y, x] + max(0, enemy.Hits))
+        for item in engine.items:
+            x, y = item.x - x0, item.y - y0
+            if 0 <= x < w and 0 <= y < h and (visible[y, x] or not fog):
+                entities[LAYER_ITEMS, y, x] = min(255, entities[LAYER_ITEMS, y, x] + 1)
+        stats[:] = [getattr(player, name) for name in STATS]
+
+# ---------------------------
+# Environment
+# ---------------------------
+class RogueEnv:
+    def __init__(self, size=OBS_SIZE, fog=True, max_turns=MAX_TURNS):
+        self.size = size
+        self.fog = fog
+        self.max_turns = max_turns
+        self.action_count = len(DIRECTIONS)
+        self.observation_shapes = observation_shapes(size)
+        self.observer = Observer(size, fog)
+        self.engine = None
+
+    def reset(self, seed=None):
+        if self.engine is None:
+            self.engine = Engine(seed)
+        else:
+            self.engine.reset_state(seed)
+        self.engine.start_game()
+        return self.observe()
+
+    def observe(self, out=None):
+        # The current observation, written into out (a dict of arrays) when given.
+        if out is None:
+            out = {name: np.zeros(shape, dtype) for name, (shape, dtype) in self.observation_shapes.items()}
+        self.observer.write(self.engine, out["grid"], out["entities"], out["stats"])
+        return out
+
+    def play(self, action):
+        # One turn; returns (reward, done, info) without observing.
+        engine = self.engine
+        level, gold = engine.level, engine.player.Gold
+        engine.step(DIRECTIONS[action])
+        if engine.state == "merchant":
+            engine.leave_merchant()
+        reward = REWARD_LEVEL * (engine.level - level) + REWARD_GOLD * (engine.player.Gold - gold)
+        if engine.state == "win":
+            reward += REWARD_WIN
+        elif engine.state == "gameover":
+            reward += REWARD_DEATH
+        truncated = engine.state == "game" and engine.turns >= self.max_turns
+        done = engine.state != "game" or truncated
+        info = {"state": engine.state, "level": engine.level, "turns": engine.turns, "truncated": truncated}
+        return reward, done, info
+
+    def step(self, action):
+        reward, done, info = self.play(action)
+        return self.observe(), reward, done, info
+
+# ---------------------------
+# Vectorized Environments
+# ---------------------------
+class EnvSlice:
+    # Environments [start, stop) of a VecEnv, writing into its shared
+    # buffers; runs in a worker process, or in the caller's without workers.
+    def __init__(self, buffers, start, stop, count, options):
+        self.start = start
+        self.count = count
+        self.envs = [RogueEnv(*options) for _ in range(start, stop)]
+        self.buffers = {name: array[start:stop] for name, array in buffers.items()}
+        self.seeds = [None] * len(self.envs)
+
+    def reset(self, seed):
+        # Environment i plays seeds seed + i, seed + i + count, seed + i + 2 * count...
+        for index, env in enumerate(self.envs):
+            self.seeds[index] = seed + self.start + index
+            env.reset(self.seeds[index])
+            self.observe(index)
+
+    def observe(self, index):
+        buffers = self.buffers
+        env = self.envs[index]
+        env.observer.write(env.engine, buffers["grid"][index], buffers["entities"][index], buffers["stats"][index])
+
+    def step(self, actions):
+        # Returns the infos of the runs that ended, by environment index.
+        finished = {}
+        rewards, dones = self.buffers["rewards"], self.buffers["dones"]
+        for index, env in enumerate(self.envs):
+            reward, done, info = env.play(actions[index])
+            rewards[index] = reward
+            dones[index] = done
+            if done:
+                info["seed"] = self.seeds[index]
+                finished[self.start + index] = info
+                self.seeds[index] += self.count
+                env.reset(self.seeds[index])
+            self.observe(index)
+        return finished
+
+def shared_buffers(raw, count):
+    # NumPy views of the VecEnv's shared memory.
+    return {name: np.frombuffer(raw[name], dtype=dtype).reshape((count,) + shape)
+            for name, (shape, dtype) in raw["shapes"].items()}
+
+def worker_main(connection, raw, start, stop, count, options):
+    envs = EnvSlice(shared_buffers(raw, count), start, stop, count, options)
+    while True:
+        command, arg = connection.recv()
+        if command == "reset":
+            envs.reset(arg)
+            connection.send(None)
+        elif command == "step":
+            connection.send(envs.step(arg))
+        else:
+            break
+    connection.close()
+
+class VecEnv:
+    # step(actions) takes one action per environment and returns
+    # (observations, rewards, dones, infos): the observation arrays with a
+    # leading environment axis, and a dict of the infos of the runs that
+    # ended, by environment index. A finished environment is reset with
+    # its next seed and its new run's first observation is returned.
+    def __init__(self, count, workers=0, size=OBS_SIZE, fog=True, max_turns=MAX_TURNS):
+        self.count = count
+        self.action_count = len(DIRECTIONS)
+        shapes = dict(observation_shapes(size), rewards=((), np.float32), dones=((), np.bool_))
+        raw = {"shapes": shapes}
+        for name, (shape, dtype) in shapes.items():
+            nbytes = count * int(np.prod(shape)) * np.dtype(dtype).itemsize
+            raw[name] = multiprocessing.RawArray("b", max(1, nbytes))
+        self.buffers = shared_buffers(raw, count)
+        options = (size, fog, max_turns)
+        workers = min(workers, count)
+        self.local = None
+        self.workers = []
+        if workers <= 0:
+            self.local = EnvSlice(self.buffers, 0, count, count, options)
+            return
+        bounds = [count * index // workers for index in range(workers + 1)]
+        for start, stop in zip(bounds, bounds[1:]):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=worker_main, args=(child, raw, start, stop, count, options),
+                                              daemon=True)
+            process.start()
+            child.close()
+            self.workers.append((parent, process, start, stop))
+
+    def observations(self):
+        return {name: self.buffers[name].copy() for name in ("grid", "entities", "stats")}
+
+    def reset(self, seed=None):
+        if seed is None:
+            seed = random.getrandbits(32)
+        if self.local is not None:
+            self.local.reset(seed)
+        else:
+            for connection, _, _, _ in self.workers:
+                connection.send(("reset", seed))
+            for connection, _, _, _ in self.workers:
+                connection.recv()
+        return self.observations()
+
+    def step(self, actions):
+        actions = [int(action) for action in actions]
+        if self.local is not None:
+            infos = self.local.step(actions)
+        else:
+            for connection, _, start, stop in self.workers:
+                connection.send(("step", actions[start:stop]))
+            infos = {}
+            for connection, _, _, _ in self.workers:
+                infos.update(connection.recv())
+        return self.observations(), self.buffers["rewards"].copy(), self.buffers["dones"].copy(), infos
+
+    def close(self):
+        for connection, process, _, _ in self.workers:
+            try:
+                connection.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+            connection.close()
+            process.join()
+        self.workers = []
+
+# ---------------------------
+# Throughput benchmark
+# ---------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rollout throughput of the RoguePyxel environment.")
+    parser.add_argument("--envs", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: none, step in-process)")
+    parser.add_argument("--steps", type=int, default=1000, help="vectorized steps to time")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    vec = VecEnv(args.envs, args.workers)
+    rng = np.random.default_rng(args.seed)
+    try:
+        vec.reset(args.seed)
+        finished = 0
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            _, _, _, infos = vec.step(rng.integers(0, vec.action_count, args.envs))
+            finished += len(infos)
+        elapsed = time.perf_counter() - start
+    finally:
+        vec.close()
+    rate = args.envs * args.steps / elapsed if elapsed > 0 else float("inf")
+    print("{} envs x {} steps, {} workers: {:.0f} env steps/s, {} runs finished".format(
+        args.envs, args.steps, args.workers, rate, finished))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+RoguePyxel message log
+Game messages are typed events (turn, kind, text) kept in a ring buffer
+of fixed capacity: the sidebar only ever shows the last few, so old ones
+are simply dropped and memory stays flat however long a session runs.
+A LogWriter can be attached to stream every event to a JSON-lines file
+for post-mortem analysis; lines are buffered and written in batches.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import json
+from collections import deque, namedtuple
+
+# Event kinds
+INFO = "info"
+MOVE = "move"
+WALL = "wall"
+ATTACK = "attack"
+DAMAGE = "damage"
+KILL = "kill"
+GOLD = "gold"
+LOOT = "loot"
+LEVEL_UP = "level_up"
+ITEM = "item"
+MERCHANT = "merchant"
+
+MESSAGE_CAPACITY = 64
+BATCH_SIZE = 256
+
+Event = namedtuple("Event", ["turn", "kind", "text"])
+
+class MessageLog:
+    def __init__(self, capacity=MESSAGE_CAPACITY):
+        self.events = deque(maxlen=capacity)
+        self.writer = None
+
+    def add(self, turn, kind, text):
+        event = Event(turn, kind, text)
+        self.events.append(event)
+        if self.writer is not None:
+            self.writer.write(event)
+
+    def recent(self, count):
+        # Texts of the last count events, oldest first.
+        start = max(0, len(self.events) - count)
+        return [self.events[index].text for index in range(start, len(self.events))]
+
+    def clear(self):
+        self.events.clear()
+
+    def restore(self, events):
+        # Replaces the buffered events (loading a save); nothing is streamed.
+        self.events.clear()
+        self.events.extend(events)
+
+    def copy(self):
+        # The buffered events, detached from any writer.
+        log = MessageLog(self.events.maxlen)
+        log.events.extend(self.events)
+        return log
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+class LogWriter:
+    # Appends events to a file as JSON lines, BATCH_SIZE lines per write.
+    def __init__(self, path, batch_size=BATCH_SIZE):
+        self.file = open(path, "a", encoding="utf-8")
+        self.batch_size = batch_size
+        self.pending = []
+
+    def write(self, event):
+        self.pending.append(json.dumps(event._asdict()))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.file.write("\n".join(self.pending) + "\n")
+            self.pending = []
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
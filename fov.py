@@ -0,0 +1,135 @@
+"""
+RoguePyxel field of view
+What the player can see, by recursive shadowcasting: each of the eight
+octants around the player is scanned row by row outwards, and every wall
+met narrows the range of slopes the rows behind it still get light
+through, so each cell within FOV_RADIUS is looked at once at most.
+Results are cached per (position, grid version): walking back and forth
+in a room costs a dictionary lookup, and any grid edit (which bumps the
+Engine's grid_version) or a new grid makes old entries unreachable. The
+cache is emptied when the grid changes and holds at most CACHE_SIZE
+entries otherwise. Copies made for an Engine's clones share a store of
+computed views on top of their own caches, so a search does not cast the
+same view once per clone; grid versions are unique to a grid's contents
+across engines, which keeps the shared keys unambiguous.
+The Engine keeps the visible set of the player's cell and an explored
+layer (every cell seen on the level); rendering draws the fog of war from
+them and the enemy AI uses the visible set as line of sight.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+from collections import OrderedDict
+from itertools import compress
+
+from grid import WALL
+
+FOV_RADIUS = 8
+CACHE_SIZE = 256
+
+# Octant transforms (xx, xy, yx, yy): map (column, row) scan coordinates
+# to grid offsets.
+OCTANTS = (
+    (1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+    (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1),
+)
+
+# Row bytes translated to opacity: walls block the view, nothing else
+# does; OFF_GRID cells block it too but are never seen.
+OPAQUE = bytes(1 if code == WALL else 0 for code in range(256))
+OFF_GRID = 2
+
+def shadowcast(grid, x, y, radius=FOV_RADIUS):
+    # Cells visible from (x, y), walls included, as a frozenset. The scan
+    # works on a window of (2 * radius + 1) cells square around (x, y),
+    # padded with OFF_GRID cells, so it needs no bounds checks.
+    size = 2 * radius + 1
+    left, top = x - radius, y - radius
+    opaque = bytearray(bytes([OFF_GRID]) * (size * size))
+    x0, x1 = max(0, left), min(grid.width, left + size)
+    for row in range(max(0, top), min(grid.height, top + size)):
+        start = (row - top) * size + x0 - left
+        opaque[start:start + x1 - x0] = grid.row_codes(row)[x0:x1].translate(OPAQUE)
+    lit = bytearray(size * size)
+    lit[radius * size + radius] = 1
+    for xx, xy, yx, yy in OCTANTS:
+        cast_light(opaque, lit, size, radius, 1, 1.0, 0.0, xx, xy, yx, yy)
+    cells = [(left + index % size, top + index // size) for index in compress(range(size * size), lit)]
+    return frozenset(cells)
+
+def cast_light(opaque, lit, size, radius, row, start, end, xx, xy, yx, yy):
+    # Lights the rows from row outwards between slopes start and end,
+    # recursing below every wall span. Coordinates are window indices
+    # around the center (radius, radius).
+    if start < end:
+        return
+    radius_squared = radius * radius
+    center = radius * size + radius
+    new_start = start
+    for distance in range(row, radius + 1):
+        dx = -distance - 1
+        dy = -distance
+        blocked = False
+        while dx <= 0:
+            dx += 1
+            left_slope = (dx - 0.5) / (dy + 0.5)
+            right_slope = (dx + 0.5) / (dy - 0.5)
+            if start < right_slope:
+                continue
+            if end > left_slope:
+                break
+            index = center + (dx * yx + dy * yy) * size + dx * xx + dy * xy
+            wall = opaque[index]
+            if wall != OFF_GRID and dx * dx + dy * dy <= radius_squared:
+                lit[index] = 1
+            if blocked:
+                if wall:
+                    new_start = right_slope
+                else:
+                    blocked = False
+                    start = new_start
+            elif wall and distance < radius:
+                blocked = True
+                cast_light(opaque, lit, size, radius, distance + 1, start, left_slope, xx, xy, yx, yy)
+                new_start = right_slope
+        if blocked:
+            break
+
+class FieldOfView:
+    def __init__(self, radius=FOV_RADIUS, cache_size=CACHE_SIZE):
+        self.radius = radius
+        self.cache_size = cache_size
+        self.grid = None
+        self.cache = OrderedDict()  # (x, y, grid version) -> visible cells
+        self.views = OrderedDict()  # the same, shared with copies
+
+    def copy(self, grid):
+        # A field of view for a copy of the current grid (see TileGrid.copy);
+        # the cached views, which are immutable, are shared.
+        fov = FieldOfView(self.radius, self.cache_size)
+        fov.grid = grid
+        fov.cache = self.cache.copy()
+        fov.views = self.views
+        return fov
+
+    def lookup(self, grid, version, x, y):
+        # (visible cells, whether they are new to this field of view: computed,
+        # or taken from the views shared with other copies)
+        if grid is not self.grid:
+            self.grid = grid
+            self.cache.clear()
+        key = (x, y, version)
+        cells = self.cache.get(key)
+        if cells is not None:
+            self.cache.move_to_end(key)
+            return cells, False
+        cells = self.views.get(key)
+        if cells is None:
+            cells = shadowcast(grid, x, y, self.radius)
+            self.views[key] = cells
+            if len(self.views) > self.cache_size:
+                self.views.popitem(last=False)
+        self.cache[key] = cells
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return cells, True
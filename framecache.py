@@ -0,0 +1,85 @@
+"""
+RoguePyxel frame cache
+The game only changes when a key is pressed, yet Pyxel calls draw() 60
+times a second. The frame cache splits a screen into regions (the map,
+the stats block, the message panel, the legend), each with a key: a
+function returning the state the region shows, as something comparable
+(usually a tuple of what it displays). A region is redrawn only when its
+key differs from the one it was last drawn with. Pyxel keeps the screen
+between frames, so an idle frame draws nothing at all.
+Buffered regions draw into their own off-screen image, which is then
+blitted to the screen; coming back to a screen whose regions did not
+change is one blt each. The map is not buffered: its tilemap already is
+the cached image of the grid, so it is redrawn straight to the screen.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import pyxel
+
+class Region:
+    def __init__(self, x, y, width, height, key, draw, buffered=True):
+        # draw(surface) draws the region at screen coordinates on surface,
+        # which is either pyxel itself or the region's image (whose camera
+        # is set so that the same coordinates land in it).
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.key = key
+        self.draw = draw
+        self.image = pyxel.Image(width, height) if buffered else None
+        self.drawn = None  # key of the image's contents
+        self.shown = None  # key of what is on screen
+
+    def present(self, force):
+        # Brings the region on screen up to date; force means the screen was
+        # cleared. Returns whether anything was drawn.
+        key = self.key()
+        if key == self.shown and not force:
+            return False
+        if self.image is None:
+            pyxel.clip(self.x, self.y, self.width, self.height)
+            pyxel.rect(self.x, self.y, self.width, self.height, 0)
+            self.draw(pyxel)
+            pyxel.clip()
+        else:
+            if key != self.drawn:
+                self.image.cls(0)
+                self.image.camera(self.x, self.y)
+                self.draw(self.image)
+                self.drawn = key
+            pyxel.blt(self.x, self.y, self.image, 0, 0, self.width, self.height)
+        self.shown = key
+        return True
+
+class FrameCache:
+    def __init__(self):
+        self.regions = {}  # screen name -> regions
+        self.shown = None  # (screen name, screen key) on screen
+        self.redrawn = 0  # regions drawn by the last present
+
+    def add(self, screen, region):
+        self.regions.setdefault(screen, []).append(region)
+
+    def invalidate(self):
+        # Forces a full redraw, buffered regions included, on the next present.
+        self.shown = None
+        for regions in self.regions.values():
+            for region in regions:
+                region.drawn = region.shown = None
+
+    def present(self, screen, key, background):
+        # Shows a screen: background() draws what is not in a region, and is
+        # only called when the screen or its key changed (the screen is
+        # cleared first); then every region that changed is redrawn.
+        force = (screen, key) != self.shown
+        if force:
+            pyxel.cls(0)
+            background()
+            self.shown = (screen, key)
+        self.redrawn = 0
+        for region in self.regions.get(screen, ()):
+            if region.present(force):
+                self.redrawn += 1
+        return self.redrawn
@@ -0,0 +1,162 @@
+"""
+RoguePyxel grid storage
+Levels are stored as one byte per cell: a tile code indexing TILE_SYMBOLS,
+the symbol table used for rendering. Cells live in square chunks of
+CHUNK_SIZE x CHUNK_SIZE bytes that are only allocated once a cell in them
+differs from the fill tile, so a 1000x1000 level takes about 1 MB at most
+and far less while it is mostly the fill tile (solid rock for dungeons).
+copy() is copy-on-write: the copy shares every chunk with the original,
+and whichever grid first writes to a shared chunk copies it first, so
+cloning a level for a search (see Engine.clone) costs a list of chunk
+references.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+TILE_SYMBOLS = [".", "G", "𖡄", ")", "[", "=", ":", "*", "?", "#"]
+TILE_CODES = {symbol: code for code, symbol in enumerate(TILE_SYMBOLS)}
+FLOOR = TILE_CODES["."]
+WALL = TILE_CODES["#"]
+
+CHUNK_SHIFT = 6
+CHUNK_SIZE = 1 << CHUNK_SHIFT
+CHUNK_MASK = CHUNK_SIZE - 1
+
+class TileGrid:
+    def __init__(self, width, height, fill="."):
+        self.width = width
+        self.height = height
+        self.fill = TILE_CODES[fill]
+        self.chunks_x = (width + CHUNK_MASK) >> CHUNK_SHIFT
+        self.chunks_y = (height + CHUNK_MASK) >> CHUNK_SHIFT
+        self.chunks = [None] * (self.chunks_x * self.chunks_y)
+        self.owned = [True] * len(self.chunks)  # False for chunks shared with a copy
+
+    def copy(self):
+        grid = TileGrid.__new__(TileGrid)
+        grid.width = self.width
+        grid.height = self.height
+        grid.fill = self.fill
+        grid.chunks_x = self.chunks_x
+        grid.chunks_y = self.chunks_y
+        grid.chunks = list(self.chunks)
+        self.owned = [False] * len(self.chunks)
+        grid.owned = [False] * len(self.chunks)
+        return grid
+
+    def writable_chunk(self, index):
+        # The chunk at index, allocated or unshared so it can be written to.
+        chunk = self.chunks[index]
+        if chunk is None:
+            chunk = self.chunks[index] = bytearray([self.fill]) * (CHUNK_SIZE * CHUNK_SIZE)
+        elif not self.owned[index]:
+            chunk = self.chunks[index] = bytearray(chunk)
+        self.owned[index] = True
+        return chunk
+
+    # Coordinates are not bounds-checked; callers test them against
+    # width/height first (see Engine.is_cell_empty).
+    def code(self, x, y):
+        chunk = self.chunks[(y >> CHUNK_SHIFT) * self.chunks_x + (x >> CHUNK_SHIFT)]
+        if chunk is None:
+            return self.fill
+        return chunk[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)]
+
+    def set_code(self, x, y, code):
+        index = (y >> CHUNK_SHIFT) * self.chunks_x + (x >> CHUNK_SHIFT)
+        chunk = self.chunks[index]
+        if chunk is None:
+            if code == self.fill:
+                return
+            chunk = self.writable_chunk(index)
+        elif not self.owned[index]:
+            chunk = self.writable_chunk(index)
+        chunk[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)] = code
+
+    def get(self, x, y):
+        return TILE_SYMBOLS[self.code(x, y)]
+
+    def set(self, x, y, symbol):
+        self.set_code(x, y, TILE_CODES[symbol])
+
+    def fill_rect(self, x, y, width, height, symbol):
+        # Sets a whole rectangle, one chunk-row slice at a time.
+        code = TILE_CODES[symbol]
+        for row_y in range(y, y + height):
+            chunk_row = (row_y >> CHUNK_SHIFT) * self.chunks_x
+            start = (row_y & CHUNK_MASK) << CHUNK_SHIFT
+            x0 = x
+            while x0 < x + width:
+                chunk_x = x0 >> CHUNK_SHIFT
+                x1 = min(x + width, (chunk_x + 1) << CHUNK_SHIFT)
+                chunk = self.chunks[chunk_row + chunk_x]
+                if chunk is None and code == self.fill:
+                    x0 = x1
+                    continue
+                if chunk is None or not self.owned[chunk_row + chunk_x]:
+                    chunk = self.writable_chunk(chunk_row + chunk_x)
+                offset = start + (x0 & CHUNK_MASK)
+                chunk[offset:offset + x1 - x0] = bytes([code]) * (x1 - x0)
+                x0 = x1
+
+    def row_codes(self, y):
+        # Tile codes of one row as bytes.
+        parts = []
+        chunk_row = (y >> CHUNK_SHIFT) * self.chunks_x
+        start = (y & CHUNK_MASK) << CHUNK_SHIFT
+        for chunk_x in range(self.chunks_x):
+            chunk = self.chunks[chunk_row + chunk_x]
+            length = min(CHUNK_SIZE, self.width - (chunk_x << CHUNK_SHIFT))
+            if chunk is None:
+                parts.append(bytes([self.fill]) * length)
+            else:
+                parts.append(chunk[start:start + length])
+        return b"".join(parts)
+
+    def row(self, y):
+        # Symbols of one row, for rendering.
+        return [TILE_SYMBOLS[self.code(x, y)] for x in range(self.width)]
+
+    def is_floor(self, x, y):
+        # Bounds-checked test for a free floor cell.
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return False
+        chunk = self.chunks[(y >> CHUNK_SHIFT) * self.chunks_x + (x >> CHUNK_SHIFT)]
+        if chunk is None:
+            return self.fill == FLOOR
+        return chunk[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)] == FLOOR
+
+    def is_walkable(self, x, y):
+        # Bounds-checked test for a cell the player can stand on.
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            return False
+        return self.code(x, y) != WALL
+
+    def find(self, symbol):
+        # First cell holding the symbol in row-major order, or None.
+        code = TILE_CODES[symbol]
+        if code == self.fill:
+            for y in range(self.height):
+                for x in range(self.width):
+                    if self.code(x, y) == code:
+                        return x, y
+            return None
+        for chunk_y in range(self.chunks_y):
+            found = None
+            for chunk_x in range(self.chunks_x):
+                chunk = self.chunks[chunk_y * self.chunks_x + chunk_x]
+                if chunk is None:
+                    continue
+                offset = chunk.find(code)
+                if offset < 0:
+                    continue
+                cell = ((chunk_y << CHUNK_SHIFT) | (offset >> CHUNK_SHIFT),
+                        (chunk_x << CHUNK_SHIFT) | (offset & CHUNK_MASK))
+                if found is None or cell < found:
+                    found = cell
+            if found is not None:
+                return found[1], found[0]
+        return None
+
+    def nbytes(self):
+        return sum(len(chunk) for chunk in self.chunks if chunk is not None)
@@ -0,0 +1,103 @@
+"""
+RoguePyxel input queue
+Moves reach the game through a queue instead of straight from the keys
+tested in a frame. Pyxel reports presses once per frame, so poll() turns
+every move key pressed since the last frame into a timestamped event,
+several keys pressed together included (queued in the order they are
+given, which main.py keeps fixed); scripted input drivers push() events
+directly.
+By default one queued move is played per frame, the pace moves are shown
+at, and the others wait for the next frames instead of being lost. In
+fast mode all queued moves are played at once, up to FAST_TURNS a frame.
+The queue holds at most QUEUE_CAPACITY moves; presses past that are
+counted in dropped.
+Every move played is timed from when its key was seen to the end of the
+draw of the frame that shows its result (rendered()); latency_stats()
+summarizes the last LATENCY_CAPACITY of them. Nothing here imports pyxel.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import time
+from array import array
+from collections import deque, namedtuple
+
+QUEUE_CAPACITY = 256
+FAST_TURNS = 32
+LATENCY_CAPACITY = 600
+
+InputEvent = namedtuple("InputEvent", ["time", "direction"])
+
+class InputQueue:
+    def __init__(self, fast=False, capacity=QUEUE_CAPACITY, latency_capacity=LATENCY_CAPACITY):
+        self.fast = fast
+        self.capacity = capacity
+        self.events = deque()
+        self.dropped = 0
+        self.played = []  # events played since the last rendered()
+
+        # Latency ring buffer, in seconds
+        self.latency_capacity = latency_capacity
+        self.latencies = array("d", bytes(8 * latency_capacity))
+        self.latency_count = 0
+
+    def __len__(self):
+        return len(self.events)
+
+    # ---------------------------
+    # Queueing
+    # ---------------------------
+    def push(self, direction, now=None):
+        # Queues one move; False if the queue is full and it was dropped.
+        if len(self.events) >= self.capacity:
+            self.dropped += 1
+            return False
+        self.events.append(InputEvent(time.perf_counter() if now is None else now, direction))
+        return True
+
+    def poll(self, directions):
+        # Queues the moves whose keys were pressed this frame, seen now.
+        if directions:
+            now = time.perf_counter()
+            for direction in directions:
+                self.push(direction, now)
+
+    def turns(self):
+        # Yields the moves to play this frame, taking each off the queue as
+        # it is played; stopping early leaves the rest queued.
+        for _ in range(FAST_TURNS if self.fast else 1):
+            if not self.events:
+                return
+            event = self.events.popleft()
+            self.played.append(event)
+            yield event
+
+    def clear(self):
+        # Drops the queued moves, e.g. when the map gives way to a menu
+        # they were not meant for.
+        self.events.clear()
+
+    # ---------------------------
+    # Latency
+    # ---------------------------
+    def rendered(self, now=None):
+        # Called once a frame has been drawn: the moves played since the
+        # last one are on screen.
+        if not self.played:
+            return
+        if now is None:
+            now = time.perf_counter()
+        for event in self.played:
+            self.latencies[self.latency_count % self.latency_capacity] = now - event.time
+            self.latency_count += 1
+        self.played = []
+
+    def latency_stats(self):
+        # (last, mean, p99) input-to-render latency in milliseconds.
+        count = min(self.latency_count, self.latency_capacity)
+        if not count:
+            return 0.0, 0.0, 0.0
+        latencies = sorted(self.latencies[:count])
+        last = self.latencies[(self.latency_count - 1) % self.latency_capacity]
+        p99 = latencies[min(count - 1, int(0.99 * count))]
+        return 1000 * last, 1000 * sum(latencies) / count, 1000 * p99
@@ -0,0 +1,134 @@
+"""
+RoguePyxel level generation
+A level (rooms and corridors, gold, gate and placed enemies) is a pure
+function of its number and a seed, so it can be built anywhere, ahead of
+time, and always comes out the same. The LevelPipeline builds the next
+level on a worker while the current one is played; the gate transition
+then only swaps in the finished Level.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import random
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import dungeon
+from registry import ENEMIES
+
+class Level:
+    def __init__(self, number, width, height):
+        self.number = number
+        self.width = width
+        self.height = height
+        self.grid = None
+        self.has_gate = False
+        self.gate_x = 0
+        self.gate_y = 0
+        self.start_x = width // 2
+        self.start_y = height // 2
+        self.enemies = []
+
+def level_seed(run_seed, number):
+    # Seed of one level of a run; a string seed hashes the same in every process.
+    return "{}:{}".format(run_seed, number)
+
+def build_level(number, seed):
+    rng = random.Random(seed)
+    if number == 0:
+        width, height = 15, 10
+    else:
+        width = rng.randint(8, 15)
+        height = rng.randint(8, 15)
+    level = Level(number, width, height)
+    layout = dungeon.generate(width, height, rng)
+    level.grid = layout.grid
+    level.start_x, level.start_y = layout.start_x, layout.start_y
+    free = layout.free
+    if number < 4:
+        # The gate goes in the room farthest from the start.
+        def distance_to_start(room):
+            x, y = room.center()
+            return abs(x - level.start_x) + abs(y - level.start_y)
+        far_room = max(layout.rooms, key=distance_to_start)
+        level.gate_x, level.gate_y = free.pick_in(rng, far_room)
+        level.grid.set(level.gate_x, level.gate_y, "𖡄")
+        level.has_gate = True
+    gold_x, gold_y = free.pick(rng)
+    level.grid.set(gold_x, gold_y, "G")
+    level.enemies = generate_enemies(number, rng)
+    place_enemies(level, free, rng)
+    return level
+
+# ---------------------------
+# Enemies
+# ---------------------------
+def generate_enemies(level, rng):
+    enemy_list = []
+    if level == 1:
+        enemy_list.append(create_enemy("S", rng))
+    elif level == 2:
+        count = rng.randint(2, 3)
+        for i in range(count):
+            enemy_list.append(create_enemy(rng.choice(["S", "E", "Z", "B"]), rng))
+    elif level == 3:
+        if rng.randint(0, 1) == 0:
+            enemy_list.append(create_enemy("I", rng))
+            enemy_list.append(create_enemy("I", rng))
+        else:
+            for i in range(rng.randint(2, 3)):
+                enemy_list.append(create_enemy(rng.choice(["S", "E", "Z", "B"]), rng))
+            enemy_list.append(create_enemy("I", rng))
+    elif level == 4:
+        enemy_list.append(create_enemy("D", rng))
+    return enemy_list
+
+def create_enemy(enemy_type, rng):
+    # enemy_type is the enemy's symbol in the registry.
+    return ENEMIES[enemy_type].spawn(rng)
+
+def place_enemies(level, free, rng):
+    # Distinct free floor cells, never the player's start cell.
+    for order, enemy in enumerate(level.enemies):
+        enemy.order = order
+        enemy.x, enemy.y = free.pick(rng)
+        enemy.prev_x, enemy.prev_y = enemy.x, enemy.y
+
+# ---------------------------
+# Background Pipeline
+# ---------------------------
+class LevelPipeline:
+    # Builds levels ahead of time. mode is "thread" (a worker thread),
+    # "process" (a worker process) or "sync" (build on demand, no worker;
+    # what headless runs use).
+    def __init__(self, mode="thread"):
+        self.mode = mode
+        self.executor = None
+        if mode == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="levelgen")
+        elif mode == "process":
+            self.executor = ProcessPoolExecutor(max_workers=1)
+        self.pending = {}
+
+    def prefetch(self, number, seed):
+        if self.executor is None or seed in self.pending:
+            return
+        self.pending[seed] = self.executor.submit(build_level, number, seed)
+
+    def take(self, number, seed):
+        # The prefetched level if there is one (waiting for it if it is not
+        # done yet), otherwise the level is built right away.
+        future = self.pending.pop(seed, None)
+        if future is not None:
+            return future.result()
+        return build_level(number, seed)
+
+    def clear(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+
+    def shutdown(self):
+        self.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
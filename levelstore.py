@@ -0,0 +1,238 @@
+"""
+RoguePyxel level store
+Floors the player has left are kept, so going back to one finds it as it
+was left: the grid (gold included), the enemies, the items on the ground
+and the explored cells. The floors left most recently stay in memory, up
+to a byte budget (the last one left is kept whatever its size); past it
+the least recently used ones are compressed and spilled to a temporary
+file, and only read back when the player returns to them. However deep a
+run goes, its memory stays bounded. Save games take every floor as it
+would be spilled (packed()), so saving never unpacks spilled floors.
+A Floor is a snapshot and is never changed once stored, so copies of a
+store (Engine.clone) share their floors and spilled data; the engine
+works on copies of what it takes out.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import itertools
+import struct
+import tempfile
+import zlib
+from collections import OrderedDict
+
+from grid import CHUNK_SIZE
+from packing import Reader, Writer, write_enemy, read_enemy, write_grid, read_grid, write_items, read_items
+
+MEMORY_BUDGET = 1 << 20  # bytes of floors kept in memory
+COMPACT_SLACK = 1 << 20  # dead bytes the spill file may hold before it is compacted
+
+# Rough in-memory footprint of one entity, for the budget.
+ENEMY_BYTES = 160
+ITEM_BYTES = 320
+
+FLOOR_INTS = struct.Struct("<7i")
+
+class Floor:
+    __slots__ = ("number", "grid", "start_x", "start_y", "gate_x", "gate_y", "clock",
+                 "explored", "enemies", "items")
+
+    def __init__(self, number, grid, start_x, start_y, gate_x, gate_y, clock, explored, enemies, items):
+        self.number = number
+        self.grid = grid
+        self.start_x = start_x  # where the player arrives, and climbs back up from
+        self.start_y = start_y
+        self.gate_x = gate_x
+        self.gate_y = gate_y
+        self.clock = clock  # scheduler clock when the player left
+        self.explored = explored
+        self.enemies = enemies
+        self.items = items
+
+    def size(self):
+        # Estimated bytes held in memory.
+        chunks = sum(1 for chunk in self.grid.chunks if chunk is not None)
+        return (chunks * CHUNK_SIZE * CHUNK_SIZE + len(self.explored)
+                + len(self.enemies) * ENEMY_BYTES + len(self.items) * ITEM_BYTES)
+
+def write_floor(out, floor):
+    out.buffer += FLOOR_INTS.pack(floor.number, floor.start_x, floor.start_y, floor.gate_x, floor.gate_y,
+                                  floor.clock, len(floor.explored))
+    out.buffer += floor.explored
+    write_grid(out, floor.grid)
+    out.pack("<I", len(floor.enemies))
+    for enemy in floor.enemies:
+        write_enemy(out, enemy)
+    write_items(out, floor.items)
+
+def read_floor(data):
+    number, start_x, start_y, gate_x, gate_y, clock, explored = data.unpack_struct(FLOOR_INTS)
+    explored = bytearray(data.raw(explored))
+    grid = read_grid(data)
+    enemies = [read_enemy(data) for _ in range(data.unpack("<I")[0])]
+    items = read_items(data)
+    return Floor(number, grid, start_x, start_y, gate_x, gate_y, clock, explored, enemies, items)
+
+def pack_floor(floor):
+    out = Writer()
+    write_floor(out, floor)
+    return bytes(out.buffer)
+
+# ---------------------------
+# Spill File
+# ---------------------------
+class SpillFile:
+    # An anonymous temporary file, deleted when closed or collected. It is
+    # append-only: data once written stays where it is, so stores sharing
+    # the file never overwrite each other's floors.
+    def __init__(self):
+        self.file = tempfile.TemporaryFile(prefix="roguepyxel-floors-")
+        self.size = 0
+
+    def append(self, data):
+        offset = self.size
+        self.file.seek(offset)
+        self.file.write(data)
+        self.size += len(data)
+        return offset
+
+    def read(self, offset, length):
+        self.file.seek(offset)
+        return self.file.read(length)
+
+# ---------------------------
+# Level Store
+# ---------------------------
+class LevelStore:
+    def __init__(self, budget=MEMORY_BUDGET):
+        self.budget = budget
+        self.clear()
+
+    def clear(self):
+        self.floors = OrderedDict()  # number -> (floor, size), least recently used first
+        self.compressed = {}  # number -> compressed packed floor, of floors in memory already saved
+        self.memory = 0  # estimated bytes of self.floors and self.compressed
+        self.spilled = {}  # number -> (spill file, offset, length) of the compressed floor
+        self.spilled_bytes = 0
+        self.spill = None  # the file new spills are appended to, made on first use
+        self.spill_count = self.reload_count = 0
+
+    def copy(self):
+        # A store with the same floors; both share the floors and the spill
+        # file, and each keeps its own index of them.
+        store = LevelStore.__new__(LevelStore)
+        store.budget = self.budget
+        store.floors = OrderedDict(self.floors)
+        store.compressed = dict(self.compressed)
+        store.memory = self.memory
+        store.spilled = dict(self.spilled)
+        store.spilled_bytes = self.spilled_bytes
+        store.spill = self.spill
+        store.spill_count, store.reload_count = self.spill_count, self.reload_count
+        return store
+
+    def __contains__(self, number):
+        return number in self.floors or number in self.spilled
+
+    def __len__(self):
+        return len(self.floors) + len(self.spilled)
+
+    def put(self, floor):
+        # Stores a floor the player has left, then spills the least recently
+        # used floors until the ones in memory fit the budget. The floor
+        # just left is always kept, as the likeliest to be visited next.
+        self.discard(floor.number)
+        size = floor.size()
+        self.floors[floor.number] = (floor, size)
+        self.memory += size
+        self.evict()
+
+    def evict(self):
+        # Spills the least recently used floors while memory is over the
+        # budget, keeping the most recent one.
+        while self.memory > self.budget and len(self.floors) > 1:
+            number, (evicted, size) = self.floors.popitem(last=False)
+            self.memory -= size
+            self.spill_floor(evicted)
+
+    def take(self, number):
+        # Removes and returns the stored floor, None if there is none.
+        entry = self.floors.pop(number, None)
+        if entry is not None:
+            self.memory -= entry[1]
+            self.drop_compressed(number)
+            return entry[0]
+        location = self.spilled.pop(number, None)
+        if location is None:
+            return None
+        spill, offset, length = location
+        self.spilled_bytes -= length
+        self.reload_count += 1
+        return read_floor(Reader(memoryview(zlib.decompress(spill.read(offset, length)))))
+
+    def discard(self, number):
+        entry = self.floors.pop(number, None)
+        if entry is not None:
+            self.memory -= entry[1]
+            self.drop_compressed(number)
+        location = self.spilled.pop(number, None)
+        if location is not None:
+            self.spilled_bytes -= location[2]
+
+    def compress(self, number):
+        # The compressed packed floor of a floor in memory. It is made once
+        # and kept, counted in the budget, until the floor leaves memory;
+        # floors that no longer fit are spilled (with the bytes just made).
+        data = self.compressed.get(number)
+        if data is None:
+            data = self.compressed[number] = zlib.compress(pack_floor(self.floors[number][0]), 1)
+            self.memory += len(data)
+            self.evict()
+        return data
+
+    def drop_compressed(self, number):
+        data = self.compressed.pop(number, None)
+        if data is not None:
+            self.memory -= len(data)
+        return data
+
+    def spill_floor(self, floor):
+        data = self.drop_compressed(floor.number)
+        if data is None:
+            data = zlib.compress(pack_floor(floor), 1)
+        self.put_spilled(floor.number, data)
+        self.spill_count += 1
+
+    def put_spilled(self, number, data):
+        # Stores a floor straight to the spill file, given as a compressed
+        # packed floor (as packed() gives them).
+        self.discard(number)
+        if self.spill is None:
+            self.spill = SpillFile()
+        self.spilled[number] = (self.spill, self.spill.append(data), len(data))
+        self.spilled_bytes += len(data)
+        if self.spill.size - self.spilled_bytes > max(COMPACT_SLACK, self.spilled_bytes):
+            self.compact()
+
+    def compact(self):
+        # Floors read back leave dead data behind in the append-only file:
+        # the live floors move to a new file, and the old one is deleted
+        # once no copy of the store refers to it any more.
+        spill = SpillFile()
+        for number, (old, offset, length) in self.spilled.items():
+            self.spilled[number] = (spill, spill.append(old.read(offset, length)), length)
+        self.spill = spill
+
+    def packed(self):
+        # (number, compressed packed floor) of every stored floor, in order
+        # of number, for save games; put_spilled() takes one back. Spilled
+        # floors are copied as they are in the spill file, not unpacked,
+        # and each floor in memory is compressed only once (compress()),
+        # so saving stays cheap however many floors there are. The result
+        # does not depend on which floors are in memory.
+        for number in sorted(itertools.chain(self.floors, self.spilled)):
+            if number in self.floors:
+                yield number, self.compress(number)
+            else:
+                spill, offset, length = self.spilled[number]
+                yield number, spill.read(offset, length)
@@ -0,0 +1,137 @@
+"""
+RoguePyxel combat odds
+Exact fight odds, computed rather than simulated. A blow deals
+ceil(ceil(Str * roll / 100) * 100 / (100 + Armor)) damage for a roll drawn
+uniformly from 50..100 (Engine.check_enemy_collision), so
+damage_distribution() counts the 51 rolls exactly.
+duel() gives the odds of the player and one enemy trading blows, the
+player first, until one of them is down: the probability that the player
+wins and the hits the player can expect to lose (at most all of them).
+Both come from dynamic programming over (player hits, enemy hits): every
+blow lowers one of them, so a table is filled row by row in order of
+player hits, each row from the rows below it.
+A table covers one matchup (the Str and Armor of both sides) up to a
+block of hits on each side and is kept in an LRU cache, so the balance
+tools and the sidebar readout (F5 in game) get answers in microseconds.
+Regeneration, enemy speed, wandering and items used mid-fight are left
+out.
+
+Run this file directly for the odds of a player against every enemy in
+the registry, over the enemies' stat ranges.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import argparse
+import itertools
+import math
+import sys
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+from entities import Stats
+from registry import ENEMIES
+
+ROLLS = range(50, 101)
+HITS_BLOCK = 32  # tables grow in blocks of this many hits
+TABLE_CACHE_SIZE = 256
+
+Odds = namedtuple("Odds", ["win", "hits_lost"])
+
+@lru_cache(maxsize=4096)
+def damage_distribution(strength, armor):
+    # ((damage, probability), ...) of one blow, by increasing damage; the
+    # same float arithmetic as the engine, so the same rounding.
+    counts = Counter(math.ceil(math.ceil(strength * roll / 100) * (100 / (100 + armor))) for roll in ROLLS)
+    return tuple((damage, count / len(ROLLS)) for damage, count in sorted(counts.items()))
+
+@lru_cache(maxsize=TABLE_CACHE_SIZE)
+def duel_table(player_str, player_armor, enemy_str, enemy_armor, player_rows, enemy_columns):
+    # (win, lost): win[j][h] and lost[j][h] are the odds of a duel started
+    # with the player at j hits and the enemy at h. Both strengths are at
+    # least 1, so every blow deals at least 1 damage.
+    dealt = damage_distribution(player_str, enemy_armor)
+    taken = damage_distribution(enemy_str, player_armor)
+    win = [[0.0] * (enemy_columns + 1) for _ in range(player_rows + 1)]
+    lost = [[0.0] * (enemy_columns + 1) for _ in range(player_rows + 1)]
+    columns = range(1, enemy_columns + 1)
+    for j in range(1, player_rows + 1):
+        # The enemy's blow, struck at an enemy with h hits left.
+        back_win = [0.0] * (enemy_columns + 1)
+        back_lost = [0.0] * (enemy_columns + 1)
+        for h in columns:
+            w = l = 0.0
+            for damage, p in taken:
+                if damage >= j:
+                    l += p * j
+                else:
+                    w += p * win[j - damage][h]
+                    l += p * (damage + lost[j - damage][h])
+            back_win[h] = w
+            back_lost[h] = l
+        # The player's blow, which comes first.
+        row_win, row_lost = win[j], lost[j]
+        for h in columns:
+            w = l = 0.0
+            for damage, p in dealt:
+                if damage >= h:
+                    w += p
+                else:
+                    w += p * back_win[h - damage]
+                    l += p * back_lost[h - damage]
+            row_win[h] = w
+            row_lost[h] = l
+    return win, lost
+
+def duel(player_str, player_armor, player_hits, enemy_str, enemy_armor, enemy_hits):
+    if enemy_hits <= 0:
+        return Odds(1.0, 0.0)
+    if player_hits <= 0:
+        return Odds(0.0, 0.0)
+    if player_str < 1:
+        # The enemy cannot be hurt: the player loses, or nobody ever does.
+        return Odds(0.0, float(player_hits) if enemy_str >= 1 else 0.0)
+    if enemy_str < 1:
+        return Odds(1.0, 0.0)
+    # The enemy falls within enemy_hits blows, so the player loses at most
+    # that many of the enemy's blows; hits past that change nothing (and
+    # the other way round), which keeps the tables small for huge hits.
+    player_hits = min(player_hits, enemy_hits * damage_distribution(enemy_str, player_armor)[-1][0] + 1)
+    enemy_hits = min(enemy_hits, player_hits * damage_distribution(player_str, enemy_armor)[-1][0] + 1)
+    rows = -(-player_hits // HITS_BLOCK) * HITS_BLOCK
+    columns = -(-enemy_hits // HITS_BLOCK) * HITS_BLOCK
+    win, lost = duel_table(player_str, player_armor, enemy_str, enemy_armor, rows, columns)
+    return Odds(win[player_hits][enemy_hits], lost[player_hits][enemy_hits])
+
+def versus(template, player_str, player_armor, player_hits):
+    # Odds against a registry template (registry.py), averaged over every
+    # combination of its rolled stats, which are uniform and independent.
+    rolls = [(template.params[index], range(low, high + 1)) for index, low, high in template.rolls]
+    stats = dict(zip(template.params, template.values))
+    win = lost = 0.0
+    combinations = 0
+    for values in itertools.product(*[values for _, values in rolls]):
+        stats.update(zip([name for name, _ in rolls], values))
+        odds = duel(player_str, player_armor, player_hits, stats["Str"], stats["Armor"], stats["Hits"])
+        win += odds.win
+        lost += odds.hits_lost
+        combinations += 1
+    return Odds(win / combinations, lost / combinations)
+
+def main(argv=None):
+    player = Stats()
+    parser = argparse.ArgumentParser(description="Exact duel odds of a player against every RoguePyxel enemy.")
+    parser.add_argument("--str", type=int, default=player.Str, dest="strength")
+    parser.add_argument("--armor", type=int, default=player.Armor)
+    parser.add_argument("--hits", type=int, default=player.Hits)
+    args = parser.parse_args(argv)
+
+    print("Player: Str {}, Armor {}, Hits {}".format(args.strength, args.armor, args.hits))
+    print("{:<12} {:>7} {:>10}".format("Enemy", "Win %", "Hits lost"))
+    for template in ENEMIES.values():
+        odds = versus(template, args.strength, args.armor, args.hits)
+        print("{:<12} {:>7.1f} {:>10.2f}".format(template.name, 100 * odds.win, odds.hits_lost))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
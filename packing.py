@@ -0,0 +1,147 @@
+"""
+RoguePyxel binary packing
+The struct-based encoding shared by everything that writes game state to
+bytes: save games and recordings (savegame.py, replay.py) and floors
+spilled to disk by the level store (levelstore.py). A Writer appends
+fields to a buffer and a Reader reads them back in the same order;
+write_*/read_* pairs pack the entities, grids and RNG states.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import struct
+
+from entities import Enemy, Item
+from grid import TileGrid, TILE_SYMBOLS, CHUNK_SIZE
+
+STATS_FIELDS = ("x", "y", "Level", "Hits", "MaxHits", "Str", "MaxStr", "Gold",
+                "Armor", "Exp", "ExpCap", "Satiety", "MoveCounter")
+ENEMY_FIELDS = ("x", "y", "prev_x", "prev_y", "MaxHits", "Hits", "Str", "Armor", "Level", "order",
+                "Speed", "next_time", "awake")
+ITEM_FIELDS = ("x", "y", "Hits", "Str", "Armor", "Satiety")
+STATS_INTS = struct.Struct("<{}i".format(len(STATS_FIELDS)))
+ENEMY_INTS = struct.Struct("<{}i".format(len(ENEMY_FIELDS)))
+ITEM_INTS = struct.Struct("<{}i".format(len(ITEM_FIELDS)))
+RNG_STATE = struct.Struct("<625I")
+
+class SaveError(ValueError):
+    pass
+
+# ---------------------------
+# Packing
+# ---------------------------
+class Writer:
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def pack(self, fmt, *values):
+        self.buffer += struct.pack(fmt, *values)
+
+    def int(self, value):
+        self.pack("<i", value)
+
+    def text(self, value):
+        data = value.encode("utf-8")
+        self.pack("<I", len(data))
+        self.buffer += data
+
+    def texts(self, values):
+        self.pack("<I", len(values))
+        for value in values:
+            self.text(value)
+
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def unpack_struct(self, packer):
+        values = packer.unpack_from(self.data, self.offset)
+        self.offset += packer.size
+        return values
+
+    def int(self):
+        return self.unpack("<i")[0]
+
+    def raw(self, length):
+        data = self.data[self.offset:self.offset + length]
+        if len(data) != length:
+            raise SaveError("truncated save data")
+        self.offset += length
+        return data
+
+    def text(self):
+        length = self.unpack("<I")[0]
+        return bytes(self.raw(length)).decode("utf-8")
+
+    def texts(self):
+        return [self.text() for _ in range(self.unpack("<I")[0])]
+
+def write_item(out, item):
+    out.buffer += ITEM_INTS.pack(*[getattr(item, name) for name in ITEM_FIELDS])
+    out.text(item.name)
+    out.text(item.type)
+    out.text(item.Description)
+
+def read_item(data):
+    item = Item()
+    for name, value in zip(ITEM_FIELDS, data.unpack_struct(ITEM_INTS)):
+        setattr(item, name, value)
+    item.name = data.text()
+    item.type = data.text()
+    item.Description = data.text()
+    return item
+
+def write_enemy(out, enemy):
+    out.buffer += ENEMY_INTS.pack(*[getattr(enemy, name) for name in ENEMY_FIELDS])
+    out.text(enemy.type)
+
+def read_enemy(data):
+    enemy = Enemy()
+    for name, value in zip(ENEMY_FIELDS, data.unpack_struct(ENEMY_INTS)):
+        setattr(enemy, name, value)
+    enemy.awake = bool(enemy.awake)
+    enemy.type = data.text()
+    return enemy
+
+def write_items(out, items):
+    out.pack("<I", len(items))
+    for item in items:
+        write_item(out, item)
+
+def read_items(data):
+    return [read_item(data) for _ in range(data.unpack("<I")[0])]
+
+def write_grid(out, grid):
+    out.pack("<IIB", grid.width, grid.height, grid.fill)
+    for chunk in grid.chunks:
+        if chunk is None:
+            out.pack("<B", 0)
+        else:
+            out.pack("<B", 1)
+            out.buffer += chunk
+
+def read_grid(data):
+    width, height, fill = data.unpack("<IIB")
+    grid = TileGrid(width, height, TILE_SYMBOLS[fill])
+    for index in range(len(grid.chunks)):
+        if data.unpack("<B")[0]:
+            grid.chunks[index] = bytearray(data.raw(CHUNK_SIZE * CHUNK_SIZE))
+    return grid
+
+def write_rng(out, state):
+    version, internal, gauss_next = state
+    out.pack("<B", version)
+    out.buffer += RNG_STATE.pack(*internal)
+    out.pack("<?d", gauss_next is not None, gauss_next or 0.0)
+
+def read_rng(data):
+    version = data.unpack("<B")[0]
+    internal = data.unpack_struct(RNG_STATE)
+    has_gauss, gauss_next = data.unpack("<?d")
+    return version, internal, gauss_next if has_gauss else None
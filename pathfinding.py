@@ -0,0 +1,73 @@
+"""
+RoguePyxel pathfinding
+One shared distance field per turn for the enemy AI. The field holds the
+BFS (unit-cost Dijkstra) distance from the player to every reachable cell
+and is only expanded as far as the queries need: the first enemy asks for
+its neighbours' distances, later enemies mostly hit cells that are already
+settled. The field is kept between turns while the player and the map stay
+unchanged; moving the player or editing the map restarts the search, whose
+cost is bounded by the distance to the farthest chasing enemy, not by the
+map size or the number of enemies.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+STEPS = (("LEFT", -1, 0), ("RIGHT", 1, 0), ("UP", 0, -1), ("DOWN", 0, 1))
+
+class DistanceField:
+    def __init__(self):
+        self.source = None
+        self.version = None
+        self.passable = None
+        self.dist = {}
+        self.queue = []
+        self.head = 0
+
+    def update(self, source_x, source_y, version, passable):
+        # passable(x, y) tells whether a path may go through the cell; the
+        # source cell is always part of the field.
+        source = (source_x, source_y)
+        if source == self.source and version == self.version:
+            return
+        self.source = source
+        self.version = version
+        self.passable = passable
+        self.dist = {source: 0}
+        self.queue = [source]
+        self.head = 0
+
+    def distance(self, x, y):
+        # Distance from the source, or None when the cell cannot be reached.
+        cell = (x, y)
+        dist = self.dist
+        while cell not in dist and self.head < len(self.queue):
+            self.expand()
+        return dist.get(cell)
+
+    def expand(self):
+        x, y = self.queue[self.head]
+        self.head += 1
+        next_dist = self.dist[(x, y)] + 1
+        for _, dx, dy in STEPS:
+            cell = (x + dx, y + dy)
+            if cell not in self.dist and self.passable(cell[0], cell[1]):
+                self.dist[cell] = next_dist
+                self.queue.append(cell)
+
+    def best_steps(self, x, y):
+        # Directions from (x, y) to the reachable neighbours closest to the source.
+        best = None
+        choices = []
+        for direction, dx, dy in STEPS:
+            nx, ny = x + dx, y + dy
+            if (nx, ny) != self.source and not self.passable(nx, ny):
+                continue
+            dist = self.distance(nx, ny)
+            if dist is None:
+                continue
+            if best is None or dist < best:
+                best = dist
+                choices = [direction]
+            elif dist == best:
+                choices.append(direction)
+        return choices
@@ -0,0 +1,175 @@
+"""
+RoguePyxel profiler
+Per-frame timing for the Pyxel game. Phases are timed by wrapping methods:
+instrument(obj, names) shadows each named method with a timed wrapper
+stored on the instance, and disable() deletes the wrappers again, so with
+profiling off the game runs its plain methods and pays nothing. Only
+begin_frame/end_frame stay on the frame path, as one attribute test each.
+
+Timings go into fixed-size ring buffers (preallocated arrays, no
+allocation per span): the last EVENT_CAPACITY spans, with their nesting
+depth and frame number, and the work time (update + draw) of the last
+FRAME_CAPACITY frames. export_chrome_trace writes the buffered spans as
+Chrome trace-event JSON (chrome://tracing, Perfetto).
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import json
+import time
+from array import array
+
+EVENT_CAPACITY = 16384
+FRAME_CAPACITY = 600
+
+class Profiler:
+    def __init__(self, event_capacity=EVENT_CAPACITY, frame_capacity=FRAME_CAPACITY):
+        self.enabled = False
+        self.instrumented = []  # (object, method names)
+        self.depth = 0
+        self.frame = 0
+        self.frame_start = 0.0
+        self.origin = time.perf_counter()
+
+        # Span ring buffer
+        self.event_capacity = event_capacity
+        self.event_names = [None] * event_capacity
+        self.event_starts = array("d", bytes(8 * event_capacity))
+        self.event_ends = array("d", bytes(8 * event_capacity))
+        self.event_depths = array("b", bytes(event_capacity))
+        self.event_frames = array("l", bytes(array("l").itemsize * event_capacity))
+        self.event_count = 0
+
+        # Frame ring buffer (work time per frame, seconds)
+        self.frame_capacity = frame_capacity
+        self.frame_times = array("d", bytes(8 * frame_capacity))
+        self.frame_count = 0
+        self.last_frame = {}  # phase name -> seconds, for the last complete frame
+        self.current_frame = {}
+
+    # ---------------------------
+    # Switching On and Off
+    # ---------------------------
+    def instrument(self, obj, names):
+        # Registers methods to time; they are wrapped while enabled.
+        self.instrumented.append((obj, names))
+        if self.enabled:
+            self.wrap_all(obj, names)
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        for obj, names in self.instrumented:
+            self.wrap_all(obj, names)
+
+    def disable(self):
+        if not self.enabled:
+            return
+        self.enabled = False
+        self.depth = 0
+        for obj, names in self.instrumented:
+            for name in names:
+                obj.__dict__.pop(name, None)
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+        return self.enabled
+
+    def wrap_all(self, obj, names):
+        for name in names:
+            setattr(obj, name, self.wrap(name, getattr(obj, name)))
+
+    def wrap(self, name, method):
+        profiler = self
+        clock = time.perf_counter
+        def timed(*args, **kwargs):
+            profiler.depth += 1
+            start = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                end = clock()
+                profiler.depth -= 1
+                profiler.record(name, start, end)
+        timed.__name__ = name
+        return timed
+
+    # ---------------------------
+    # Recording
+    # ---------------------------
+    def record(self, name, start, end):
+        index = self.event_count % self.event_capacity
+        self.event_names[index] = name
+        self.event_starts[index] = start
+        self.event_ends[index] = end
+        self.event_depths[index] = self.depth
+        self.event_frames[index] = self.frame
+        self.event_count += 1
+        self.current_frame[name] = self.current_frame.get(name, 0.0) + end - start
+
+    def begin_frame(self):
+        if not self.enabled:
+            return
+        self.frame += 1
+        self.frame_start = time.perf_counter()
+        self.current_frame = {}
+
+    def end_frame(self):
+        if not self.enabled or not self.frame_start:
+            return
+        end = time.perf_counter()
+        self.frame_times[self.frame_count % self.frame_capacity] = end - self.frame_start
+        self.frame_count += 1
+        self.record("frame", self.frame_start, end)
+        self.last_frame = self.current_frame
+        self.frame_start = 0.0
+
+    # ---------------------------
+    # Statistics
+    # ---------------------------
+    def frame_stats(self):
+        # (last, mean, p99) frame work time in milliseconds.
+        count = min(self.frame_count, self.frame_capacity)
+        if not count:
+            return 0.0, 0.0, 0.0
+        times = sorted(self.frame_times[:count])
+        last = self.frame_times[(self.frame_count - 1) % self.frame_capacity]
+        p99 = times[min(count - 1, int(0.99 * count))]
+        return 1000 * last, 1000 * sum(times) / count, 1000 * p99
+
+    def top_phases(self, count=4, exclude=()):
+        # The slowest phases of the last frame, as (name, milliseconds).
+        phases = [(name, 1000 * seconds) for name, seconds in self.last_frame.items()
+                  if name != "frame" and name not in exclude]
+        phases.sort(key=lambda phase: -phase[1])
+        return phases[:count]
+
+    def events(self):
+        # Buffered spans, oldest first, as (name, start, end, depth, frame).
+        count = min(self.event_count, self.event_capacity)
+        first = self.event_count - count
+        for number in range(first, self.event_count):
+            index = number % self.event_capacity
+            yield (self.event_names[index], self.event_starts[index], self.event_ends[index],
+                   self.event_depths[index], self.event_frames[index])
+
+    def export_chrome_trace(self, path):
+        # Complete ("X") events with microsecond timestamps.
+        trace = []
+        for name, start, end, depth, frame in self.events():
+            trace.append({
+                "name": name,
+                "ph": "X",
+                "ts": (start - self.origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": 1,
+                "tid": 1,
+                "args": {"frame": frame, "depth": depth},
+            })
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+        return len(trace)
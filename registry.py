@@ -0,0 +1,115 @@
+"""
+RoguePyxel registry
+Enemy and item definitions come from a data table, registry.json, rather
+than from code:
+  - loot     the item symbols a common enemy may drop,
+  - enemies  per enemy symbol (its glyph on the map): name, stats and an
+             optional guaranteed drop,
+  - items    per item symbol: the variants one is picked from, with stats,
+  - merchant the shop's stock, one item each.
+A stat is a number, or a [low, high] range rolled with randint when the
+entity is made; ranges are rolled in the order the table lists them, so
+a run's random draws stay the same as long as the table does. For enemies
+"Hits" sets both MaxHits and Hits.
+The table is compiled once, at import, into templates holding ready-made
+constructor arguments, so spawn(rng) is the rolls and one constructor
+call; ENEMIES, ENEMY_NAMES, ITEMS and MERCHANT_STOCK index them.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import json
+import os
+
+from entities import Enemy, Item
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "registry.json")
+
+# ---------------------------
+# Templates
+# ---------------------------
+ENEMY_STATS = ("type", "Hits", "Str", "Armor", "Level", "Speed")  # Enemy() parameters
+ITEM_STATS = ("name", "type", "Description", "Hits", "Str", "Armor", "Satiety")  # Item() parameters
+
+class Template:
+    # One row of the table, compiled to the constructor arguments of cls:
+    # values in parameter order, with rolls the (index, low, high) of the
+    # ones rolled for every new instance.
+    __slots__ = ("symbol", "name", "cls", "params", "values", "rolls")
+
+    def __init__(self, symbol, name, cls, params, row):
+        self.symbol = symbol
+        self.name = name
+        self.cls = cls
+        self.params = params
+        default = cls()
+        values = [getattr(default, param) for param in params]
+        rolls = []
+        for key, value in row.items():
+            if key not in params:
+                raise ValueError("unknown stat {} for {}".format(key, name))
+            index = params.index(key)
+            if isinstance(value, list):
+                low, high = value
+                rolls.append((index, low, high))
+            else:
+                values[index] = value
+        self.values = tuple(values)
+        self.rolls = tuple(rolls)
+
+    def spawn(self, rng):
+        if not self.rolls:
+            return self.cls(*self.values)
+        values = list(self.values)
+        for index, low, high in self.rolls:
+            values[index] = rng.randint(low, high)
+        return self.cls(*values)
+
+    def bounds(self, stat):
+        # (low, high) of a stat, for code that rolls its own (batchsim.py).
+        index = self.params.index(stat)
+        for roll_index, low, high in self.rolls:
+            if roll_index == index:
+                return low, high
+        return self.values[index], self.values[index]
+
+class EnemyTemplate(Template):
+    __slots__ = ("drop", "loot")
+
+    def __init__(self, symbol, row, loot):
+        row = dict(row)
+        name = row.pop("name")
+        self.drop = row.pop("drop", None)  # dropped on every kill
+        self.loot = tuple(loot)  # otherwise a chance at one of these
+        row["type"] = name
+        Template.__init__(self, symbol, name, Enemy, ENEMY_STATS, row)
+
+class ItemTemplate(Template):
+    __slots__ = ()
+
+    def __init__(self, symbol, row):
+        row = dict(row, type=symbol)
+        Template.__init__(self, symbol, row["name"], Item, ITEM_STATS, row)
+
+def spawn_item(symbol, rng):
+    # One of the symbol's variants, picked at random when there are several.
+    variants = ITEMS[symbol]
+    template = variants[0] if len(variants) == 1 else rng.choice(variants)
+    return template.spawn(rng)
+
+# ---------------------------
+# Loading
+# ---------------------------
+def load(path=DATA_PATH):
+    # (enemies by symbol, item variants by symbol, merchant stock)
+    with open(path, encoding="utf-8") as f:
+        table = json.load(f)
+    enemies = {symbol: EnemyTemplate(symbol, row, table["loot"])
+               for symbol, row in table["enemies"].items()}
+    items = {symbol: tuple(ItemTemplate(symbol, row) for row in rows)
+             for symbol, rows in table["items"].items()}
+    merchant = tuple(ItemTemplate(row["type"], row) for row in table["merchant"])
+    return enemies, items, merchant
+
+ENEMIES, ITEMS, MERCHANT_STOCK = load()
+ENEMY_NAMES = {template.name: template for template in ENEMIES.values()}
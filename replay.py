@@ -0,0 +1,242 @@
+"""
+RoguePyxel recordings and replays
+A Recording is the seed of a run plus every action taken (see the
+ACTION_* codes in engine.py), so the headless Engine can play the run
+again, exactly, at full CPU speed. Recordings are small:
+  - one byte per action (code in the high nibble, argument in the low
+    nibble, larger arguments follow as a varint),
+  - a state hash every CHECKPOINT_EVERY actions and at the end, which the
+    replayer checks to catch any divergence close to where it happens,
+  - runs continued from a save embed that snapshot as their start.
+The file is a header (MAGIC, format VERSION) and a zlib-compressed body.
+
+Usage:
+  python replay.py record --seed 7 --turns 20000 run.rpr
+  python replay.py play run.rpr [--repeat 10] [--no-check]
+Replays double as regression benchmarks: play reports actions per second
+and fails on the first hash mismatch.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import argparse
+import hashlib
+import random
+import struct
+import sys
+import time
+import zlib
+
+import savegame
+from engine import Engine, DIRECTIONS
+
+MAGIC = b"RPRC"
+VERSION = 1
+HEADER = struct.Struct("<4sH")
+CHECKPOINT = struct.Struct("<I8s")
+CHECKPOINT_EVERY = 64
+RECORDING_PATH = "roguepyxel.rpr"
+
+class ReplayError(ValueError):
+    pass
+
+def state_hash(engine):
+    # Hash of everything a save holds, RNG streams included.
+    return hashlib.blake2b(savegame.snapshot(engine), digest_size=8).digest()
+
+# ---------------------------
+# Recording
+# ---------------------------
+class Recording:
+    def __init__(self, engine=None):
+        # Starts recording the engine from its current state; a run still on
+        # the title screen only needs its seed.
+        self.seed = None
+        self.start = b""
+        self.actions = bytearray()
+        self.count = 0
+        self.checkpoints = []  # (number of actions played, state hash)
+        if engine is not None:
+            self.seed = engine.seed
+            if engine.state != "title":
+                self.start = savegame.snapshot(engine)
+
+    def add(self, engine, action, arg):
+        # Called before the action runs, so the engine holds the state after
+        # the previous one.
+        if self.count % CHECKPOINT_EVERY == 0:
+            self.checkpoint(engine)
+        self.count += 1
+        # Arguments are zigzag-coded: inventory indices can be -1.
+        arg = arg * 2 if arg >= 0 else -arg * 2 - 1
+        if arg < 15:
+            self.actions.append(action << 4 | arg)
+            return
+        self.actions.append(action << 4 | 15)
+        arg -= 15
+        while arg >= 0x80:
+            self.actions.append(arg & 0x7F | 0x80)
+            arg >>= 7
+        self.actions.append(arg)
+
+    def checkpoint(self, engine):
+        if self.count and (not self.checkpoints or self.checkpoints[-1][0] != self.count):
+            self.checkpoints.append((self.count, state_hash(engine)))
+
+    def finish(self, engine):
+        # Hashes the final state; call before saving.
+        self.checkpoint(engine)
+
+    def iter_actions(self):
+        data = self.actions
+        offset = 0
+        while offset < len(data):
+            byte = data[offset]
+            offset += 1
+            arg = byte & 15
+            if arg == 15:
+                shift = 0
+                extra = 0
+                while True:
+                    part = data[offset]
+                    offset += 1
+                    extra |= (part & 0x7F) << shift
+                    shift += 7
+                    if not part & 0x80:
+                        break
+                arg += extra
+            yield byte >> 4, arg // 2 if arg % 2 == 0 else -(arg + 1) // 2
+
+    def to_bytes(self):
+        out = savegame.Writer()
+        if isinstance(self.seed, int):
+            out.pack("<B", 0)
+            out.text(str(self.seed))
+        else:
+            out.pack("<B", 1)
+            out.text(self.seed)
+        out.pack("<I", len(self.start))
+        out.buffer += self.start
+        out.pack("<II", self.count, len(self.actions))
+        out.buffer += self.actions
+        out.pack("<I", len(self.checkpoints))
+        for count, digest in self.checkpoints:
+            out.buffer += CHECKPOINT.pack(count, digest)
+        return HEADER.pack(MAGIC, VERSION) + zlib.compress(bytes(out.buffer), 6)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < HEADER.size:
+            raise ReplayError("not a RoguePyxel recording")
+        magic, version = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ReplayError("not a RoguePyxel recording")
+        if version != VERSION:
+            raise ReplayError("unsupported recording version {}".format(version))
+        try:
+            body = savegame.Reader(memoryview(zlib.decompress(data[HEADER.size:])))
+            recording = cls()
+            seed_kind = body.unpack("<B")[0]
+            seed = body.text()
+            recording.seed = int(seed) if seed_kind == 0 else seed
+            recording.start = bytes(body.raw(body.unpack("<I")[0]))
+            recording.count, length = body.unpack("<II")
+            recording.actions = bytearray(body.raw(length))
+            recording.checkpoints = [body.unpack_struct(CHECKPOINT) for _ in range(body.unpack("<I")[0])]
+        except (zlib.error, struct.error, savegame.SaveError) as error:
+            raise ReplayError("corrupted recording: {}".format(error)) from error
+        return recording
+
+    def save(self, path=RECORDING_PATH):
+        savegame.write_file(path, self.to_bytes())
+
+    @classmethod
+    def load(cls, path=RECORDING_PATH):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+# ---------------------------
+# Replay
+# ---------------------------
+def replay(recording, check=True):
+    # Plays the recording on a fresh headless engine and returns it. Raises
+    # ReplayError at the first checkpoint whose hash does not match.
+    engine = Engine(recording.seed)
+    if recording.start:
+        savegame.read_engine(savegame.Reader(memoryview(recording.start)), engine)
+    checkpoints = recording.checkpoints if check else []
+    next_check = 0
+    index = 0
+    for action, arg in recording.iter_actions():
+        if next_check < len(checkpoints) and checkpoints[next_check][0] == index:
+            verify(engine, checkpoints[next_check])
+            next_check += 1
+        engine.perform(action, arg)
+        index += 1
+    if next_check < len(checkpoints):
+        verify(engine, checkpoints[next_check])
+    return engine
+
+def verify(engine, checkpoint):
+    count, digest = checkpoint
+    if state_hash(engine) != digest:
+        raise ReplayError("state diverged after {} actions (turn {})".format(count, engine.turns))
+
+def record_random(seed, turns):
+    # Random-walk play for the given number of turns in total, restarting
+    # (with a seed drawn from the walk's generator) whenever a run ends.
+    rng = random.Random(seed)
+    engine = Engine(seed)
+    engine.recording = Recording(engine)
+    engine.start_game()
+    for _ in range(turns):
+        if engine.state == "merchant":
+            engine.buy_merchant_item()
+            engine.leave_merchant()
+        elif engine.state != "game":
+            engine.restart_game(rng.getrandbits(32))
+            engine.start_game()
+        engine.step(rng.choice(DIRECTIONS))
+    engine.recording.finish(engine)
+    return engine.recording
+
+# ---------------------------
+# Command Line
+# ---------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record and replay RoguePyxel runs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="record a random-walk run")
+    record_parser.add_argument("--seed", type=int, default=0)
+    record_parser.add_argument("--turns", type=int, default=10000)
+    record_parser.add_argument("path")
+    play_parser = commands.add_parser("play", help="replay a recording and check its hashes")
+    play_parser.add_argument("path")
+    play_parser.add_argument("--repeat", type=int, default=1)
+    play_parser.add_argument("--no-check", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        recording = record_random(args.seed, args.turns)
+        recording.save(args.path)
+        print("{} actions, {} checkpoints, {} bytes".format(
+            recording.count, len(recording.checkpoints), len(recording.to_bytes())))
+        return 0
+
+    recording = Recording.load(args.path)
+    start = time.perf_counter()
+    try:
+        for _ in range(args.repeat):
+            replay(recording, check=not args.no_check)
+    except ReplayError as error:
+        print("FAILED: {}".format(error))
+        return 1
+    elapsed = time.perf_counter() - start
+    actions = recording.count * args.repeat
+    print("OK: {} actions x {}, {:.3f}s ({:.0f} actions/s)".format(
+        recording.count, args.repeat, elapsed,
+        actions / elapsed if elapsed > 0 else 0))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+RoguePyxel save games
+Snapshots the whole Engine state (player, inventory and equipment, grid
+and explored cells, enemies and their schedule, items, the floors left
+behind, level bookkeeping, merchant stock, the message log and the RNG
+streams) into a compact binary file:
+  header  MAGIC, format VERSION (u16), body length (u32), CRC-32 (u32)
+  body    zlib-compressed fields packed with struct (packing.py), in the
+          order of write_engine; the grid goes in as raw TileGrid chunks,
+          and the floors in the level store follow the current one,
+          each compressed on its own, as the level store spills them.
+A snapshot is taken in two parts: snapshot() packs the raw body on the
+calling thread (a few copies, so it is a consistent view of the state;
+only floors saved for the first time are compressed there), encode()
+compresses it and can run anywhere. The Autosaver does the second part,
+and the file write, on a background thread so saving never stalls a
+frame.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import os
+import queue
+import struct
+import threading
+import zlib
+
+from entities import Stats
+from eventlog import Event
+from fov import FieldOfView
+from pathfinding import DistanceField
+from scheduler import Scheduler
+from engine import Occupancy, RandomStreams, STREAMS, GRID_VERSIONS
+from levels import level_seed
+from packing import (SaveError, Writer, Reader, STATS_FIELDS, STATS_INTS, write_enemy, read_enemy,
+                     write_items, read_items, write_grid, read_grid, write_rng, read_rng)
+
+MAGIC = b"RPSV"
+VERSION = 6
+HEADER = struct.Struct("<4sHII")
+SAVE_PATH = "roguepyxel.sav"
+
+# ---------------------------
+# Engine State
+# ---------------------------
+def write_engine(out, engine):
+    # Run
+    if isinstance(engine.seed, int):
+        out.pack("<B", 0)
+        out.text(str(engine.seed))
+    else:
+        out.pack("<B", 1)
+        out.text(engine.seed)
+    out.text(engine.state)
+    out.text(engine.player_name)
+    out.pack("<?", engine.first_move_done)
+    out.pack("<I", engine.turns)
+    out.text(engine.last_damage_source)
+    out.texts(engine.picked_items)
+    out.pack("<I", len(engine.messages))
+    for event in engine.messages:
+        out.int(event.turn)
+        out.text(event.kind)
+        out.text(event.text)
+
+    # Player
+    player = engine.player
+    out.buffer += STATS_INTS.pack(*[getattr(player, name) for name in STATS_FIELDS])
+    out.text(player.StatusEffect)
+    write_items(out, player.Inventory)
+    write_items(out, player.EquippedItems)
+
+    # Level
+    out.int(engine.level)
+    out.pack("<I", len(engine.level_sizes))
+    for width, height in engine.level_sizes:
+        out.pack("<ii", width, height)
+    out.pack("<iiii", engine.gate_x, engine.gate_y, engine.start_x, engine.start_y)
+    write_grid(out, engine.grid)
+    out.pack("<I", len(engine.explored))
+    out.buffer += engine.explored
+
+    # Enemies and items on the level
+    out.pack("<I", engine.scheduler.clock)
+    out.pack("<I", len(engine.enemies))
+    for enemy in engine.enemies:
+        write_enemy(out, enemy)
+    write_items(out, engine.items)
+
+    # Floors left behind, in the level store
+    packed = list(engine.floors.packed())
+    out.pack("<I", len(packed))
+    for number, floor in packed:
+        out.pack("<iI", number, len(floor))
+        out.buffer += floor
+
+    # Merchant and menus
+    write_items(out, engine.merchant_items)
+    out.pack("<ii", engine.merchant_selection, engine.inventory_cursor)
+
+    for name in STREAMS:
+        write_rng(out, getattr(engine.rng, name).getstate())
+
+def read_engine(data, engine):
+    seed_kind = data.unpack("<B")[0]
+    seed = data.text()
+    engine.seed = int(seed) if seed_kind == 0 else seed
+    engine.state = data.text()
+    engine.player_name = data.text()
+    engine.first_move_done = data.unpack("<?")[0]
+    engine.turns = data.unpack("<I")[0]
+    engine.last_damage_source = data.text()
+    engine.picked_items = data.texts()
+    engine.messages.restore([Event(data.int(), data.text(), data.text())
+                             for _ in range(data.unpack("<I")[0])])
+
+    player = Stats()
+    for name, value in zip(STATS_FIELDS, data.unpack_struct(STATS_INTS)):
+        setattr(player, name, value)
+    player.StatusEffect = data.text()
+    player.Inventory = read_items(data)
+    player.EquippedItems = read_items(data)
+    engine.player = player
+
+    engine.level = data.int()
+    engine.level_sizes = [list(data.unpack("<ii")) for _ in range(data.unpack("<I")[0])]
+    engine.gate_x, engine.gate_y, engine.start_x, engine.start_y = data.unpack("<iiii")
+    engine.grid = read_grid(data)
+    engine.grid_width = engine.grid.width
+    engine.grid_height = engine.grid.height
+    engine.explored = bytearray(data.raw(data.unpack("<I")[0]))
+
+    engine.scheduler = Scheduler(data.unpack("<I")[0])
+    engine.enemies = [read_enemy(data) for _ in range(data.unpack("<I")[0])]
+    engine.scheduler.reset(engine.enemies)
+    engine.items = read_items(data)
+
+    engine.floors.clear()
+    # Floors go straight to the spill file and are only unpacked when the
+    # player returns to them.
+    for _ in range(data.unpack("<I")[0]):
+        number, length = data.unpack("<iI")
+        engine.floors.put_spilled(number, bytes(data.raw(length)))
+
+    engine.merchant_items = read_items(data)
+    engine.merchant_selection, engine.inventory_cursor = data.unpack("<ii")
+
+    engine.rng = RandomStreams(engine.seed)
+    for name in STREAMS:
+        getattr(engine.rng, name).setstate(read_rng(data))
+
+    # Derived state is rebuilt rather than stored.
+    engine.occupancy = Occupancy()
+    for enemy in engine.enemies:
+        engine.occupancy.add_enemy(enemy)
+    for item in engine.items:
+        engine.occupancy.add_item(item)
+    engine.paths = DistanceField()
+    engine.grid_version = next(GRID_VERSIONS)
+    engine.fov = FieldOfView()
+    engine.visible = frozenset()
+    engine.look()
+    engine.pipeline.clear()
+    if engine.level + 1 not in engine.floors:
+        engine.pipeline.prefetch(engine.level + 1, level_seed(engine.seed, engine.level + 1))
+
+# ---------------------------
+# Files
+# ---------------------------
+def snapshot(engine):
+    out = Writer()
+    write_engine(out, engine)
+    return bytes(out.buffer)
+
+def encode(body):
+    packed = zlib.compress(body, 1)
+    return HEADER.pack(MAGIC, VERSION, len(packed), zlib.crc32(packed)) + packed
+
+def decode(data):
+    if len(data) < HEADER.size:
+        raise SaveError("not a RoguePyxel save")
+    magic, version, length, crc = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SaveError("not a RoguePyxel save")
+    if version != VERSION:
+        raise SaveError("unsupported save version {}".format(version))
+    packed = data[HEADER.size:HEADER.size + length]
+    if len(packed) != length or zlib.crc32(packed) != crc:
+        raise SaveError("corrupted save")
+    return zlib.decompress(packed)
+
+def write_file(path, data):
+    # Written next to the target and renamed over it, so a crash mid-write
+    # never leaves a half-written save behind.
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def save(engine, path=SAVE_PATH):
+    write_file(path, encode(snapshot(engine)))
+
+def load(engine, path=SAVE_PATH):
+    with open(path, "rb") as f:
+        body = decode(f.read())
+    read_engine(Reader(memoryview(body)), engine)
+
+class Autosaver:
+    # Compresses and writes snapshots on a daemon thread. Only the newest
+    # pending snapshot matters, so an older one still waiting is dropped.
+    # Snapshots are numbered as they are submitted; poll() reports the
+    # writes that finished, so the interface can tell when a save is on
+    # disk or why it is not.
+    def __init__(self, path=SAVE_PATH):
+        self.path = path
+        self.pending = queue.Queue(maxsize=1)
+        self.finished = queue.Queue()
+        self.submitted = 0
+        self.thread = threading.Thread(target=self.run, name="autosave", daemon=True)
+        self.thread.start()
+
+    def submit(self, engine):
+        # Returns the snapshot's number.
+        self.submitted += 1
+        job = (self.submitted, snapshot(engine))
+        while True:
+            try:
+                self.pending.put_nowait(job)
+                return self.submitted
+            except queue.Full:
+                try:
+                    self.pending.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def run(self):
+        while True:
+            job = self.pending.get()
+            if job is None:
+                return
+            number, body = job
+            try:
+                write_file(self.path, encode(body))
+            except OSError as error:
+                self.finished.put((number, error))
+            else:
+                self.finished.put((number, None))
+
+    def poll(self):
+        # (number, error) for every write finished since the last call;
+        # error is None once the snapshot is saved, else the OSError that
+        # stopped it.
+        done = []
+        while True:
+            try:
+                done.append(self.finished.get_nowait())
+            except queue.Empty:
+                return done
+
+    def close(self):
+        # Waits for the last snapshot to be written.
+        if not self.thread.is_alive():
+            return
+        self.pending.put(None)
+        self.thread.join()
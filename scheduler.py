@@ -0,0 +1,75 @@
+"""
+RoguePyxel turn scheduler
+Enemies act on an energy clock rather than once each per turn. Every
+player turn advances the clock by TURN_TIME; an enemy with Speed s (100
+is the player's pace) acts every TURN_TIME * 100 // s time units, so a
+Bat acts three times in two turns and a Zombie every other turn. Awake
+enemies wait on a heap ordered by (next action time, order), and a turn
+only pops the ones that are due: its cost follows the number of awake
+enemies, not the population of the level.
+An enemy farther than SLEEP_DISTANCE from the player is parked when it
+acts and takes no more turns until the player comes within WAKE_DISTANCE
+of it; waking is a spatial query around the player on the occupancy
+index. Enemies start parked, so a level only runs the ones near the
+player.
+The schedule lives on the enemies (next_time, awake) and in the clock,
+which saves keep; the heap itself is rebuilt from them.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import heapq
+
+TURN_TIME = 100
+WAKE_DISTANCE = 12
+SLEEP_DISTANCE = 16
+
+def action_delay(enemy):
+    return TURN_TIME * 100 // max(1, enemy.Speed)
+
+class Scheduler:
+    def __init__(self, clock=0):
+        self.clock = clock
+        self.heap = []  # (next_time, order, enemy) of the awake enemies
+
+    def reset(self, enemies):
+        # Schedules a new set of enemies (a new level, a loaded save).
+        self.heap = [(enemy.next_time, enemy.order, enemy) for enemy in enemies if enemy.awake]
+        heapq.heapify(self.heap)
+
+    def copy(self, enemies):
+        # The schedule of a copy of the enemies (see Engine.clone).
+        scheduler = Scheduler(self.clock)
+        scheduler.reset(enemies)
+        return scheduler
+
+    def wake(self, enemy):
+        if enemy.awake:
+            return
+        enemy.awake = True
+        # A parked enemy keeps any wait it still had when it was parked.
+        enemy.next_time = max(enemy.next_time, self.clock)
+        heapq.heappush(self.heap, (enemy.next_time, enemy.order, enemy))
+
+    def wake_near(self, occupancy, x, y):
+        for _, enemies in occupancy.in_rect(occupancy.enemies, x - WAKE_DISTANCE, y - WAKE_DISTANCE,
+                                            x + WAKE_DISTANCE + 1, y + WAKE_DISTANCE + 1):
+            for enemy in enemies:
+                self.wake(enemy)
+
+    def due(self, x, y):
+        # Yields the enemies due by the clock, in action order; each is
+        # rescheduled after it acts, or parked when it ends up far from
+        # (x, y). Dead enemies leave the heap as they come up.
+        heap = self.heap
+        while heap and heap[0][0] <= self.clock:
+            _, order, enemy = heapq.heappop(heap)
+            if enemy.Hits <= 0:
+                enemy.awake = False
+                continue
+            yield enemy
+            enemy.next_time += action_delay(enemy)
+            if max(abs(enemy.x - x), abs(enemy.y - y)) > SLEEP_DISTANCE:
+                enemy.awake = False
+            else:
+                heapq.heappush(heap, (enemy.next_time, order, enemy))
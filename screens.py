@@ -0,0 +1,102 @@
+"""
+RoguePyxel screen contents
+What the screens and the sidebar say, built from the Engine state alone
+so that every front end shows the same thing: the Pyxel window (main.py)
+and the terminal renderer (termrender.py) lay these lines out their own
+way. Sidebar blocks are lists of strings, drawn in one colour each; the
+full-screen menus are (text, colour) lines, top to bottom, "" lines being
+gaps. Colours are names from COLORS, which each front end maps to its own
+palette. Nothing here imports pyxel.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import odds
+
+COLORS = ("white", "gray", "yellow", "orange", "green", "lime", "cyan", "red", "pink")
+
+# Enemies listed by the odds readout, nearest first.
+ODDS_LINES = 8
+
+LEGEND_LINES = [
+    "Legend:",
+    "P: Player",
+    "G: Gold",
+    "): Sword",
+    "[: Shield",
+    "=: Ring",
+    ": : Food",
+    "*: Jewelry",
+    "𖡄: Gate",
+    "#: Wall",
+    "A-Z: Enemy"
+]
+
+HELP_LINES = [
+    "Arrow keys: Move",
+    "Space: Wait",
+    "I: Inventory",
+    "H: Help",
+    "S: Save",
+    "< (comma): Climb back up, from where you entered the level",
+    "F3: Profiler, F4: Export trace, F5: Combat odds, F6: Fast input",
+    "Inventory: U = Use/Equip, O = Unequip, D = Discard, Esc/I = Exit",
+    "Merchant: RETURN = Buy, Left/Right = Select, M = Exit"
+]
+
+# ---------------------------
+# Sidebar
+# ---------------------------
+def stats_lines(engine):
+    player = engine.player
+    return (
+        "Stats:",
+        "Lvl: {} ".format(player.Level),
+        "Hits: {}/{}".format(player.Hits, player.MaxHits),
+        "Str: {}/{}".format(player.Str, player.MaxStr),
+        "Gold: {}".format(player.Gold),
+        "Armor: {}".format(player.Armor),
+        "Satiety: {}%".format(player.Satiety),
+        "Exp: {}/{}".format(player.Exp, player.ExpCap)
+    )
+
+def message_lines(engine, count=5):
+    return ["Messages:"] + list(engine.messages.recent(count))
+
+def odds_lines(engine):
+    # The enemies in sight, nearest first: the chance of beating each in
+    # a straight fight and the hits the player can expect to lose.
+    player = engine.player
+    buckets = engine.occupancy.enemies
+    in_sight = [enemy for cell in engine.visible for enemy in buckets.get(cell, ())]
+    in_sight.sort(key=lambda enemy: (max(abs(enemy.x - player.x), abs(enemy.y - player.y)), enemy.order))
+    lines = ["Odds (F5 off):"]
+    for enemy in in_sight[:ODDS_LINES]:
+        duel = odds.duel(player.Str, player.Armor, player.Hits, enemy.Str, enemy.Armor, enemy.Hits)
+        lines.append("{} {:.0f}% -{:.1f}".format(enemy.type, 100 * duel.win, duel.hits_lost))
+    if not in_sight:
+        lines.append("No enemy in sight")
+    return lines
+
+# ---------------------------
+# Menus
+# ---------------------------
+def inventory_lines(engine):
+    lines = [("Inventory (U: Use/Equip, O: Unequip, D: Discard, Esc/I: Exit)", "white"), ("", "white")]
+    for index, item in enumerate(engine.player.Inventory):
+        prefix = "-> " if index == engine.inventory_cursor else "   "
+        lines.append(("{}{}".format(prefix, item.name), "yellow"))
+    lines += [("", "white"), ("Equipped:", "white")]
+    lines += [(item.name, "green") for item in engine.player.EquippedItems]
+    return lines
+
+def merchant_lines(engine):
+    lines = [("Merchant's Shop (RETURN: Buy, Left/Right: Choose, M: Exit)", "white"), ("", "white")]
+    for index, item in enumerate(engine.merchant_items):
+        prefix = "-> " if index == engine.merchant_selection else "   "
+        lines.append(("{}{}".format(prefix, item.name), "yellow"))
+    lines += [("", "white"), ("Your Gold: {}".format(engine.player.Gold), "cyan")]
+    return lines
+
+def help_lines():
+    return [(line, "white") for line in HELP_LINES] + [("", "white"), ("Press Esc or H to return", "cyan")]
@@ -0,0 +1,550 @@
+"""
+RoguePyxel terminal renderer
+Plays RoguePyxel in a terminal, e.g. over SSH where a window is out of
+the question, on the headless Engine:
+  python termrender.py [--backend ansi|curses] [--seed 7] [--stats]
+TerminalRenderer draws each screen (the map and its sidebar, the
+inventory, the merchant, help, the title and end screens) from the
+Engine state into a Canvas of character cells, with the same screen
+contents as the Pyxel window (screens.py). A backend puts the canvas on
+the terminal, and only what changed: it keeps the last frame it sent and
+writes just the runs of cells that differ, so a move costs a few dozen
+bytes instead of a screenful. Backends are pluggable (BACKENDS):
+  - ansi    ANSI escape sequences on stdout, the terminal in cbreak
+            mode; only the standard library,
+  - curses  the curses module, for terminals that need their terminfo.
+Glyphs a terminal cannot be trusted to draw one cell wide (the gate)
+are swapped for the ones in TERMINAL_GLYPHS.
+Keys are those of the window, with F5 for the odds and Q to quit; moves
+go through an InputQueue in fast mode, so every key typed is played.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import argparse
+import os
+import select
+import shutil
+import sys
+
+import savegame
+import screens
+from engine import Engine, Occupancy
+from grid import TILE_SYMBOLS
+from inputqueue import InputQueue
+from levels import LevelPipeline
+
+SIDEBAR_WIDTH = 30
+RUN_GAP = 4  # unchanged cells bridged rather than moving the cursor past them
+POLL_TIMEOUT = 0.25  # seconds between checks for a resized terminal
+
+TERMINAL_GLYPHS = {"𖡄": ">"}
+
+# Map colours: tiles in sight by symbol, everything explored but out of sight dimmed.
+TILE_COLORS = {"#": "white", ".": "white", "G": "yellow", "𖡄": "green"}
+TILE_GLYPHS = [TERMINAL_GLYPHS.get(symbol, symbol) for symbol in TILE_SYMBOLS]
+FOG_COLOR = "gray"
+
+# Escape sequences of the keys used, in both cursor key modes
+SEQUENCES = {"[A": "UP", "[B": "DOWN", "[C": "RIGHT", "[D": "LEFT",
+             "OA": "UP", "OB": "DOWN", "OC": "RIGHT", "OD": "LEFT", "[15~": "F5"}
+
+# Map keys, by the key names read_keys() returns
+MOVE_KEYS = {"LEFT": "LEFT", "RIGHT": "RIGHT", "UP": "UP", "DOWN": "DOWN", "SPACE": "NONE"}
+
+# ---------------------------
+# Canvas
+# ---------------------------
+class Canvas:
+    # Rows of characters and of colour names (see screens.COLORS).
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.clear()
+
+    def clear(self):
+        self.chars = [[" "] * self.width for _ in range(self.height)]
+        self.colors = [["white"] * self.width for _ in range(self.height)]
+
+    def text(self, x, y, text, color="white"):
+        # Clipped to the canvas.
+        if not 0 <= y < self.height:
+            return
+        chars, colors = self.chars[y], self.colors[y]
+        for char in text:
+            if 0 <= x < self.width:
+                chars[x] = TERMINAL_GLYPHS.get(char, char)
+                colors[x] = color
+            x += 1
+
+    def lines(self, x, y, lines):
+        # (text, colour) lines of screens.py, one per row.
+        for text, color in lines:
+            self.text(x, y, text, color)
+            y += 1
+
+def changed_runs(old_chars, old_colors, chars, colors):
+    # (start, end) runs of the cells of a row that differ from the old row,
+    # runs closer than RUN_GAP cells being merged into one.
+    runs = []
+    x, width = 0, len(chars)
+    while x < width:
+        if chars[x] == old_chars[x] and colors[x] == old_colors[x]:
+            x += 1
+            continue
+        start = x
+        end = x = x + 1
+        while x < width and x - end < RUN_GAP:
+            if chars[x] != old_chars[x] or colors[x] != old_colors[x]:
+                end = x + 1
+            x += 1
+        runs.append((start, end))
+        x = end
+    return runs
+
+# ---------------------------
+# Backends
+# ---------------------------
+def parse_keys(text):
+    # Key names in typed text: "UP", "ENTER", "ESC", "F5"... or the
+    # character itself.
+    keys = []
+    index = 0
+    while index < len(text):
+        char = text[index]
+        index += 1
+        if char == "\x1b":
+            for sequence, key in SEQUENCES.items():
+                if text.startswith(sequence, index):
+                    keys.append(key)
+                    index += len(sequence)
+                    break
+            else:
+                keys.append("ESC")
+        elif char in "\r\n":
+            keys.append("ENTER")
+        elif char == " ":
+            keys.append("SPACE")
+        else:
+            keys.append(char)
+    return keys
+
+class Backend:
+    # Puts canvases on a terminal, writing only the cells that changed since
+    # the previous one; subclasses do the terminal I/O. Counts what it sends.
+    def __init__(self):
+        self.previous = None  # (chars, colors) rows as last sent
+        self.frames = 0
+        self.cells_sent = 0
+        self.bytes_sent = 0
+
+    def present(self, canvas):
+        previous = self.previous
+        if previous is None or len(previous[0]) != canvas.height or len(previous[0][0]) != canvas.width:
+            self.clear_screen()
+            blank = [" "] * canvas.width
+            previous = self.previous = ([list(blank) for _ in range(canvas.height)],
+                                        [["white"] * canvas.width for _ in range(canvas.height)])
+        old_rows, old_colors = previous
+        for y in range(canvas.height):
+            chars, colors = canvas.chars[y], canvas.colors[y]
+            if chars == old_rows[y] and colors == old_colors[y]:
+                continue
+            for start, end in changed_runs(old_rows[y], old_colors[y], chars, colors):
+                self.write_run(start, y, chars[start:end], colors[start:end])
+                self.cells_sent += end - start
+            old_rows[y] = list(chars)
+            old_colors[y] = list(colors)
+        self.flush()
+        self.frames += 1
+
+    def invalidate(self):
+        # The next frame is sent whole (after a resize, or on request).
+        self.previous = None
+
+class AnsiBackend(Backend):
+    CODES = {"white": "37", "gray": "90", "yellow": "93", "orange": "33", "green": "32",
+             "lime": "92", "cyan": "36", "red": "31", "pink": "95"}
+
+    def __init__(self, output=None, input_fd=None):
+        Backend.__init__(self)
+        self.output = output or sys.stdout.buffer
+        self.input_fd = sys.stdin.fileno() if input_fd is None else input_fd
+        self.buffer = []
+        self.color = None  # the terminal's current colour
+        self.saved_mode = None
+
+    def open(self):
+        if os.isatty(self.input_fd):
+            import termios
+            import tty
+            self.saved_mode = termios.tcgetattr(self.input_fd)
+            tty.setcbreak(self.input_fd)
+        # Alternate screen, cursor hidden
+        self.buffer.append("\x1b[?1049h\x1b[?25l")
+        self.flush()
+
+    def close(self):
+        self.buffer.append("\x1b[0m\x1b[2J\x1b[?25h\x1b[?1049l")
+        self.flush()
+        if self.saved_mode is not None:
+            import termios
+            termios.tcsetattr(self.input_fd, termios.TCSADRAIN, self.saved_mode)
+            self.saved_mode = None
+
+    def size(self):
+        return shutil.get_terminal_size()
+
+    def clear_screen(self):
+        self.buffer.append("\x1b[0m\x1b[2J")
+        self.color = None
+
+    def write_run(self, x, y, chars, colors):
+        parts = ["\x1b[{};{}H".format(y + 1, x + 1)]
+        for char, color in zip(chars, colors):
+            if color != self.color:
+                parts.append("\x1b[{}m".format(self.CODES[color]))
+                self.color = color
+            parts.append(char)
+        self.buffer.append("".join(parts))
+
+    def flush(self):
+        if not self.buffer:
+            return
+        data = "".join(self.buffer).encode("utf-8")
+        self.buffer = []
+        self.output.write(data)
+        self.output.flush()
+        self.bytes_sent += len(data)
+
+    def read_keys(self, timeout):
+        # Key names typed within timeout seconds (None waits), [] if none.
+        ready, _, _ = select.select([self.input_fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self.input_fd, 1024)
+        if not data:
+            return ["EOF"]
+        return parse_keys(data.decode("utf-8", "replace"))
+
+class CursesBackend(Backend):
+    def __init__(self):
+        Backend.__init__(self)
+        import curses
+        self.curses = curses
+        self.screen = None
+        self.attributes = {}
+
+    def open(self):
+        curses = self.curses
+        self.screen = curses.initscr()
+        curses.noecho()
+        curses.cbreak()
+        self.screen.keypad(True)
+        try:
+            curses.curs_set(0)
+        except curses.error:
+            pass
+        pairs = {"white": (curses.COLOR_WHITE, 0), "gray": (curses.COLOR_WHITE, curses.A_DIM),
+                 "yellow": (curses.COLOR_YELLOW, curses.A_BOLD), "orange": (curses.COLOR_YELLOW, 0),
+                 "green": (curses.COLOR_GREEN, 0), "lime": (curses.COLOR_GREEN, curses.A_BOLD),
+                 "cyan": (curses.COLOR_CYAN, 0), "red": (curses.COLOR_RED, 0),
+                 "pink": (curses.COLOR_MAGENTA, curses.A_BOLD)}
+        has_colors = curses.has_colors()
+        if has_colors:
+            curses.start_color()
+        for number, (name, (color, attribute)) in enumerate(pairs.items(), 1):
+            if has_colors:
+                curses.init_pair(number, color, curses.COLOR_BLACK)
+                attribute |= curses.color_pair(number)
+            self.attributes[name] = attribute
+
+    def close(self):
+        curses = self.curses
+        self.screen.keypad(False)
+        curses.nocbreak()
+        curses.echo()
+        curses.endwin()
+
+    def size(self):
+        rows, columns = self.screen.getmaxyx()
+        return os.terminal_size((columns, rows))
+
+    def clear_screen(self):
+        self.screen.clear()
+
+    def write_run(self, x, y, chars, colors):
+        # Cell by cell where the colour changes; writing the bottom-right
+        # cell scrolls past the end, which curses reports as an error.
+        start = 0
+        for index in range(1, len(chars) + 1):
+            if index == len(chars) or colors[index] != colors[start]:
+                try:
+                    self.screen.addstr(y, x + start, "".join(chars[start:index]), self.attributes[colors[start]])
+                except self.curses.error:
+                    pass
+                start = index
+
+    def flush(self):
+        self.screen.refresh()
+
+    def read_keys(self, timeout):
+        curses = self.curses
+        self.screen.timeout(-1 if timeout is None else int(timeout * 1000))
+        names = {curses.KEY_UP: "UP", curses.KEY_DOWN: "DOWN", curses.KEY_LEFT: "LEFT",
+                 curses.KEY_RIGHT: "RIGHT", curses.KEY_ENTER: "ENTER", curses.KEY_F5: "F5",
+                 curses.KEY_RESIZE: "RESIZE"}
+        # Characters are parsed together, as escape sequences curses does
+        # not know come in as separate characters.
+        keys = []
+        text = ""
+        while True:
+            try:
+                key = self.screen.get_wch()
+            except curses.error:
+                return keys + parse_keys(text)
+            if isinstance(key, int):
+                keys += parse_keys(text)
+                text = ""
+                if key in names:
+                    keys.append(names[key])
+            else:
+                text += key
+            self.screen.timeout(0)
+
+BACKENDS = {"ansi": AnsiBackend, "curses": CursesBackend}
+
+# ---------------------------
+# Renderer
+# ---------------------------
+class TerminalRenderer:
+    # Draws the Engine's current screen on a canvas of the terminal's size.
+    def __init__(self, width, height):
+        self.canvas = Canvas(width, height)
+
+    def resize(self, width, height):
+        self.canvas = Canvas(width, height)
+
+    def draw_screen(self, engine, notice="", show_odds=False, has_save=False):
+        self.canvas.clear()
+        if engine.state == "title":
+            self.draw_title(has_save, notice)
+        elif engine.state == "game":
+            self.draw_game(engine, notice, show_odds)
+        elif engine.state == "inventory":
+            self.canvas.lines(2, 1, screens.inventory_lines(engine))
+        elif engine.state == "merchant":
+            self.canvas.lines(2, 1, screens.merchant_lines(engine))
+        elif engine.state == "help":
+            self.canvas.lines(2, 1, screens.help_lines() + [("Q: Quit (terminal)", "cyan")])
+        elif engine.state == "gameover":
+            self.canvas.lines(2, 2, [("Game Over!", "red"), ("", "white"),
+                                     ("Press RETURN to quit or R to restart", "white")])
+        elif engine.state == "win":
+            self.canvas.lines(2, 2, [("You found the Amulet of Payuwitta!", "green"), ("", "white"),
+                                     ("Press RETURN to quit or R to restart", "white"), ("", "white"),
+                                     ("github.com/payu-witta", "white")])
+        return self.canvas
+
+    def draw_title(self, has_save, notice):
+        lines = [("RoguePyxel", "yellow"), ("", "white"), ("Press RETURN to start", "white")]
+        if has_save:
+            lines.append(("Press L to continue", "white"))
+        if notice:
+            lines += [("", "white"), (notice, "red")]
+        self.canvas.lines(2, 2, lines)
+
+    def draw_game(self, engine, notice, show_odds):
+        canvas = self.canvas
+        map_width = max(0, canvas.width - SIDEBAR_WIDTH - 1)
+        self.draw_map(engine, map_width, canvas.height)
+        for y in range(canvas.height):
+            canvas.text(map_width, y, "|", "white")
+        x = map_width + 2
+        y = 0
+        for line in screens.stats_lines(engine):
+            canvas.text(x, y, line[:SIDEBAR_WIDTH - 2], "yellow")
+            y += 1
+        y += 1
+        for line in screens.message_lines(engine):
+            canvas.text(x, y, line[:SIDEBAR_WIDTH - 2], "cyan")
+            y += 1
+        if notice:
+            canvas.text(x, y, notice[:SIDEBAR_WIDTH - 2], "green")
+        y += 2
+        if show_odds:
+            lines, color = screens.odds_lines(engine), "pink"
+        else:
+            lines, color = screens.LEGEND_LINES, "orange"
+        for line in lines:
+            canvas.text(x, y, line[:SIDEBAR_WIDTH - 2], color)
+            y += 1
+
+    def draw_map(self, engine, width, height):
+        # The part of the map around the player that fits, as the window's
+        # camera does: the fog of war over the grid, then what stands on
+        # it where the player sees (the player over items over enemies).
+        canvas = self.canvas
+        grid = engine.grid
+        left = min(max(0, engine.player.x - width // 2), max(0, grid.width - width))
+        top = min(max(0, engine.player.y - height // 2), max(0, grid.height - height))
+        x1, y1 = min(grid.width, left + width), min(grid.height, top + height)
+        visible, explored = engine.visible, engine.explored
+        for y in range(top, y1):
+            chars, colors = canvas.chars[y - top], canvas.colors[y - top]
+            row = y * grid.width
+            for x in range(left, x1):
+                if not explored[row + x]:
+                    continue
+                code = grid.code(x, y)
+                chars[x - left] = TILE_GLYPHS[code]
+                colors[x - left] = TILE_COLORS.get(TILE_SYMBOLS[code], "cyan") if (x, y) in visible else FOG_COLOR
+        items = engine.occupancy.items
+        for (x, y), enemies in Occupancy.in_rect(engine.occupancy.enemies, left, top, x1, y1):
+            if (x, y) in visible and (x, y) not in items:
+                canvas.text(x - left, y - top, max(enemies, key=lambda enemy: enemy.order).type[0], "red")
+        for (x, y), cell_items in Occupancy.in_rect(items, left, top, x1, y1):
+            if (x, y) in visible:
+                canvas.text(x - left, y - top, cell_items[-1].type, "cyan")
+        player = engine.player
+        if player.Hits > 0 and left <= player.x < x1 and top <= player.y < y1:
+            canvas.text(player.x - left, player.y - top, "P", "yellow")
+
+# ---------------------------
+# Terminal Game
+# ---------------------------
+class TerminalGame:
+    # The game loop: keys in, the screen they lead to out. Like the
+    # window, it drives the Engine through its action API.
+    def __init__(self, backend, seed=None):
+        # The next level is generated on a worker thread while this one is played.
+        self.engine = Engine(seed, pipeline=LevelPipeline("thread"))
+        self.backend = backend
+        self.renderer = None
+        self.input = InputQueue(fast=True)
+        self.notice = ""
+        self.show_odds = False
+        self.has_save = os.path.exists(savegame.SAVE_PATH)
+        self.running = True
+
+    def run(self):
+        self.backend.open()
+        try:
+            size = None
+            dirty = True
+            while self.running:
+                if self.backend.size() != size:
+                    size = self.backend.size()
+                    if self.renderer is None:
+                        self.renderer = TerminalRenderer(size.columns, size.lines)
+                    else:
+                        self.renderer.resize(size.columns, size.lines)
+                    self.backend.invalidate()
+                    dirty = True
+                if dirty:
+                    self.present()
+                keys = self.backend.read_keys(POLL_TIMEOUT)
+                for key in keys:
+                    self.handle_key(key)
+                self.play_moves()
+                dirty = bool(keys)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.backend.close()
+            self.engine.pipeline.shutdown()
+
+    def present(self):
+        canvas = self.renderer.draw_screen(self.engine, self.notice, self.show_odds, self.has_save)
+        self.backend.present(canvas)
+        self.input.rendered()
+
+    def play_moves(self):
+        engine = self.engine
+        for event in self.input.turns():
+            self.notice = ""
+            engine.step(event.direction)
+            if engine.state != "game":
+                break
+        if engine.state != "game":
+            self.input.clear()
+
+    def handle_key(self, key):
+        engine = self.engine
+        state = engine.state
+        if key in ("EOF", "\x03") or (key in ("q", "Q") and state not in ("inventory", "merchant")):
+            self.running = False
+        elif state == "title":
+            if key == "ENTER":
+                engine.start_game()
+            elif key in ("l", "L") and self.has_save:
+                try:
+                    savegame.load(engine)
+                except (OSError, savegame.SaveError) as error:
+                    self.notice = "Could not load the save: {}".format(error)
+        elif state == "game":
+            if key in MOVE_KEYS:
+                self.input.push(MOVE_KEYS[key])
+            elif key in ("i", "I"):
+                self.input.clear()
+                engine.set_screen("inventory")
+            elif key in ("h", "H"):
+                self.input.clear()
+                engine.set_screen("help")
+            elif key in ("s", "S"):
+                savegame.save(engine)
+                self.has_save = True
+                self.notice = "Game saved."
+            elif key in (",", "<"):
+                engine.ascend()
+            elif key == "F5":
+                self.show_odds = not self.show_odds
+        elif state == "inventory":
+            if key == "UP":
+                engine.move_inventory_cursor(-1)
+            elif key == "DOWN":
+                engine.move_inventory_cursor(1)
+            elif key in ("u", "U"):
+                engine.use_item(engine.inventory_cursor)
+            elif key in ("o", "O"):
+                engine.unequip_item()
+            elif key in ("d", "D"):
+                engine.discard_item(engine.inventory_cursor)
+            elif key in ("ESC", "i", "I"):
+                engine.set_screen("game")
+        elif state == "merchant":
+            if key in ("LEFT", "RIGHT"):
+                engine.next_merchant_item()
+            elif key == "ENTER":
+                engine.buy_merchant_item()
+            elif key in ("m", "M"):
+                engine.leave_merchant()
+        elif state == "help":
+            if key in ("ESC", "h", "H"):
+                engine.set_screen("game")
+        elif state in ("gameover", "win"):
+            if key == "ENTER":
+                self.running = False
+            elif key in ("r", "R"):
+                engine.restart_game()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play RoguePyxel in a terminal.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="ansi")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--stats", action="store_true", help="print what was sent to the terminal on exit")
+    args = parser.parse_args(argv)
+
+    game = TerminalGame(BACKENDS[args.backend](), args.seed)
+    game.run()
+    if args.stats:
+        backend = game.backend
+        frames = max(1, backend.frames)
+        # curses does its own output, so only the ANSI backend counts bytes.
+        print("{} frames, {:.0f} cells and {:.0f} bytes per frame".format(
+            backend.frames, backend.cells_sent / frames, backend.bytes_sent / frames))
+        print("input to render: mean {1:.2f} ms, p99 {2:.2f} ms".format(*game.input.latency_stats()))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+RoguePyxel engine tests
+Regression tests for the headless Engine, run with pytest. Each game is
+seeded, so every test plays the same turns on every run.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import random
+
+import pytest
+
+import eventlog
+import levels
+import replay
+import savegame
+from engine import Engine
+from levelstore import Floor, LevelStore, pack_floor
+from packing import Reader
+from registry import spawn_item
+
+def new_game(seed=0):
+    engine = Engine()
+    engine.restart_game(seed)
+    engine.start_game()
+    return engine
+
+def clear_enemies(engine):
+    for enemy in list(engine.enemies):
+        engine.enemies.remove(enemy)
+        engine.occupancy.remove_enemy(enemy)
+
+def open_neighbour(engine):
+    # A floor cell next to the player with nothing on it.
+    x, y = engine.player.x, engine.player.y
+    for cell in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+        if engine.is_cell_empty(*cell) and (cell[0], cell[1]) != (engine.gate_x, engine.gate_y):
+            return cell
+    raise AssertionError("no open cell next to the player")
+
+# ---------------------------
+# Enemy Turns
+# ---------------------------
+def attack_turns(symbol, turns=300):
+    # Turns, out of turns, in which a lone enemy next to a waiting,
+    # unkillable player attacks it.
+    engine = new_game()
+    clear_enemies(engine)
+    engine.player.Hits = engine.player.MaxHits = 10 ** 9
+    enemy = levels.create_enemy(symbol, random.Random(0))
+    enemy.x, enemy.y = open_neighbour(engine)
+    enemy.prev_x, enemy.prev_y = enemy.x, enemy.y
+    enemy.awake = True
+    enemy.next_time = engine.scheduler.clock
+    engine.enemies.append(enemy)
+    engine.occupancy.add_enemy(enemy)
+    engine.scheduler.reset(engine.enemies)
+
+    attacked = 0
+    for _ in range(turns):
+        engine.player.Satiety = 100
+        engine.step("NONE")
+        attacked += any(event.turn == engine.turns and event.kind == eventlog.DAMAGE
+                        and "attacked Player" in event.text for event in engine.messages)
+    return attacked
+
+def test_fast_enemies_attack_at_least_as_often():
+    slime = attack_turns("S")  # Speed 100
+    assert slime > 0
+    assert attack_turns("B") >= slime  # Speed 150, acts twice in some turns
+
+# ---------------------------
+# Inventory
+# ---------------------------
+def test_unequipping_a_ring_of_hits_can_end_the_game():
+    engine = new_game()
+    ring = spawn_item("=", random.Random(0))
+    ring.Hits = 5
+    engine.player.Inventory.append(ring)
+    engine.set_screen("inventory")
+    engine.use_item(len(engine.player.Inventory) - 1)
+    engine.player.Hits = 3
+    engine.recording = replay.Recording(engine)
+    engine.unequip_item()
+    assert engine.state == "gameover"
+    engine.recording.finish(engine)
+    assert replay.replay(engine.recording).state == "gameover"
+
+# ---------------------------
+# Undo
+# ---------------------------
+def test_undo_after_discarding_an_item_twice():
+    # Dropping an item used to move the item itself, which undo snapshots
+    # share, so an undone drop left the item indexed on another cell.
+    engine = new_game()
+    clear_enemies(engine)
+    engine.player.Inventory.append(spawn_item(")", random.Random(0)))
+    home = (engine.player.x, engine.player.y)
+    away = open_neighbour(engine)
+    there, back = {(1, 0): ("RIGHT", "LEFT"), (-1, 0): ("LEFT", "RIGHT"),
+                   (0, 1): ("DOWN", "UP"), (0, -1): ("UP", "DOWN")}[(away[0] - home[0], away[1] - home[1])]
+
+    engine.discard_item(0)
+    engine.push_undo()
+    engine.step(there)
+    engine.step(back)  # picks the item up again
+    assert len(engine.player.Inventory) == 1
+    engine.step(there)
+    engine.discard_item(0)
+    engine.undo()
+    assert [(item.x, item.y) for item in engine.items] == [home]
+    engine.step(there)
+    engine.step(back)
+    assert len(engine.player.Inventory) == 1
+    assert not engine.items and not engine.occupancy.items
+
+# ---------------------------
+# Save Games
+# ---------------------------
+def test_snapshot_reads_back_to_the_same_state():
+    engine = replay.replay(replay.record_random(12, 500))
+    assert len(engine.floors) == 2  # floors left behind are saved too
+    body = savegame.snapshot(engine)
+    loaded = Engine()
+    savegame.read_engine(Reader(memoryview(body)), loaded)
+    assert savegame.snapshot(loaded) == body
+
+def test_autosaver_reports_each_write(tmp_path):
+    engine = new_game()
+    autosaver = savegame.Autosaver(str(tmp_path / "missing" / "game.sav"))
+    number = autosaver.submit(engine)
+    autosaver.close()
+    [(done, error)] = autosaver.poll()
+    assert done == number and isinstance(error, OSError)
+
+    path = tmp_path / "game.sav"
+    autosaver = savegame.Autosaver(str(path))
+    number = autosaver.submit(engine)
+    autosaver.close()
+    assert autosaver.poll() == [(number, None)]
+    loaded = Engine()
+    savegame.load(loaded, str(path))
+    assert savegame.snapshot(loaded) == savegame.snapshot(engine)
+
+# ---------------------------
+# Replays
+# ---------------------------
+def test_recording_replays_through_its_checkpoints():
+    recording = replay.Recording.from_bytes(replay.record_random(7, 300).to_bytes())
+    assert len(recording.checkpoints) > 3
+    engine = replay.replay(recording)
+    assert replay.state_hash(engine) == recording.checkpoints[-1][1]
+
+    count, digest = recording.checkpoints[2]
+    recording.checkpoints[2] = (count, bytes(len(digest)))
+    with pytest.raises(replay.ReplayError, match="diverged after {} actions".format(count)):
+        replay.replay(recording)
+
+def test_corrupted_recording_keeps_the_cause():
+    data = replay.record_random(7, 50).to_bytes()
+    with pytest.raises(replay.ReplayError) as info:
+        replay.Recording.from_bytes(data[:-10])
+    assert info.value.__cause__ is not None
+
+# ---------------------------
+# Level Store
+# ---------------------------
+def test_level_store_spills_and_gives_floors_back():
+    engine = new_game()
+    floors = [Floor(number, engine.grid.copy(), engine.start_x, engine.start_y, engine.gate_x, engine.gate_y,
+                    100 * number, bytearray(engine.explored), [enemy.copy() for enemy in engine.enemies],
+                    list(engine.items))
+              for number in range(4)]
+    tiny, roomy = LevelStore(budget=1), LevelStore()
+    for floor in floors:
+        tiny.put(floor)
+        roomy.put(floor)
+    # Only the floor left last stays in memory under a tiny budget.
+    assert len(tiny) == 4 and list(tiny.floors) == [3] and tiny.spill_count == 3
+    assert tiny.memory <= tiny.budget or len(tiny.floors) == 1
+    # Saves see the same floors whichever are spilled.
+    assert list(tiny.packed()) == list(roomy.packed())
+    for floor in floors:
+        assert pack_floor(tiny.take(floor.number)) == pack_floor(floor)
+    assert len(tiny) == 0 and tiny.reload_count == 3
@@ -0,0 +1,180 @@
+"""
+RoguePyxel tile renderer
+Draws the map from a sprite atlas instead of one pyxel.text call per cell.
+Every glyph the map can show (the tile symbols, the player, enemy
+initials) is baked once into a SPRITE_SIZE sprite of image bank
+ATLAS_BANK; the gate, which Pyxel's font cannot draw, gets a hand-drawn
+glyph. A Pyxel tilemap mirrors the TileGrid, each cell being a square of
+Pyxel's 8x8 tiles, so the visible part of the grid is a single bltm call
+and only the player, enemies and items in view (found with a spatial
+query on the occupancy index) are blitted on top of it: the cost of a
+frame follows the size of the viewport, not of the level.
+The tilemap is rebuilt when the grid is replaced (a new level, a loaded
+save) and patched cell by cell through set_cell in between.
+The fog of war is a second tilemap drawn over the first with a colour
+key: clear where the player sees, dimmed over explored cells, black
+elsewhere. Enemies and items are only drawn where the player sees. It is
+rebuilt with the grid and otherwise patched with the difference between
+the previous and the current visible sets.
+"""
+
+# github.com/payu-witta/RoguePyxel
+
+import pyxel
+from engine import Occupancy
+from grid import TILE_SYMBOLS
+
+ATLAS_BANK = 0
+ATLAS_SIZE = 256
+SPRITE_SIZE = 16  # pixels per grid cell
+TILE_SIZE = 8  # pixels per Pyxel tilemap tile
+TILES_PER_SPRITE = SPRITE_SIZE // TILE_SIZE
+ATLAS_COLUMNS = ATLAS_SIZE // SPRITE_SIZE
+
+# Tile symbols first, so a sprite number is also the tile code, then the
+# printable ASCII characters (the player, enemy initials).
+SPRITE_SYMBOLS = TILE_SYMBOLS + [chr(code) for code in range(33, 127) if chr(code) not in TILE_SYMBOLS]
+SPRITE_NUMBERS = {symbol: number for number, symbol in enumerate(SPRITE_SYMBOLS)}
+
+# Fog sprites follow the glyphs; FOG_COLKEY is their transparent colour.
+FOG_CLEAR, FOG_DIM, FOG_DARK = range(len(SPRITE_SYMBOLS), len(SPRITE_SYMBOLS) + 3)
+FOG_COLKEY = 1
+
+# The gate, pixel by pixel: an archway.
+GATE_GLYPH = [
+    "..###..",
+    ".#...#.",
+    "#.....#",
+    "#..#..#",
+    "#..#..#",
+    "#.....#",
+    "#######",
+]
+
+def sprite_origin(number):
+    # Top-left pixel of a sprite in the atlas.
+    return (number % ATLAS_COLUMNS) * SPRITE_SIZE, (number // ATLAS_COLUMNS) * SPRITE_SIZE
+
+def sprite_rows(number):
+    # The sprite's tiles as Tilemap.set strings, one per tile row.
+    u, v = sprite_origin(number)
+    tu, tv = u // TILE_SIZE, v // TILE_SIZE
+    return [" ".join("{:02x}{:02x}".format(tu + dx, tv + dy) for dx in range(TILES_PER_SPRITE))
+            for dy in range(TILES_PER_SPRITE)]
+
+def set_sprite(tilemap, x, y, number):
+    # Points the tiles of cell (x, y) at a sprite.
+    u, v = sprite_origin(number)
+    for dy in range(TILES_PER_SPRITE):
+        for dx in range(TILES_PER_SPRITE):
+            tilemap.pset(x * TILES_PER_SPRITE + dx, y * TILES_PER_SPRITE + dy,
+                         (u // TILE_SIZE + dx, v // TILE_SIZE + dy))
+
+class TileRenderer:
+    def __init__(self):
+        self.grid = None  # the TileGrid the tilemap mirrors
+        self.tilemap = None
+        self.fog = None
+        self.fog_visible = frozenset()  # the visible set the fog shows
+        self.bake_atlas()
+        # Tilemap rows of each tile code's sprite, and of the fog over
+        # unexplored (0) and explored (1) cells.
+        self.tile_rows = [sprite_rows(number) for number in range(len(TILE_SYMBOLS))]
+        self.fog_rows = [sprite_rows(FOG_DARK), sprite_rows(FOG_DIM)]
+
+    # ---------------------------
+    # Atlas
+    # ---------------------------
+    def bake_atlas(self):
+        image = pyxel.images[ATLAS_BANK]
+        image.rect(0, 0, ATLAS_SIZE, ATLAS_SIZE, 0)
+        for number, symbol in enumerate(SPRITE_SYMBOLS):
+            u, v = sprite_origin(number)
+            if symbol == "𖡄":
+                for dy, line in enumerate(GATE_GLYPH):
+                    for dx, pixel in enumerate(line):
+                        if pixel == "#":
+                            image.pset(u + 4 + dx, v + 4 + dy, pyxel.COLOR_WHITE)
+            else:
+                image.text(u + 4, v + 4, symbol, pyxel.COLOR_GRAY if symbol == "#" else pyxel.COLOR_WHITE)
+        u, v = sprite_origin(FOG_CLEAR)
+        image.rect(u, v, SPRITE_SIZE, SPRITE_SIZE, FOG_COLKEY)
+        u, v = sprite_origin(FOG_DIM)
+        for dy in range(SPRITE_SIZE):
+            for dx in range(SPRITE_SIZE):
+                image.pset(u + dx, v + dy, FOG_COLKEY if (dx + dy) % 2 else 0)
+
+    # ---------------------------
+    # Tilemap
+    # ---------------------------
+    def rebuild(self, grid, explored=None):
+        width = grid.width * TILES_PER_SPRITE
+        height = grid.height * TILES_PER_SPRITE
+        if self.tilemap is None or self.tilemap.width != width or self.tilemap.height != height:
+            self.tilemap = pyxel.Tilemap(width, height, ATLAS_BANK)
+            self.fog = pyxel.Tilemap(width, height, ATLAS_BANK)
+        rows = []
+        for y in range(grid.height):
+            codes = grid.row_codes(y)
+            for dy in range(TILES_PER_SPRITE):
+                rows.append(" ".join([self.tile_rows[code][dy] for code in codes]))
+        self.tilemap.set(0, 0, rows)
+        self.grid = grid
+        if explored is not None:
+            rows = []
+            for y in range(grid.height):
+                seen = explored[y * grid.width:(y + 1) * grid.width]
+                for dy in range(TILES_PER_SPRITE):
+                    rows.append(" ".join([self.fog_rows[cell][dy] for cell in seen]))
+            self.fog.set(0, 0, rows)
+            self.fog_visible = frozenset()
+
+    def set_cell(self, grid, x, y):
+        # A grid that is not mirrored yet is rebuilt in full on the next draw.
+        if grid is not self.grid:
+            return
+        set_sprite(self.tilemap, x, y, grid.code(x, y))
+
+    def update_fog(self, visible):
+        # Cells out of sight are explored: they only ever go from clear to dim.
+        for x, y in self.fog_visible - visible:
+            set_sprite(self.fog, x, y, FOG_DIM)
+        for x, y in visible - self.fog_visible:
+            set_sprite(self.fog, x, y, FOG_CLEAR)
+        self.fog_visible = visible
+
+    # ---------------------------
+    # Drawing
+    # ---------------------------
+    def blit(self, surface, x, y, symbol):
+        u, v = sprite_origin(SPRITE_NUMBERS.get(symbol, SPRITE_NUMBERS["?"]))
+        surface.blt(x, y, ATLAS_BANK, u, v, SPRITE_SIZE, SPRITE_SIZE)
+
+    def draw(self, surface, x, y, grid, occupancy, player, view=None, explored=None, visible=None):
+        # The grid with its top-left corner at (x, y) on surface (pyxel or
+        # an Image), then what stands on it; view (x0, y0, x1, y1) limits
+        # drawing to those cells. With the explored layer and visible set,
+        # the fog of war covers the grid and hides entities out of sight.
+        # On a shared cell the player hides items, and items hide enemies
+        # (the last one spawned shows), as with the text renderer.
+        if grid is not self.grid:
+            self.rebuild(grid, explored)
+        x0, y0, x1, y1 = view or (0, 0, grid.width, grid.height)
+        left, top = x + x0 * SPRITE_SIZE, y + y0 * SPRITE_SIZE
+        u, v = x0 * SPRITE_SIZE, y0 * SPRITE_SIZE
+        width, height = (x1 - x0) * SPRITE_SIZE, (y1 - y0) * SPRITE_SIZE
+        surface.bltm(left, top, self.tilemap, u, v, width, height)
+        if visible is not None:
+            if visible is not self.fog_visible:
+                self.update_fog(visible)
+            surface.bltm(left, top, self.fog, u, v, width, height, FOG_COLKEY)
+        items = occupancy.items
+        for (cell_x, cell_y), enemies in Occupancy.in_rect(occupancy.enemies, x0, y0, x1, y1):
+            if (cell_x, cell_y) not in items and (visible is None or (cell_x, cell_y) in visible):
+                self.blit(surface, x + cell_x * SPRITE_SIZE, y + cell_y * SPRITE_SIZE,
+                          max(enemies, key=lambda enemy: enemy.order).type[0])
+        for (cell_x, cell_y), cell_items in Occupancy.in_rect(items, x0, y0, x1, y1):
+            if visible is None or (cell_x, cell_y) in visible:
+                self.blit(surface, x + cell_x * SPRITE_SIZE, y + cell_y * SPRITE_SIZE, cell_items[-1].type)
+        if player.Hits > 0 and x0 <= player.x < x1 and y0 <= player.y < y1:
+            self.blit(surface, x + player.x * SPRITE_SIZE, y + player.y * SPRITE_SIZE, "P")